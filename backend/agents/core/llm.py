@@ -1,25 +1,347 @@
+"""
+Process-wide LLM client registry.
+
+All agents share one pooled HTTP connection to the provider instead of
+opening a new client (and a new TLS handshake) per request:
+  - Direct chat completions use a shared synchronous `OpenAI` client.
+  - Strands agents use a shared `AsyncOpenAI` client that lives on a single
+    dedicated event loop thread (an async client must not be shared across
+    event loops), and are invoked through `invoke_agent`.
+
+Configuration from .env:
+  - AI_API_KEY: API key for the AI provider
+  - AI_MODEL_ID: Model being used
+  - AI_MODEL_ID_<PROFILE>: Optional per-profile model override (e.g. AI_MODEL_ID_CHAT)
+  - AI_BASE_URL: Base URL for the API (default: https://openrouter.ai/api/v1)
+  - AI_POOL_MAX_CONNECTIONS: Max open connections per client (default: 100)
+  - AI_POOL_MAX_KEEPALIVE: Max idle keep-alive connections per client (default: 20)
+  - AI_POOL_KEEPALIVE_EXPIRY: Seconds an idle connection is kept open (default: 60)
+  - AI_TIMEOUT: Request timeout in seconds (default: 120)
+  - AI_HTTP2: Negotiate HTTP/2 with the provider (default: true). Streaming
+    responses that are closed early keep the connection alive under HTTP/2.
+
+Every provider request is admitted by the scheduler in agents.core.scheduler
+(per-model concurrency, rate limit and priority classes, see PRIORITIES).
+"""
+
+import asyncio
 import os
+import threading
+import time
+
+import httpx
+import openai
+from openai import AsyncOpenAI, OpenAI
 from strands.models.openai import OpenAIModel
+from strands.types.exceptions import ModelThrottledException
 
+import metrics
+import tracing
+from agents.core import scheduler as llm_scheduler
+from agents.core.scheduler import LLMOverloaded, scheduler
 
-def create_model():
-    """Create a model using OpenAI-compatible API.
-    Configuration from .env:
-      - AI_API_KEY: API key for the AI provider
-      - AI_MODEL_ID: Model being used
-      - AI_BASE_URL: Base URL for the API (default: https://openrouter.ai/api/v1)
-    """
-    api_key = os.environ.get("AI_API_KEY", "")
-    model_id = os.environ.get("AI_MODEL_ID")
-    base_url = os.environ.get("AI_BASE_URL", "https://openrouter.ai/api/v1")
+# Per-purpose model profiles: default request params for each agent
+PROFILES = {
+    "triage": {},
+    "questions": {},
+    "summary": {},
+    "doctor_assistant": {"temperature": 0.3},
+    "chat": {"temperature": 0.7, "max_tokens": 1024},
+    "chat_summary": {"temperature": 0.2, "max_tokens": 400},
+}
+
+# Scheduling priority of each profile when requests queue for a model
+PRIORITIES = {
+    "triage": llm_scheduler.HIGH,
+    "doctor_assistant": llm_scheduler.HIGH,
+    "questions": llm_scheduler.NORMAL,
+    "summary": llm_scheduler.NORMAL,
+    "chat": llm_scheduler.LOW,
+    "chat_summary": llm_scheduler.BACKGROUND,
+}
 
+# Pause before retrying a model after a 429 without a Retry-After header
+THROTTLE_PAUSE_SECONDS = 5.0
+
+_lock = threading.RLock()
+_client: OpenAI | None = None
+_async_client: AsyncOpenAI | None = None
+_models: dict = {}
+_loop: asyncio.AbstractEventLoop | None = None
+
+_requests_total = metrics.counter("llm_http_requests_total", "HTTP requests sent to the LLM provider")
+_connections_opened = metrics.counter("llm_connections_opened_total", "New connections opened to the LLM provider")
+_connections_reused = metrics.counter("llm_connections_reused_total", "Requests served on a pooled keep-alive connection")
+_connection_setup_seconds = metrics.histogram(
+    "llm_connection_setup_seconds", "TCP connect + TLS handshake time for new LLM provider connections"
+)
+
+
+def _settings() -> dict:
+    api_key = os.environ.get("AI_API_KEY", "")
     if not api_key:
         raise ValueError("AI_API_KEY is not set in .env!")
+    return {
+        "api_key": api_key,
+        "base_url": os.environ.get("AI_BASE_URL", "https://openrouter.ai/api/v1"),
+    }
+
 
-    return OpenAIModel(
-        client_args={
-            "api_key": api_key,
-            "base_url": base_url,
-        },
-        model_id=model_id,
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=int(os.environ.get("AI_POOL_MAX_CONNECTIONS", "100")),
+        max_keepalive_connections=int(os.environ.get("AI_POOL_MAX_KEEPALIVE", "20")),
+        keepalive_expiry=float(os.environ.get("AI_POOL_KEEPALIVE_EXPIRY", "60")),
     )
+
+
+def _http2() -> bool:
+    return os.environ.get("AI_HTTP2", "true").lower() in ("1", "true", "yes")
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(float(os.environ.get("AI_TIMEOUT", "120")), connect=10.0)
+
+
+class _ConnectionTracer:
+    """httpcore trace hook: tells apart new vs reused connections and times connection setup."""
+
+    def __init__(self, client_kind: str):
+        self.client_kind = client_kind
+        self.connect_started = None
+
+    def __call__(self, event_name: str, info: dict):
+        if event_name == "connection.connect_tcp.started":
+            self.connect_started = time.perf_counter()
+        elif event_name.endswith("send_request_headers.started"):
+            if self.connect_started is not None:
+                _connections_opened.inc(client=self.client_kind)
+                _connection_setup_seconds.observe(
+                    time.perf_counter() - self.connect_started, client=self.client_kind
+                )
+                self.connect_started = None
+            else:
+                _connections_reused.inc(client=self.client_kind)
+
+
+class _AsyncConnectionTracer(_ConnectionTracer):
+    async def __call__(self, event_name: str, info: dict):
+        super().__call__(event_name, info)
+
+
+def _on_request(request: httpx.Request):
+    _requests_total.inc(client="sync")
+    request.extensions["trace"] = _ConnectionTracer("sync")
+
+
+async def _on_async_request(request: httpx.Request):
+    _requests_total.inc(client="async")
+    request.extensions["trace"] = _AsyncConnectionTracer("async")
+
+
+def get_client() -> OpenAI:
+    """Shared synchronous OpenAI client with a keep-alive connection pool."""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                http_client = httpx.Client(
+                    limits=_limits(),
+                    timeout=_timeout(),
+                    http2=_http2(),
+                    event_hooks={"request": [_on_request]},
+                )
+                _client = OpenAI(**_settings(), http_client=http_client)
+    return _client
+
+
+def _get_async_client() -> AsyncOpenAI:
+    global _async_client
+    if _async_client is None:
+        with _lock:
+            if _async_client is None:
+                http_client = httpx.AsyncClient(
+                    limits=_limits(),
+                    timeout=_timeout(),
+                    http2=_http2(),
+                    event_hooks={"request": [_on_async_request]},
+                )
+                _async_client = AsyncOpenAI(**_settings(), http_client=http_client)
+    return _async_client
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    """Dedicated event loop thread that owns the shared async client."""
+    global _loop
+    if _loop is None:
+        with _lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="llm-event-loop", daemon=True).start()
+                _loop = loop
+    return _loop
+
+
+def get_profile(profile: str) -> dict:
+    """Resolve a model profile to its model id and default request params."""
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown LLM profile: {profile}")
+    model_id = os.environ.get(f"AI_MODEL_ID_{profile.upper()}") or os.environ.get("AI_MODEL_ID")
+    return {"model_id": model_id, "params": dict(PROFILES[profile])}
+
+
+def _retry_after(error: BaseException) -> float | None:
+    """Seconds to back off if `error` (or its cause) is a provider rate-limit response, else None."""
+    while error is not None:
+        if isinstance(error, openai.RateLimitError):
+            try:
+                return float(error.response.headers.get("retry-after", THROTTLE_PAUSE_SECONDS))
+            except ValueError:
+                return THROTTLE_PAUSE_SECONDS
+        if isinstance(error, ModelThrottledException) and error.__cause__ is None:
+            return THROTTLE_PAUSE_SECONDS
+        error = error.__cause__
+    return None
+
+
+class _ScheduledOpenAIModel(OpenAIModel):
+    """Strands model whose every provider call takes a scheduler slot for the duration of the stream."""
+
+    def __init__(self, *args, priority: int, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.priority = priority
+
+    async def stream(self, *args, **kwargs):
+        slot = await scheduler.acquire_async(self.config["model_id"], self.priority)
+        throttled_for = None
+        try:
+            async for event in super().stream(*args, **kwargs):
+                yield event
+        except Exception as e:
+            throttled_for = _retry_after(e)
+            raise
+        finally:
+            scheduler.release(slot, throttled_for)
+
+
+def create_model(profile: str) -> OpenAIModel:
+    """Return the shared Strands model for a profile, backed by the pooled async client.
+    Agents using this model must be invoked with `invoke_agent`.
+    """
+    model = _models.get(profile)
+    if model is None:
+        resolved = get_profile(profile)
+        config = {"model_id": resolved["model_id"]}
+        if resolved["params"]:
+            config["params"] = resolved["params"]
+        with _lock:
+            model = _models.get(profile)
+            if model is None:
+                model = _ScheduledOpenAIModel(
+                    client=_get_async_client(), priority=PRIORITIES.get(profile, llm_scheduler.NORMAL), **config
+                )
+                _models[profile] = model
+    return model
+
+
+def _profile_of(model) -> str:
+    return next((profile for profile, m in _models.items() if m is model), "custom")
+
+
+def invoke_agent(agent, prompt: str):
+    """Run a Strands agent on the shared LLM event loop and block until it finishes."""
+    profile = _profile_of(agent.model)
+    with tracing.span(f"agent {profile}", kind="agent", profile=profile) as span:
+        # The agent runs on another thread's event loop: carry the request trace over
+        # so its tool calls (and their DB queries) are recorded under this span
+        state = tracing.capture()
+
+        async def _run():
+            with tracing.attach(state):
+                return await agent.invoke_async(prompt)
+
+        try:
+            result = asyncio.run_coroutine_threadsafe(_run(), _get_loop()).result()
+        except Exception as e:
+            # Strands wraps model errors in EventLoopException; surface overload as-is
+            cause = e
+            while cause is not None and not isinstance(cause, LLMOverloaded):
+                cause = cause.__cause__
+            if cause is not None:
+                raise cause from None
+            raise
+        usage = result.metrics.accumulated_usage
+        span.add_usage(usage.get("inputTokens", 0), usage.get("outputTokens", 0))
+        span.set(cycles=result.metrics.cycle_count)
+    return result
+
+
+class _TracedStream:
+    """Wraps a streaming completion so its span lasts until the stream is consumed or closed."""
+
+    def __init__(self, stream, span, slot):
+        self._stream = stream
+        self._span = span
+        self._slot = slot
+        self._throttled_for = None
+
+    def __iter__(self):
+        try:
+            for chunk in self._stream:
+                if getattr(chunk, "usage", None):
+                    self._span.add_usage(chunk.usage.prompt_tokens, chunk.usage.completion_tokens)
+                yield chunk
+        except Exception as e:
+            self._throttled_for = _retry_after(e)
+            self._span.finish(error=e)
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            self._span.finish()
+            if self._slot is not None:
+                scheduler.release(self._slot, self._throttled_for)
+                self._slot = None
+
+
+def admit(profile: str):
+    """Raise LLMOverloaded right away when the profile's model queue is full (e.g. before opening a stream)."""
+    scheduler.admit(get_profile(profile)["model_id"], PRIORITIES.get(profile, llm_scheduler.NORMAL))
+
+
+def chat_completion(profile: str, messages: list, **overrides):
+    """Chat completion on the shared pooled client using a profile's model and params."""
+    resolved = get_profile(profile)
+    params = {**resolved["params"], **overrides}
+    if params.get("stream"):
+        params.setdefault("stream_options", {"include_usage": True})
+
+    slot = scheduler.acquire(resolved["model_id"], PRIORITIES.get(profile, llm_scheduler.NORMAL))
+    span = tracing.start_span(f"chat_completion {profile}", kind="llm", profile=profile, model=resolved["model_id"])
+    span.set(queue_ms=round(slot.waited * 1000, 1))
+    try:
+        response = get_client().chat.completions.create(
+            model=resolved["model_id"],
+            messages=messages,
+            **params,
+        )
+    except Exception as e:
+        span.finish(error=e)
+        scheduler.release(slot, _retry_after(e))
+        raise
+
+    if params.get("stream"):
+        return _TracedStream(response, span, slot)
+    scheduler.release(slot)
+    if response.usage:
+        span.add_usage(response.usage.prompt_tokens, response.usage.completion_tokens)
+    span.finish()
+    return response
@@ -0,0 +1,292 @@
+"""
+Central scheduler for LLM provider requests.
+
+Every request to the provider (direct chat completions and each model call
+made by a Strands agent) first takes a slot from its model's lane:
+  - at most `concurrency` requests per model are in flight
+  - a token bucket limits the request rate per model (`rate` per second,
+    bursts up to `burst`)
+  - waiting requests are served by priority class, then in arrival order,
+    so doctor-facing work goes ahead of patient chat and background jobs
+  - when the provider answers 429, the lane pauses for its Retry-After
+  - when a lane's queue is full (lower priority classes are shed earlier) or a
+    request waited longer than `queue_timeout`, `LLMOverloaded` is raised;
+    the API turns it into 503 with a Retry-After header
+
+Configuration from .env:
+  - LLM_MAX_CONCURRENCY: In-flight requests per model (default: 16)
+  - LLM_RATE_LIMIT: Requests per second per model, 0 for no limit (default: 0)
+  - LLM_RATE_BURST: Token bucket size (default: LLM_MAX_CONCURRENCY)
+  - LLM_MAX_QUEUE: Requests waiting per model before new ones are rejected (default: 200)
+  - LLM_QUEUE_TIMEOUT: Max seconds a request waits for a slot (default: 30)
+  - LLM_MODEL_LIMITS: Per-model overrides, comma-separated `model=concurrency[:rate]`
+    (e.g. "openai/gpt-4o=8:2,openai/gpt-4o-mini=32")
+"""
+
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+
+import metrics
+
+HIGH, NORMAL, LOW, BACKGROUND = 0, 1, 2, 3
+PRIORITY_NAMES = {HIGH: "high", NORMAL: "normal", LOW: "low", BACKGROUND: "background"}
+
+_wait_seconds = metrics.histogram("llm_queue_wait_seconds", "Time an LLM request waited for a slot, by model and priority")
+_queue_depth = metrics.gauge("llm_queue_depth", "LLM requests waiting for a slot, by model")
+_in_flight = metrics.gauge("llm_in_flight", "LLM requests in flight, by model")
+_rejected = metrics.counter(
+    "llm_rejected_total", "LLM requests rejected before reaching the provider, by model, priority and reason"
+)
+_throttled = metrics.counter("llm_throttled_total", "Provider rate-limit (429) responses, by model")
+
+
+class LLMOverloaded(Exception):
+    """Raised when an LLM request cannot be scheduled; `retry_after` is a suggested delay in seconds."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    def __init__(self, priority: int, seq: int, notify):
+        self.priority = priority
+        self.seq = seq
+        self.notify = notify
+        self.granted = False
+        self.cancelled = False
+        self.enqueued = time.monotonic()
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class Slot:
+    def __init__(self, lane, priority: int, waited: float = 0.0):
+        self.lane = lane
+        self.priority = priority
+        self.waited = waited
+        self.started = time.monotonic()
+
+
+class _Lane:
+    def __init__(self, model: str, concurrency: int, rate: float, burst: int, max_queue: int):
+        self.model = model
+        self.concurrency = concurrency
+        self.rate = rate
+        self.burst = burst
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self.waiters: list = []  # heap of _Waiter
+        self.tokens = float(burst)
+        self.refilled_at = time.monotonic()
+        self.paused_until = 0.0
+        self.avg_seconds = 1.0  # moving average of request duration, for Retry-After estimates
+        self.timer: threading.Timer | None = None
+
+    def queue_limit(self, priority: int) -> int:
+        # Low-priority work is shed first, keeping room for doctor-facing requests
+        return self.max_queue if priority <= NORMAL else self.max_queue // 2
+
+    def token_wait(self, now: float) -> float:
+        """Seconds until a request may start (0 when it may start now)."""
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.rate <= 0:
+            return 0.0
+        self.tokens = min(self.burst, self.tokens + (now - self.refilled_at) * self.rate)
+        self.refilled_at = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take_token(self):
+        if self.rate > 0:
+            self.tokens -= 1
+
+    def retry_after(self, now: float) -> int:
+        backlog = (len(self.waiters) + 1) * self.avg_seconds / max(self.concurrency, 1)
+        return max(1, min(60, math.ceil(max(backlog, self.paused_until - now))))
+
+
+class LLMScheduler:
+    def __init__(
+        self,
+        concurrency: int = 16,
+        rate: float = 0.0,
+        burst: int = None,
+        max_queue: int = 200,
+        queue_timeout: float = 30.0,
+        model_limits: dict = None,
+    ):
+        self.concurrency = concurrency
+        self.rate = rate
+        self.burst = burst or concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.model_limits = model_limits or {}
+        self._lanes: dict = {}
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+
+    def _lane(self, model: str) -> _Lane:
+        lane = self._lanes.get(model)
+        if lane is None:
+            concurrency, rate = self.model_limits.get(model, (self.concurrency, self.rate))
+            lane = _Lane(model, concurrency, rate, max(self.burst, 1) if rate else 0, self.max_queue)
+            self._lanes[model] = lane
+        return lane
+
+    def admit(self, model: str, priority: int):
+        """Fail fast with LLMOverloaded when a request of this priority would be rejected right now."""
+        with self._lock:
+            lane = self._lane(model)
+            if len(lane.waiters) >= lane.queue_limit(priority):
+                _rejected.inc(model=model, priority=PRIORITY_NAMES[priority], reason="queue_full")
+                raise LLMOverloaded("The AI service is busy, please retry shortly", lane.retry_after(time.monotonic()))
+
+    def acquire(self, model: str, priority: int = NORMAL) -> Slot:
+        """Block until a slot for `model` is granted."""
+        event = threading.Event()
+        waiter = self._enqueue(model, priority, event.set)
+        if waiter is None or event.wait(self.queue_timeout) or not self._cancel(model, waiter):
+            return self._granted(model, priority, waiter)
+        raise self._timed_out(model, priority)
+
+    async def acquire_async(self, model: str, priority: int = NORMAL) -> Slot:
+        """Wait (without blocking the event loop) until a slot for `model` is granted."""
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def notify():
+            loop.call_soon_threadsafe(lambda: granted.done() or granted.set_result(True))
+
+        waiter = self._enqueue(model, priority, notify)
+        if waiter is None:
+            return self._granted(model, priority, waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(granted), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if self._cancel(model, waiter):
+                raise self._timed_out(model, priority)
+        except asyncio.CancelledError:
+            if not self._cancel(model, waiter):
+                self.release(Slot(self._lanes[model], priority))
+            raise
+        return self._granted(model, priority, waiter)
+
+    def release(self, slot: Slot, throttled_for: float = None):
+        """Return a slot. `throttled_for` (seconds) pauses the lane after a provider 429."""
+        lane = slot.lane
+        with self._lock:
+            now = time.monotonic()
+            lane.in_flight -= 1
+            lane.avg_seconds = 0.8 * lane.avg_seconds + 0.2 * (now - slot.started)
+            if throttled_for is not None:
+                _throttled.inc(model=lane.model)
+                lane.paused_until = max(lane.paused_until, now + throttled_for)
+                lane.tokens = 0.0
+            _in_flight.set(lane.in_flight, model=lane.model)
+            self._dispatch(lane)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                model: {
+                    "in_flight": lane.in_flight,
+                    "queued": len(lane.waiters),
+                    "concurrency": lane.concurrency,
+                    "rate": lane.rate,
+                    "paused_for": max(0.0, round(lane.paused_until - time.monotonic(), 3)),
+                }
+                for model, lane in self._lanes.items()
+            }
+
+    # --- internals (all called with or taking self._lock) ---
+
+    def _enqueue(self, model: str, priority: int, notify) -> _Waiter | None:
+        """Take a slot immediately (returns None) or queue a waiter."""
+        with self._lock:
+            lane = self._lane(model)
+            now = time.monotonic()
+            if not lane.waiters and lane.in_flight < lane.concurrency and lane.token_wait(now) == 0:
+                lane.take_token()
+                lane.in_flight += 1
+                _in_flight.set(lane.in_flight, model=model)
+                return None
+            if len(lane.waiters) >= lane.queue_limit(priority):
+                _rejected.inc(model=model, priority=PRIORITY_NAMES[priority], reason="queue_full")
+                raise LLMOverloaded("The AI service is busy, please retry shortly", lane.retry_after(now))
+            waiter = _Waiter(priority, next(self._seq), notify)
+            heapq.heappush(lane.waiters, waiter)
+            _queue_depth.set(len(lane.waiters), model=model)
+            self._dispatch(lane)
+            return waiter
+
+    def _cancel(self, model: str, waiter: _Waiter) -> bool:
+        """Withdraw a waiter; False when it was granted in the meantime (it then owns a slot)."""
+        with self._lock:
+            if waiter.granted:
+                return False
+            waiter.cancelled = True
+            lane = self._lanes[model]
+            lane.waiters.remove(waiter)
+            heapq.heapify(lane.waiters)
+            _queue_depth.set(len(lane.waiters), model=model)
+            return True
+
+    def _granted(self, model: str, priority: int, waiter: _Waiter | None) -> Slot:
+        waited = time.monotonic() - waiter.enqueued if waiter is not None else 0.0
+        _wait_seconds.observe(waited, model=model, priority=PRIORITY_NAMES[priority])
+        return Slot(self._lanes[model], priority, waited)
+
+    def _timed_out(self, model: str, priority: int) -> LLMOverloaded:
+        _rejected.inc(model=model, priority=PRIORITY_NAMES[priority], reason="timeout")
+        with self._lock:
+            retry_after = self._lanes[model].retry_after(time.monotonic())
+        return LLMOverloaded("The AI service is busy, please retry shortly", retry_after)
+
+    def _dispatch(self, lane: _Lane):
+        """Grant slots to the highest-priority waiters while capacity and rate allow."""
+        while lane.waiters and lane.in_flight < lane.concurrency:
+            wait = lane.token_wait(time.monotonic())
+            if wait > 0:
+                if lane.timer is None:
+                    lane.timer = threading.Timer(wait, self._on_timer, args=(lane,))
+                    lane.timer.daemon = True
+                    lane.timer.start()
+                break
+            waiter = heapq.heappop(lane.waiters)
+            lane.take_token()
+            lane.in_flight += 1
+            waiter.granted = True
+            waiter.notify()
+        _queue_depth.set(len(lane.waiters), model=lane.model)
+        _in_flight.set(lane.in_flight, model=lane.model)
+
+    def _on_timer(self, lane: _Lane):
+        with self._lock:
+            lane.timer = None
+            self._dispatch(lane)
+
+
+def _model_limits(spec: str) -> dict:
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        model, _, value = item.rpartition("=")
+        concurrency, _, rate = value.partition(":")
+        limits[model] = (int(concurrency), float(rate or os.environ.get("LLM_RATE_LIMIT", "0")))
+    return limits
+
+
+scheduler = LLMScheduler(
+    concurrency=int(os.environ.get("LLM_MAX_CONCURRENCY", "16")),
+    rate=float(os.environ.get("LLM_RATE_LIMIT", "0")),
+    burst=int(os.environ.get("LLM_RATE_BURST", "0")) or None,
+    max_queue=int(os.environ.get("LLM_MAX_QUEUE", "200")),
+    queue_timeout=float(os.environ.get("LLM_QUEUE_TIMEOUT", "30")),
+    model_limits=_model_limits(os.environ.get("LLM_MODEL_LIMITS", "")),
+)
@@ -0,0 +1,220 @@
+"""
+Structured (JSON) output from the LLM.
+
+`generate(profile, messages, output)` asks the model for a JSON object matching
+a pydantic model and returns the validated instance:
+  - the model's JSON schema is sent as `response_format` (strict `json_schema`),
+    so the provider constrains generation to it. A model that rejects it falls
+    back to `json_object` and then to the schema in the prompt; the working mode
+    is remembered per model
+  - the reply is parsed tolerantly: code fences and surrounding prose are
+    stripped, trailing commas are dropped and a reply cut off mid-object is
+    closed by partial JSON parsing, so formatting slips cost no extra LLM call
+  - only when the parsed object fails validation is the model asked to fix it,
+    given the validation errors, at most STRUCTURED_MAX_REPAIRS times; after
+    that StructuredOutputError is raised
+
+`tool_input(messages, *names)` finds the latest call to one of the given tools
+in a Strands agent's messages, for agents that still answer through tools.
+
+Configuration from .env:
+  - STRUCTURED_OUTPUT_MODE: "json_schema", "json_object" or "prompt" (default: json_schema)
+  - STRUCTURED_MAX_REPAIRS: LLM repair turns after an invalid reply (default: 1)
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+
+import openai
+from pydantic import BaseModel, ValidationError
+from pydantic_core import from_json
+
+import metrics
+from agents.core.llm import chat_completion, get_profile
+
+logger = logging.getLogger(__name__)
+
+MODES = ("json_schema", "json_object", "prompt")
+DEFAULT_MODE = os.environ.get("STRUCTURED_OUTPUT_MODE", "json_schema")
+MAX_REPAIRS = int(os.environ.get("STRUCTURED_MAX_REPAIRS", "1"))
+
+# Validation keywords strict json_schema mode does not accept; pydantic still enforces them
+_UNSUPPORTED_KEYWORDS = {"default", "minItems", "maxItems", "minLength", "maxLength", "minimum", "maximum", "format"}
+_FENCE = re.compile(r"^```[a-zA-Z]*\s*|\s*```$")
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_FORMAT_NAMES = ("response_format", "json_schema", "json_object")
+
+_outputs = metrics.counter(
+    "structured_output_total",
+    "Structured LLM replies, by schema and outcome (ok, fixed = repaired locally, repaired = by the LLM, failed)",
+)
+_mode_fallbacks = metrics.counter("structured_output_mode_fallbacks_total", "Response format fallbacks, by model and mode")
+
+_modes: dict = {}  # model id -> response format mode that works for it
+_modes_lock = threading.Lock()
+
+
+class StructuredOutputError(Exception):
+    """The model's reply could not be turned into a valid object; `raw` is its last reply."""
+
+    def __init__(self, message: str, raw: str = ""):
+        super().__init__(message)
+        self.raw = raw
+
+
+class Structured:
+    """A validated reply with the LLM usage it took."""
+
+    def __init__(self, value: BaseModel, calls: int, input_tokens: int, output_tokens: int):
+        self.value = value
+        self.calls = calls
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+
+
+def strict_schema(output: type[BaseModel]) -> dict:
+    """The model's JSON schema in the form strict `json_schema` mode requires."""
+
+    def convert(node):
+        if isinstance(node, dict):
+            node = {k: convert(v) for k, v in node.items() if k not in _UNSUPPORTED_KEYWORDS}
+            if node.get("type") == "object" and "properties" in node:
+                node["required"] = list(node["properties"])
+                node["additionalProperties"] = False
+            return node
+        if isinstance(node, list):
+            return [convert(v) for v in node]
+        return node
+
+    return convert(output.model_json_schema())
+
+
+def parse(text: str, output: type[BaseModel]) -> tuple[BaseModel, bool]:
+    """
+    Parse and validate a reply. Returns (value, fixed) where `fixed` tells whether
+    the raw text needed local cleanup. Raises ValueError or ValidationError.
+    """
+    text = (text or "").strip()
+    try:
+        return output.model_validate_json(text), False
+    except ValidationError as e:
+        if any(err["type"] != "json_invalid" for err in e.errors()):
+            raise
+
+    cleaned = _FENCE.sub("", text)
+    start, end = cleaned.find("{"), cleaned.rfind("}")
+    if start < 0:
+        raise ValueError("The reply contains no JSON object")
+    # Without a closing brace the reply was cut off: keep everything for partial parsing
+    cleaned = cleaned[start : end + 1] if end > start else cleaned[start:]
+    data = from_json(_TRAILING_COMMA.sub(r"\1", cleaned), allow_partial=True)
+    return output.model_validate(data), True
+
+
+def _describe_errors(error: Exception) -> str:
+    if isinstance(error, ValidationError):
+        return "\n".join(
+            f"- {'.'.join(str(part) for part in err['loc']) or '(root)'}: {err['msg']}" for err in error.errors()
+        )
+    return f"- {error}"
+
+
+def _request(profile: str, messages: list, output: type[BaseModel], mode: str, overrides: dict):
+    name = output.__name__
+    if mode == "json_schema":
+        response_format = {
+            "type": "json_schema",
+            "json_schema": {"name": name, "strict": True, "schema": strict_schema(output)},
+        }
+        return chat_completion(profile, messages, response_format=response_format, **overrides)
+
+    instruction = (
+        "Respond with ONLY a JSON object (no markdown, no backticks) matching this JSON schema:\n"
+        f"{json.dumps(output.model_json_schema(), ensure_ascii=False)}"
+    )
+    messages = [*messages, {"role": "system", "content": instruction}]
+    if mode == "json_object":
+        return chat_completion(profile, messages, response_format={"type": "json_object"}, **overrides)
+    return chat_completion(profile, messages, **overrides)
+
+
+def _format_unsupported(error: openai.BadRequestError) -> bool:
+    """
+    Whether a 400 says the response format itself is unsupported. Any other 400 (context length,
+    content filter, ...) must not downgrade the model, even if its text happens to mention JSON.
+    """
+    if (error.param or "").startswith("response_format"):
+        return True
+    message = (error.message or "").lower()
+    return any(f in message for f in _FORMAT_NAMES) and "support" in message
+
+
+def _complete(profile: str, messages: list, output: type[BaseModel], overrides: dict):
+    """One completion in the best response format the model accepts."""
+    model_id = get_profile(profile)["model_id"]
+    mode = _modes.get(model_id, DEFAULT_MODE)
+    while True:
+        try:
+            return _request(profile, messages, output, mode, overrides)
+        except openai.BadRequestError as e:
+            if mode == "prompt" or not _format_unsupported(e):
+                raise
+            fallback = MODES[MODES.index(mode) + 1]
+            logger.warning("Model %s rejected response_format=%s, falling back to %s", model_id, mode, fallback)
+            _mode_fallbacks.inc(model=model_id, mode=fallback)
+            with _modes_lock:
+                _modes[model_id] = fallback
+            mode = fallback
+
+
+def generate(
+    profile: str, messages: list, output: type[BaseModel], max_repairs: int = MAX_REPAIRS, **overrides
+) -> Structured:
+    """
+    Chat completion whose reply is validated into `output`, see the module docstring.
+    Raises StructuredOutputError when no valid object was produced.
+    """
+    messages = list(messages)
+    calls = input_tokens = output_tokens = 0
+    raw = ""
+    for attempt in range(max_repairs + 1):
+        response = _complete(profile, messages, output, overrides)
+        calls += 1
+        if response.usage:
+            input_tokens += response.usage.prompt_tokens
+            output_tokens += response.usage.completion_tokens
+        raw = response.choices[0].message.content or ""
+
+        try:
+            value, fixed = parse(raw, output)
+        except (ValueError, ValidationError) as e:
+            messages += [
+                {"role": "assistant", "content": raw},
+                {
+                    "role": "user",
+                    "content": "Your reply is not a valid JSON object for the required schema:\n"
+                    f"{_describe_errors(e)}\nReply with the corrected JSON object only.",
+                },
+            ]
+            continue
+
+        outcome = "repaired" if attempt else "fixed" if fixed else "ok"
+        _outputs.inc(schema=output.__name__, outcome=outcome)
+        return Structured(value, calls, input_tokens, output_tokens)
+
+    _outputs.inc(schema=output.__name__, outcome="failed")
+    raise StructuredOutputError(f"The AI reply did not match {output.__name__}", raw)
+
+
+def tool_input(messages: list, *names: str) -> tuple[str | None, dict | None]:
+    """The (name, input) of the latest call to one of `names` in a Strands agent's messages."""
+    for msg in reversed(messages):
+        if isinstance(msg, dict) and msg.get("role") == "assistant":
+            for block in msg.get("content", []):
+                tool_use = block.get("toolUse") if isinstance(block, dict) else None
+                if tool_use and tool_use.get("name") in names:
+                    return tool_use["name"], tool_use.get("input", {})
+    return None, None
@@ -0,0 +1,166 @@
+"""
+Lightweight text utilities for local (non-LLM) retrieval.
+No external dependencies: tokenization, word + character n-gram features,
+a small TF-IDF index with cosine-similarity search and a MinHash/LSH index
+for near-duplicate lookup over a changing set of texts.
+"""
+
+import hashlib
+import math
+import random
+import re
+import threading
+from collections import Counter
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def normalize(text: str | None) -> str:
+    """Case- and whitespace-insensitive form of free text, for use in keys."""
+    return " ".join((text or "").lower().split())
+
+
+def estimate_tokens(text: str | None) -> int:
+    """Rough LLM token count (~4 characters per token), for budgeting prompts without a tokenizer."""
+    return (len(text or "") + 3) // 4
+
+
+def tokenize(text: str) -> list:
+    """Lowercase alphanumeric words."""
+    return _WORD.findall((text or "").lower())
+
+
+def features(text: str, ngram: int = 3) -> Counter:
+    """
+    Word features plus character n-grams of longer words, so that partial
+    and slightly misspelled names ("amoxicilin", "paracetamol 500") still match.
+    """
+    feats = Counter()
+    for word in tokenize(text):
+        feats[word] += 1
+        if len(word) > ngram:
+            padded = f"^{word}$"
+            for i in range(len(padded) - ngram + 1):
+                feats["#" + padded[i : i + ngram]] += 1
+    return feats
+
+
+class TfidfIndex:
+    """
+    TF-IDF index over a fixed list of documents.
+    Vectors are L2-normalized so the dot product is the cosine similarity.
+    """
+
+    def __init__(self, documents: list):
+        self.size = len(documents)
+        doc_features = [features(doc) for doc in documents]
+
+        df = Counter()
+        for feats in doc_features:
+            df.update(feats.keys())
+        self.idf = {f: math.log((1 + self.size) / (1 + n)) + 1.0 for f, n in df.items()}
+
+        self._postings: dict = {}
+        for idx, feats in enumerate(doc_features):
+            for f, weight in self._normalize(feats).items():
+                self._postings.setdefault(f, []).append((idx, weight))
+
+    def _normalize(self, feats: Counter) -> dict:
+        vec = {f: (1.0 + math.log(tf)) * self.idf[f] for f, tf in feats.items() if f in self.idf}
+        norm = math.sqrt(sum(w * w for w in vec.values()))
+        return {f: w / norm for f, w in vec.items()} if norm else {}
+
+    def vector(self, text: str) -> dict:
+        return self._normalize(features(text))
+
+    def search(self, query: str, top_k: int = 10, min_score: float = 0.0) -> list:
+        """Return up to `top_k` (document_index, score) pairs, best first."""
+        scores: dict = {}
+        for f, qw in self.vector(query).items():
+            for idx, dw in self._postings.get(f, ()):
+                scores[idx] = scores.get(idx, 0.0) + qw * dw
+        ranked = sorted(
+            ((idx, s) for idx, s in scores.items() if s > min_score), key=lambda item: item[1], reverse=True
+        )
+        return ranked[:top_k]
+
+
+_MERSENNE = (1 << 61) - 1
+
+
+class MinHashIndex:
+    """
+    Near-duplicate index over a changing set of keyed texts.
+    Each text is reduced to `num_perm` MinHash values of its feature set; the
+    signature is split into `bands` buckets (LSH) so a lookup only compares
+    against texts sharing at least one bucket. Similarity is the estimated
+    Jaccard similarity of the feature sets.
+    """
+
+    def __init__(self, num_perm: int = 64, bands: int = 16, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        rng = random.Random(seed)
+        self._perms = [(rng.randrange(1, _MERSENNE), rng.randrange(0, _MERSENNE)) for _ in range(num_perm)]
+        self._rows = num_perm // bands
+        self._signatures: dict = {}
+        self._buckets: dict = {}
+        self._lock = threading.Lock()
+
+    def signature(self, text: str) -> tuple:
+        hashes = [
+            int.from_bytes(hashlib.blake2b(f.encode(), digest_size=8).digest(), "big") for f in features(text)
+        ]
+        if not hashes:
+            return ()
+        return tuple(min((a * h + b) % _MERSENNE for h in hashes) for a, b in self._perms)
+
+    def _bands(self, signature: tuple) -> list:
+        return [(i, signature[i : i + self._rows]) for i in range(0, len(signature), self._rows)]
+
+    def add(self, key, text: str):
+        signature = self.signature(text)
+        if not signature:
+            return
+        with self._lock:
+            self._remove(key)
+            self._signatures[key] = signature
+            for band in self._bands(signature):
+                self._buckets.setdefault(band, set()).add(key)
+
+    def remove(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key):
+        signature = self._signatures.pop(key, None)
+        if signature is None:
+            return
+        for band in self._bands(signature):
+            bucket = self._buckets.get(band)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band]
+
+    def query(self, text: str, min_similarity: float = 0.0) -> list:
+        """Return (key, similarity) pairs of indexed texts at least `min_similarity` alike, best first."""
+        signature = self.signature(text)
+        if not signature:
+            return []
+        with self._lock:
+            candidates = set()
+            for band in self._bands(signature):
+                candidates |= self._buckets.get(band, set())
+            scored = [
+                (key, sum(x == y for x, y in zip(signature, self._signatures[key])) / len(signature))
+                for key in candidates
+            ]
+        return sorted(((k, s) for k, s in scored if s >= min_similarity), key=lambda item: item[1], reverse=True)
+
+    def keys(self) -> list:
+        with self._lock:
+            return list(self._signatures)
+
+    def __len__(self) -> int:
+        return len(self._signatures)
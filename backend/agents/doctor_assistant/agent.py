@@ -1,11 +1,23 @@
 """
 Doctor AI Assistant – direct-call approach.
 Fetches all patient data upfront in Python, passes to the LLM as context,
-and parses the structured JSON response. No agent tool loop.
+and gets back a schema-validated suggestion (agents.core.structured). No agent tool loop.
 """
 
 import json
+import os
+
+from pydantic import BaseModel
+
+from agents.core import structured
+from agents.core.scheduler import LLMOverloaded
+from agents.core.text import normalize
+from agents.doctor_assistant.catalog import catalog
+from concurrency import coalesce
 from database import supabase
+from services import patient_history
+
+MEDICINES_TOP_K = int(os.environ.get("DOCTOR_ASSIST_MEDICINES_TOP_K", "40"))
 
 
 def _fetch_patient(nik: str) -> dict | None:
@@ -40,52 +52,61 @@ def _fetch_current_ticket(patient_id: str) -> dict | None:
 
 def _fetch_history(patient_id: str) -> list:
     try:
-        res = (
-            supabase.table("tickets")
-            .select("id, fo_note, doctor_note, status, severity_level, created_at, doctor_id")
-            .eq("patient_id", patient_id)
-            .order("created_at", desc=True)
-            .limit(10)
-            .execute()
-        )
-        doctor_ids = list(set(t["doctor_id"] for t in (res.data or []) if t.get("doctor_id")))
-        doctor_map = {}
-        if doctor_ids:
-            doc_res = supabase.table("profiles").select("id, name, specialization").in_("id", doctor_ids).execute()
-            for doc in doc_res.data or []:
-                doctor_map[doc["id"]] = {"name": doc.get("name"), "specialization": doc.get("specialization")}
-
-        history = []
-        for t in res.data or []:
-            doc = doctor_map.get(t.get("doctor_id"), {})
-            history.append({
-                "complaint": t.get("fo_note", ""),
-                "diagnosis": t.get("doctor_note", ""),
-                "doctor": doc.get("name", "N/A"),
-                "specialization": doc.get("specialization", "N/A"),
-                "status": t["status"],
-                "severity": t.get("severity_level", ""),
-                "date": t.get("created_at", ""),
-            })
-        return history
+        return [
+            {
+                "complaint": h["complaint"],
+                "diagnosis": h["doctor_diagnosis"],
+                "doctor": h["doctor_name"],
+                "specialization": h["specialization"],
+                "status": h["status"],
+                "severity": h["severity"],
+                "date": h["date"],
+            }
+            for h in patient_history.get_patient_history(patient_id)
+        ]
     except Exception:
         return []
 
 
-def _fetch_medicines() -> list:
-    try:
-        res = (
-            supabase.table("catalog_medicines")
-            .select("id, name, price, stock")
-            .gt("stock", 0)
-            .order("name")
-            .execute()
+def _fetch_medicines(ticket: dict | None, history: list, doctor_draft: str = None) -> list:
+    """In-stock medicines most relevant to the current complaint, draft and past diagnoses."""
+    query = " ".join(
+        filter(
+            None,
+            [
+                (ticket or {}).get("fo_note"),
+                (ticket or {}).get("doctor_note"),
+                doctor_draft,
+                *(h.get("diagnosis") for h in history[:3]),
+            ],
         )
-        return res.data or []
+    )
+    try:
+        return catalog.search(query, MEDICINES_TOP_K)
     except Exception:
         return []
 
 
+def _format_medicines(medicines: list) -> str:
+    if not medicines:
+        return "No medicines in stock."
+    return "\n".join(f"- [{m['id']}] {m['name']} (stock: {m['stock']})" for m in medicines)
+
+
+class SuggestedMedicine(BaseModel):
+    medicine_id: int
+    name: str
+    quantity: int
+    notes: str
+
+
+class Suggestion(BaseModel):
+    diagnosis: str
+    treatment_plan: str
+    medicines: list[SuggestedMedicine]
+    reasoning: str
+
+
 SYSTEM_PROMPT = """You are a Doctor AI Assistant at MediSync Hospital.
 You help doctors by analyzing patient data and providing diagnostic suggestions.
 
@@ -109,6 +130,8 @@ Rules:
 """
 
 
+# Duplicate requests (e.g. a double-clicked "assist") share one LLM call
+@coalesce("doctor_suggestion", key=lambda nik, doctor_draft=None: (nik.strip(), normalize(doctor_draft)))
 def get_doctor_suggestion(nik: str, doctor_draft: str = None) -> dict:
     """
     Fetches all data, sends to LLM, parses the structured response.
@@ -120,7 +143,7 @@ def get_doctor_suggestion(nik: str, doctor_draft: str = None) -> dict:
 
     ticket = _fetch_current_ticket(patient["id"])
     history = _fetch_history(patient["id"])
-    medicines = _fetch_medicines()
+    medicines = _fetch_medicines(ticket, history, doctor_draft)
 
     # 2. Build context prompt
     prompt = f"""## Patient
@@ -133,7 +156,8 @@ Name: {patient['name']}, Age: {patient.get('age', 'N/A')}, NIK: {patient['nik']}
 {json.dumps(history, indent=2, ensure_ascii=False, default=str) if history else "No previous history."}
 
 ## Available Medicine Catalog
-{json.dumps(medicines, indent=2, ensure_ascii=False)}
+Format: - [medicine_id] name (stock). Relevant in-stock medicines only.
+{_format_medicines(medicines)}
 """
 
     if doctor_draft:
@@ -150,61 +174,38 @@ The doctor has not written notes yet. Provide a comprehensive diagnostic suggest
 
     # 3. Call LLM directly (no agent, no tools)
     try:
-        import os
-        from openai import OpenAI
-
-        client = OpenAI(
-            api_key=os.environ.get("AI_API_KEY", ""),
-            base_url=os.environ.get("AI_BASE_URL", "https://openrouter.ai/api/v1"),
-        )
-
-        response = client.chat.completions.create(
-            model=os.environ.get("AI_MODEL_ID", ""),
-            messages=[
+        suggestion = structured.generate(
+            "doctor_assistant",
+            [
                 {"role": "system", "content": SYSTEM_PROMPT},
                 {"role": "user", "content": prompt},
             ],
-            temperature=0.3,
-        )
-
-        raw_text = response.choices[0].message.content or ""
-
-        # Parse JSON response
-        # Strip markdown code fences if present
-        cleaned = raw_text.strip()
-        if cleaned.startswith("```"):
-            cleaned = cleaned.split("\n", 1)[1] if "\n" in cleaned else cleaned[3:]
-            if cleaned.endswith("```"):
-                cleaned = cleaned[:-3]
-            cleaned = cleaned.strip()
-
-        suggestion = json.loads(cleaned)
-
-        # Validate medicines against catalog
-        catalog_ids = {m["id"] for m in medicines}
+            Suggestion,
+        ).value
+
+        # Validate medicines against the full catalog, not just the subset in the prompt
+        try:
+            catalog_ids = catalog.ids()
+        except Exception:
+            catalog_ids = {m["id"] for m in medicines}
         valid_medicines = []
-        for med in suggestion.get("medicines", []):
-            if med.get("medicine_id") in catalog_ids:
-                valid_medicines.append({
-                    "medicine_id": med["medicine_id"],
-                    "name": med.get("name", ""),
-                    "quantity": med.get("quantity", 1),
-                    "notes": med.get("notes", ""),
-                })
+        for med in suggestion.medicines:
+            if med.medicine_id in catalog_ids:
+                valid_medicines.append(med.model_dump())
 
         return {
             "status": "success",
             "suggestion": {
-                "diagnosis": suggestion.get("diagnosis", ""),
-                "treatment_plan": suggestion.get("treatment_plan", ""),
+                "diagnosis": suggestion.diagnosis,
+                "treatment_plan": suggestion.treatment_plan,
                 "medicines": valid_medicines,
                 "requires_inpatient": False,
-                "reasoning": suggestion.get("reasoning", ""),
+                "reasoning": suggestion.reasoning,
             },
         }
 
-    except json.JSONDecodeError:
-        # LLM didn't return valid JSON, use raw text as reasoning
+    except structured.StructuredOutputError as e:
+        # No valid JSON even after a repair turn: use the raw text as reasoning
         return {
             "status": "success",
             "suggestion": {
@@ -212,9 +213,11 @@ The doctor has not written notes yet. Provide a comprehensive diagnostic suggest
                 "treatment_plan": "",
                 "medicines": [],
                 "requires_inpatient": False,
-                "reasoning": raw_text if raw_text else "AI could not generate a structured response.",
+                "reasoning": e.raw or "AI could not generate a structured response.",
             },
         }
+    except LLMOverloaded:
+        raise
     except Exception as e:
         return {
             "status": "error",
@@ -0,0 +1,83 @@
+"""
+In-memory medicine catalog index for the doctor assistant.
+
+In-stock medicines are loaded once and indexed for local TF-IDF search over
+their names, so each suggestion only sends the medicines relevant to the
+case instead of the whole catalog. The snapshot is re-validated with a cheap
+fingerprint query (row count + latest updated_at).
+
+Configuration from .env:
+  - MEDICINE_CATALOG_CHECK_SECONDS: Seconds between fingerprint checks (default: 30)
+  - MEDICINE_CATALOG_REFRESH_SECONDS: Max seconds between full reloads (default: 600)
+"""
+
+import os
+
+from agents.core.text import TfidfIndex
+from cache import RefreshingSnapshot
+from database import supabase
+
+
+class MedicineCatalog(RefreshingSnapshot):
+    def __init__(self):
+        super().__init__(
+            "medicine_catalog",
+            refresh_seconds=float(os.environ.get("MEDICINE_CATALOG_REFRESH_SECONDS", "600")),
+            check_seconds=float(os.environ.get("MEDICINE_CATALOG_CHECK_SECONDS", "30")),
+        )
+        self._medicines: list = []
+        self._by_id: dict = {}
+        self._index = TfidfIndex([])
+
+    def _fingerprint(self) -> tuple:
+        res = (
+            supabase.table("catalog_medicines")
+            .select("updated_at", count="exact")
+            .gt("stock", 0)
+            .order("updated_at", desc=True)
+            .limit(1)
+            .execute()
+        )
+        latest = res.data[0]["updated_at"] if res.data else None
+        return res.count, latest
+
+    def _load(self):
+        res = (
+            supabase.table("catalog_medicines")
+            .select("id, name, price, stock")
+            .gt("stock", 0)
+            .order("name")
+            .execute()
+        )
+        medicines = res.data or []
+        index = TfidfIndex([m["name"] for m in medicines])
+        self._medicines, self._by_id, self._index = medicines, {m["id"]: m for m in medicines}, index
+
+    def all(self) -> list:
+        self.ensure_fresh()
+        return list(self._medicines)
+
+    def get(self, medicine_id) -> dict | None:
+        self.ensure_fresh()
+        return self._by_id.get(medicine_id)
+
+    def ids(self) -> set:
+        self.ensure_fresh()
+        return set(self._by_id)
+
+    def search(self, query: str, top_k: int) -> list:
+        """
+        The `top_k` medicines most relevant to `query`, best first. When fewer
+        than `top_k` names match, the rest is filled with other in-stock
+        medicines in catalog order, so small catalogs are sent in full.
+        """
+        self.ensure_fresh()
+        medicines, index = self._medicines, self._index
+        picked = [idx for idx, _ in index.search(query, top_k)]
+        if len(picked) < top_k:
+            seen = set(picked)
+            picked.extend(i for i in range(len(medicines)) if i not in seen)
+        return [medicines[i] for i in picked[:top_k]]
+
+
+catalog = MedicineCatalog()
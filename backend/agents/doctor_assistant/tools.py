@@ -3,6 +3,7 @@ import json
 from strands import tool
 
 from database import supabase
+from services import patient_history
 
 
 @tool
@@ -39,50 +40,19 @@ def get_patient_ticket_history(patient_id: str) -> str:
         JSON string with list of past tickets (complaint, diagnosis, status, date).
     """
     try:
-        res = (
-            supabase.table("tickets")
-            .select(
-                "id, fo_note, doctor_note, status, severity_level, ai_reasoning, created_at, doctor_id"
-            )
-            .eq("patient_id", patient_id)
-            .order("created_at", desc=True)
-            .limit(10)
-            .execute()
-        )
-
-        # Collect doctor IDs to look up names
-        doctor_ids = list(set(
-            t["doctor_id"] for t in (res.data or []) if t.get("doctor_id")
-        ))
-        doctor_map = {}
-        if doctor_ids:
-            doc_res = (
-                supabase.table("profiles")
-                .select("id, name, specialization")
-                .in_("id", doctor_ids)
-                .execute()
-            )
-            for doc in doc_res.data or []:
-                doctor_map[doc["id"]] = {
-                    "name": doc.get("name", "N/A"),
-                    "specialization": doc.get("specialization", "N/A"),
-                }
-
-        history = []
-        for ticket in res.data or []:
-            doc_info = doctor_map.get(ticket.get("doctor_id"), {})
-            history.append(
-                {
-                    "ticket_id": ticket["id"],
-                    "complaint": ticket.get("fo_note", ""),
-                    "doctor_diagnosis": ticket.get("doctor_note", ""),
-                    "doctor_name": doc_info.get("name", "N/A"),
-                    "specialization": doc_info.get("specialization", "N/A"),
-                    "status": ticket["status"],
-                    "severity": ticket.get("severity_level", ""),
-                    "date": ticket.get("created_at", ""),
-                }
-            )
+        history = [
+            {
+                "ticket_id": h["ticket_id"],
+                "complaint": h["complaint"],
+                "doctor_diagnosis": h["doctor_diagnosis"],
+                "doctor_name": h["doctor_name"],
+                "specialization": h["specialization"],
+                "status": h["status"],
+                "severity": h["severity"],
+                "date": h["date"],
+            }
+            for h in patient_history.get_patient_history(patient_id)
+        ]
 
         if not history:
             return json.dumps({"message": "No medical history found (new patient)."})
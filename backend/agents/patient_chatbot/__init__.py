@@ -1,3 +1,3 @@
-from .chatbot import chat_with_patient
+from .chatbot import chat_with_patient, stream_chat_with_patient
 
-__all__ = ["chat_with_patient"]
+__all__ = ["chat_with_patient", "stream_chat_with_patient"]
@@ -1,7 +1,7 @@
-import os
-
-from openai import OpenAI
-from database import supabase
+from agents.core.llm import chat_completion
+from agents.core.scheduler import LLMOverloaded
+from . import context as chat_context
+from services import chat_messages, patient_history, ticket_context
 
 CHATBOT_SYSTEM_PROMPT = """You are MediSync's Patient Health Assistant. You help patients understand their medical situation based on their doctor's diagnosis and notes.
 
@@ -19,107 +19,20 @@ CHATBOT_SYSTEM_PROMPT = """You are MediSync's Patient Health Assistant. You help
 
 
 def _get_ticket_context(ticket_id: str) -> dict:
-    """Fetch the ticket and related medical context."""
+    """Load the ticket and related medical context (cached, see services.ticket_context)."""
     context = {"ticket": None, "patient_id": None, "has_doctor_notes": False}
 
     try:
-        # Fetch the ticket with doctor info
-        res = (
-            supabase.table("tickets")
-            .select(
-                "id, patient_id, fo_note, doctor_note, status, severity_level, created_at, doctor_id"
-            )
-            .eq("id", ticket_id)
-            .single()
-            .execute()
-        )
-
-        ticket = res.data
+        ticket = ticket_context.get_ticket_context(ticket_id)
         if not ticket:
             context["error"] = "Ticket not found."
             return context
 
         context["patient_id"] = ticket["patient_id"]
-
-        # Resolve doctor info from profiles
-        doc_name = "N/A"
-        doc_spec = "N/A"
-        if ticket.get("doctor_id"):
-            doc_res = (
-                supabase.table("profiles")
-                .select("name, specialization")
-                .eq("id", ticket["doctor_id"])
-                .single()
-                .execute()
-            )
-            if doc_res.data:
-                doc_name = doc_res.data.get("name", "N/A")
-                doc_spec = doc_res.data.get("specialization", "N/A")
-
-        context["ticket"] = {
-            "ticket_id": ticket["id"],
-            "complaint": ticket.get("fo_note", ""),
-            "doctor_diagnosis": ticket.get("doctor_note", ""),
-            "doctor_name": doc_name,
-            "specialization": doc_spec,
-            "status": ticket["status"],
-            "severity": ticket.get("severity_level", ""),
-            "date": ticket.get("created_at", ""),
-        }
-
-        if ticket.get("doctor_note"):
-            context["has_doctor_notes"] = True
-
-        # Fetch patient history (other tickets)
-        history_res = (
-            supabase.table("tickets")
-            .select(
-                "id, fo_note, doctor_note, status, severity_level, created_at, doctor_id"
-            )
-            .eq("patient_id", ticket["patient_id"])
-            .neq("id", ticket_id)
-            .order("created_at", desc=True)
-            .limit(5)
-            .execute()
-        )
-
-        # Collect doctor IDs from history
-        hist_doc_ids = list(set(
-            h["doctor_id"] for h in (history_res.data or []) if h.get("doctor_id")
-        ))
-        hist_doc_map = {}
-        if hist_doc_ids:
-            hd_res = (
-                supabase.table("profiles")
-                .select("id, name, specialization")
-                .in_("id", hist_doc_ids)
-                .execute()
-            )
-            for d in hd_res.data or []:
-                hist_doc_map[d["id"]] = {"name": d.get("name", "N/A"), "specialization": d.get("specialization", "N/A")}
-
-        context["history"] = []
-        for h in history_res.data or []:
-            if h.get("doctor_note"):
-                hd = hist_doc_map.get(h.get("doctor_id"), {})
-                context["history"].append(
-                    {
-                        "complaint": h.get("fo_note", ""),
-                        "doctor_diagnosis": h.get("doctor_note", ""),
-                        "doctor_name": hd.get("name", "N/A"),
-                        "specialization": hd.get("specialization", "N/A"),
-                        "date": h.get("created_at", ""),
-                    }
-                )
-
-        # Fetch prescriptions for this ticket
-        pres_res = (
-            supabase.table("prescriptions")
-            .select("quantity, notes, medicine:catalog_medicines(name)")
-            .eq("ticket_id", ticket_id)
-            .execute()
-        )
-        context["prescriptions"] = pres_res.data or []
+        context["ticket"] = ticket
+        context["prescriptions"] = ticket["prescriptions"]
+        context["has_doctor_notes"] = bool(ticket["doctor_diagnosis"])
+        context["block"] = _render_ticket_block(ticket, ticket["prescriptions"])
 
     except Exception as e:
         context["error"] = str(e)
@@ -127,122 +40,136 @@ def _get_ticket_context(ticket_id: str) -> dict:
     return context
 
 
-def _get_chat_history(ticket_id: str, limit: int = 20) -> list:
-    """Fetch recent chat history for context."""
-    try:
-        res = (
-            supabase.table("chat_messages")
-            .select("sender, message, created_at")
-            .eq("ticket_id", ticket_id)
-            .order("created_at", desc=False)
-            .limit(limit)
-            .execute()
-        )
-        return res.data or []
-    except Exception:
-        return []
+def _render_ticket_block(ticket: dict, prescriptions: list) -> str:
+    """Render the current visit and its prescriptions for the system prompt."""
+    block = "=== CURRENT VISIT ===\n\n"
+    block += f"Date: {ticket['date']}\n"
+    block += f"Doctor: {ticket['doctor_name']} ({ticket['specialization']})\n"
+    block += f"Complaint: {ticket['complaint']}\n"
+    block += f"Doctor's Diagnosis/Notes: {ticket['doctor_diagnosis']}\n"
+    block += f"Severity: {ticket['severity']}\n"
+    block += f"Status: {ticket['status']}\n\n"
+
+    if prescriptions:
+        block += "--- Prescribed Medicines ---\n"
+        for p in prescriptions:
+            med_name = (p.get("medicine") or {}).get("name", "Unknown")
+            block += f"- {med_name}: {p['quantity']} units. Notes: {p.get('notes', '-')}\n"
+        block += "\n"
+    return block
+
+
+def _render_history_block(patient_id: str, ticket_id: str) -> str:
+    """Past visits with a diagnosis, from the shared cached patient-history service."""
+    history = [
+        h
+        for h in patient_history.get_patient_history(patient_id, limit=5, exclude_ticket_id=ticket_id)
+        if h["doctor_diagnosis"]
+    ]
+    if not history:
+        return ""
+    block = "=== PAST VISITS ===\n\n"
+    for h in history:
+        block += f"Date: {h['date']}\n"
+        block += f"Doctor: {h['doctor_name']} ({h['specialization']})\n"
+        block += f"Complaint: {h['complaint']}\n"
+        block += f"Diagnosis: {h['doctor_diagnosis']}\n\n"
+    return block
 
 
-def chat_with_patient(ticket_id: str, message: str) -> dict:
-    """
-    Process a patient chat message and return AI response.
+NO_NOTES_REPLY = "Your doctor hasn't provided any notes yet. Please wait for your examination to be completed, or contact the front office for more information."
 
-    Args:
-        ticket_id: UUID of the ticket (belongs to one patient).
-        message: The patient's chat message.
+
+def _prepare_chat(ticket_id: str, message: str) -> dict:
+    """
+    Load the ticket context and chat history and build the LLM messages.
+    Returns {"response": ...} when the reply does not need the LLM,
+    otherwise {"messages": ..., "patient_id": ..., "question": ..., "older": ..., "window": ...}
+    where `question` is the patient's chat_messages row (timestamped now) and
+    `older` are the loaded messages that did not fit the history window.
     """
     # Get ticket context
     context = _get_ticket_context(ticket_id)
 
     if context.get("error"):
-        return {"status": "error", "message": context["error"]}
+        return {"response": {"status": "error", "message": context["error"]}}
 
     if not context["has_doctor_notes"]:
         return {
-            "status": "success",
-            "reply": "Your doctor hasn't provided any notes yet. Please wait for your examination to be completed, or contact the front office for more information.",
-            "has_context": False,
+            "response": {
+                "status": "success",
+                "reply": NO_NOTES_REPLY,
+                "has_context": False,
+            }
         }
 
     patient_id = context["patient_id"]
-    ticket = context["ticket"]
-
-    # Build context string for the AI
-    context_str = "=== CURRENT VISIT ===\n\n"
-    context_str += f"Date: {ticket['date']}\n"
-    context_str += f"Doctor: {ticket['doctor_name']} ({ticket['specialization']})\n"
-    context_str += f"Complaint: {ticket['complaint']}\n"
-    context_str += f"Doctor's Diagnosis/Notes: {ticket['doctor_diagnosis']}\n"
-    context_str += f"Severity: {ticket['severity']}\n"
-    context_str += f"Status: {ticket['status']}\n\n"
-
-    if context.get("prescriptions"):
-        context_str += "--- Prescribed Medicines ---\n"
-        for p in context["prescriptions"]:
-            med_name = p.get("medicine", {}).get("name", "Unknown")
-            context_str += (
-                f"- {med_name}: {p['quantity']} units. Notes: {p.get('notes', '-')}\n"
-            )
-        context_str += "\n"
-
-    if context.get("history"):
-        context_str += "=== PAST VISITS ===\n\n"
-        for h in context["history"]:
-            context_str += f"Date: {h['date']}\n"
-            context_str += f"Doctor: {h['doctor_name']} ({h['specialization']})\n"
-            context_str += f"Complaint: {h['complaint']}\n"
-            context_str += f"Diagnosis: {h['doctor_diagnosis']}\n\n"
-
-    # Get chat history
-    chat_history = _get_chat_history(ticket_id)
+    context_str = context["block"] + _render_history_block(patient_id, ticket_id)
+
+    # Recent turns within the token budget; older turns are covered by the rolling summary
+    older, window = chat_context.split_window(chat_context.recent_messages(ticket_id))
+    summary = chat_context.get_summary(ticket_id) if older else None
+    summary_str = ""
+    if summary:
+        summary_str = f"=== EARLIER IN THIS CONVERSATION ===\n\n{summary['summary']}\n\n"
 
     # Build messages for LLM
-    messages = [
-        {"role": "system", "content": CHATBOT_SYSTEM_PROMPT + "\n\n" + context_str}
-    ]
+    system_prompt = CHATBOT_SYSTEM_PROMPT + "\n\n" + context_str + summary_str
+    messages = [{"role": "system", "content": system_prompt}]
 
-    for msg in chat_history:
+    for msg in window:
         role = "user" if msg["sender"] == "patient" else "assistant"
         messages.append({"role": role, "content": msg["message"]})
 
     messages.append({"role": "user", "content": message})
 
+    chat_context.record_prompt(
+        {
+            "context": context_str,
+            "summary": summary_str,
+            "history": "\n".join(m["message"] for m in window),
+            "message": message,
+        }
+    )
+    return {
+        "messages": messages,
+        "patient_id": patient_id,
+        "question": chat_messages.message(ticket_id, patient_id, "patient", message),
+        "older": older,
+        "window": window,
+    }
+
+
+def _save_messages(ticket_id: str, prepared: dict, reply: str):
+    """Queue the patient message and the AI reply for writing to chat_messages (write-behind)."""
+    chat_messages.save(
+        [
+            prepared["question"],
+            chat_messages.message(ticket_id, prepared["patient_id"], "ai", reply),
+        ]
+    )
+
+
+def chat_with_patient(ticket_id: str, message: str) -> dict:
+    """
+    Process a patient chat message and return AI response.
+
+    Args:
+        ticket_id: UUID of the ticket (belongs to one patient).
+        message: The patient's chat message.
+    """
+    prepared = _prepare_chat(ticket_id, message)
+    if "response" in prepared:
+        return prepared["response"]
+
     # Call LLM directly (no agent needed, just a simple chat)
     try:
-        api_key = os.environ.get("AI_API_KEY", "")
-        model_id = os.environ.get("AI_MODEL_ID")
-        base_url = os.environ.get("AI_BASE_URL", "https://openrouter.ai/api/v1")
-
-        client = OpenAI(api_key=api_key, base_url=base_url)
-        response = client.chat.completions.create(
-            model=model_id,
-            messages=messages,
-            max_tokens=1024,
-            temperature=0.7,
-        )
+        response = chat_completion("chat", prepared["messages"])
 
         reply = response.choices[0].message.content
 
-        # Save both messages to chat_messages
-        try:
-            supabase.table("chat_messages").insert(
-                [
-                    {
-                        "ticket_id": ticket_id,
-                        "patient_id": patient_id,
-                        "sender": "patient",
-                        "message": message,
-                    },
-                    {
-                        "ticket_id": ticket_id,
-                        "patient_id": patient_id,
-                        "sender": "ai",
-                        "message": reply,
-                    },
-                ]
-            ).execute()
-        except Exception:
-            pass  # Don't fail the response if chat persistence fails
+        _save_messages(ticket_id, prepared, reply)
+        chat_context.schedule_summary_update(ticket_id, prepared["older"], prepared["window"])
 
         return {
             "status": "success",
@@ -251,8 +178,58 @@ def chat_with_patient(ticket_id: str, message: str) -> dict:
             "ticket_id": ticket_id,
         }
 
+    except LLMOverloaded:
+        raise
     except Exception as e:
         return {
             "status": "error",
             "message": f"Chat error: {str(e)}",
         }
+
+
+def stream_chat_with_patient(ticket_id: str, message: str):
+    """
+    Streaming variant of chat_with_patient.
+    Yields ("token", text) for every content delta while the completion is generated,
+    then a single ("done", response) or ("error", response) event.
+    Messages are saved once the stream has finished.
+
+    Args:
+        ticket_id: UUID of the ticket (belongs to one patient).
+        message: The patient's chat message.
+    """
+    try:
+        prepared = _prepare_chat(ticket_id, message)
+    except Exception as e:
+        yield "error", {"status": "error", "message": f"Chat error: {str(e)}"}
+        return
+
+    if "response" in prepared:
+        response = prepared["response"]
+        yield ("error" if response["status"] == "error" else "done"), response
+        return
+
+    try:
+        parts = []
+        with chat_completion("chat", prepared["messages"], stream=True) as stream:
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+                    yield "token", delta
+        reply = "".join(parts)
+    except Exception as e:
+        yield "error", {"status": "error", "message": f"Chat error: {str(e)}"}
+        return
+
+    _save_messages(ticket_id, prepared, reply)
+    chat_context.schedule_summary_update(ticket_id, prepared["older"], prepared["window"])
+
+    yield "done", {
+        "status": "success",
+        "reply": reply,
+        "has_context": True,
+        "ticket_id": ticket_id,
+    }
@@ -0,0 +1,192 @@
+"""
+Bounded prompt context for the patient chatbot.
+
+A turn's prompt is the system prompt, the ticket's context block (cached by
+services.ticket_context), a rolling summary of older turns, the most recent
+turns that fit a token budget and the new message, so its size stays roughly
+constant however long the chat runs. Turns that slide out of the window are
+folded into a per-ticket summary (`chat_summaries`) by a background LLM call
+once enough of them have accumulated, after the reply has been sent.
+
+Configuration from .env:
+  - CHAT_HISTORY_TOKEN_BUDGET: Approx. tokens of recent turns sent verbatim (default: 1500)
+  - CHAT_HISTORY_FETCH_LIMIT: Max recent messages loaded per turn (default: 50)
+  - CHAT_SUMMARY_MIN_MESSAGES: Messages outside the window before the summary is updated (default: 6)
+  - CHAT_SUMMARY_CACHE_SIZE: Max ticket summaries kept in memory (default: 2048)
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import metrics
+import tracing
+from agents.core.llm import chat_completion
+from agents.core.text import estimate_tokens
+from cache import TTLCache
+from database import supabase
+from services import chat_messages
+
+HISTORY_TOKEN_BUDGET = int(os.environ.get("CHAT_HISTORY_TOKEN_BUDGET", "1500"))
+HISTORY_FETCH_LIMIT = int(os.environ.get("CHAT_HISTORY_FETCH_LIMIT", "50"))
+SUMMARY_MIN_MESSAGES = int(os.environ.get("CHAT_SUMMARY_MIN_MESSAGES", "6"))
+SUMMARY_BATCH_LIMIT = 200  # max messages folded into the summary by one update
+
+_summaries = TTLCache(
+    "chat_summaries", maxsize=int(os.environ.get("CHAT_SUMMARY_CACHE_SIZE", "2048")), ttl=3600
+)
+
+_prompt_tokens = metrics.histogram(
+    "chat_prompt_tokens",
+    "Estimated prompt tokens per chatbot turn, by part",
+    buckets=(100, 250, 500, 1000, 1500, 2000, 3000, 4000, 6000, 8000, 16000),
+)
+_summary_updates = metrics.counter("chat_summary_updates_total", "Rolling chat summary updates, by outcome")
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a patient and MediSync's Patient Health Assistant.
+Update the previous summary with the new messages.
+
+<rules>
+1. Keep every fact the patient shared (symptoms, concerns, questions, how they take their medicines) and what the assistant told them.
+2. Drop greetings and small talk.
+3. Write at most 150 words, in the language of the conversation.
+4. Output only the updated summary.
+</rules>"""
+
+
+# --- Chat history window ---
+
+def recent_messages(ticket_id: str) -> list:
+    """The ticket's most recent chat messages (including ones still being written), oldest first."""
+    try:
+        return chat_messages.recent(ticket_id, HISTORY_FETCH_LIMIT)
+    except Exception:
+        return []
+
+
+def split_window(messages: list, budget: int = HISTORY_TOKEN_BUDGET) -> tuple:
+    """
+    Split messages (oldest first) into (older, window): `window` holds the most
+    recent messages fitting in `budget` tokens. Messages sharing a timestamp stay
+    on the same side, so a turn is never cut in half.
+    """
+    used = 0
+    start = len(messages)
+    while start > 0:
+        cost = estimate_tokens(messages[start - 1]["message"])
+        if used + cost > budget:
+            break
+        used += cost
+        start -= 1
+    while 0 < start < len(messages) and messages[start - 1]["created_at"] == messages[start]["created_at"]:
+        start += 1
+    return messages[:start], messages[start:]
+
+
+def record_prompt(parts: dict):
+    """Publish the estimated token size of each prompt part (and the total)."""
+    total = 0
+    for part, text in parts.items():
+        tokens = estimate_tokens(text)
+        total += tokens
+        _prompt_tokens.observe(tokens, part=part)
+    _prompt_tokens.observe(total, part="total")
+
+
+# --- Rolling summary ---
+
+def get_summary(ticket_id: str) -> dict | None:
+    """The ticket's rolling summary row ({"summary", "summarized_until"}), or None."""
+    row = _summaries.get(ticket_id)
+    if row is None:
+        try:
+            res = (
+                supabase.table("chat_summaries")
+                .select("summary, summarized_until")
+                .eq("ticket_id", ticket_id)
+                .limit(1)
+                .execute()
+            )
+        except Exception:
+            return None
+        row = res.data[0] if res.data else {}
+        _summaries.set(ticket_id, row)
+    return row or None
+
+
+_summary_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="chat-summary")
+_updating: set = set()
+_updating_lock = threading.Lock()
+
+
+def schedule_summary_update(ticket_id: str, older: list, window: list):
+    """
+    Fold the messages that fell out of the window into the ticket's summary in
+    the background, once at least SUMMARY_MIN_MESSAGES of them are unsummarized.
+    """
+    if not older:
+        return
+    summary = get_summary(ticket_id)
+    since = summary["summarized_until"] if summary else None
+    pending = [m for m in older if since is None or m["created_at"] > since]
+    if len(pending) < SUMMARY_MIN_MESSAGES:
+        return
+
+    with _updating_lock:
+        if ticket_id in _updating:
+            return
+        _updating.add(ticket_id)
+    until = window[0]["created_at"] if window else None
+    _summary_pool.submit(_update_summary, ticket_id, summary, until)
+
+
+def _update_summary(ticket_id: str, summary: dict | None, until: str | None):
+    try:
+        with tracing.background_trace("chat summary"):
+            query = (
+                supabase.table("chat_messages")
+                .select("sender, message, created_at")
+                .eq("ticket_id", ticket_id)
+            )
+            if summary:
+                query = query.gt("created_at", summary["summarized_until"])
+            if until:
+                query = query.lt("created_at", until)
+            res = query.order("created_at").order("sender", desc=True).limit(SUMMARY_BATCH_LIMIT).execute()
+            messages = res.data or []
+            if not messages:
+                return
+
+            transcript = "\n".join(
+                f"{'Patient' if m['sender'] == 'patient' else 'Assistant'}: {m['message']}" for m in messages
+            )
+            response = chat_completion(
+                "chat_summary",
+                [
+                    {"role": "system", "content": SUMMARY_PROMPT},
+                    {
+                        "role": "user",
+                        "content": f"<previous_summary>\n{(summary or {}).get('summary', '')}\n</previous_summary>\n\n"
+                        f"<new_messages>\n{transcript}\n</new_messages>",
+                    },
+                ],
+            )
+            text = (response.choices[0].message.content or "").strip()
+            if not text:
+                _summary_updates.inc(outcome="empty")
+                return
+
+            row = {"summary": text, "summarized_until": messages[-1]["created_at"]}
+            supabase.table("chat_summaries").upsert(
+                {"ticket_id": ticket_id, **row, "updated_at": datetime.now(timezone.utc).isoformat()},
+                on_conflict="ticket_id",
+            ).execute()
+            _summaries.set(ticket_id, row)
+            _summary_updates.inc(outcome="ok")
+    except Exception:
+        # The window still holds the recent turns; the next eligible turn retries
+        _summary_updates.inc(outcome="error")
+    finally:
+        with _updating_lock:
+            _updating.discard(ticket_id)
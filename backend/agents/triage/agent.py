@@ -1,20 +1,83 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from typing import Literal
+
+from pydantic import BaseModel, Field
 from strands import Agent
 
-from agents.core.llm import create_model
+import metrics
+from agents.core import structured
+from agents.core.llm import create_model, invoke_agent
+from agents.core.scheduler import LLMOverloaded
+from agents.core.text import normalize
+from concurrency import coalesce
+from services.doctor_directory import normalize_specialization
+from . import prefilter
+from .specialization import specialization_model
 from .tools import (
+    fetch_available_doctors,
+    fetch_patient_history,
+    group_by_specialization,
     get_available_doctors,
     get_patient_history,
     submit_triage_decision,
     reject_complaint,
 )
-from .prompts import SYSTEM_PROMPT
+from .prompts import PREFETCHED_SYSTEM_PROMPT, SYSTEM_PROMPT
+
+# Triage mode from .env (TRIAGE_MODE):
+#   - "prefetch": doctors and patient history are loaded concurrently before the LLM call and
+#                 put into the prompt, so a single structured (JSON) reply holds the decision (default)
+#   - "tools": the model looks up doctors and history itself through tool calls
+TRIAGE_MODE = os.environ.get("TRIAGE_MODE", "prefetch")
+
+# Prefetch lookups run on their own small pool: analyze_patient already holds a worker-pool
+# slot (concurrency.run_blocking), so waiting on the same pool could deadlock it when saturated.
+#   - TRIAGE_PREFETCH_WORKERS: Doctor/history lookups running at once (default: 8)
+PREFETCH_WORKERS = int(os.environ.get("TRIAGE_PREFETCH_WORKERS", "8"))
+
+# Specialization prior (agents.triage.specialization) in prefetch mode, from .env:
+#   - TRIAGE_PRIOR_HINT_CONFIDENCE: Min confidence to put the prior in the prompt as a hint (default: 0.3)
+#   - TRIAGE_PRIOR_SHORTLIST_CONFIDENCE: Min confidence to offer only the doctors of the likely
+#                                        specializations, for a shorter prompt (default: 0.8)
+PRIOR_HINT_CONFIDENCE = float(os.environ.get("TRIAGE_PRIOR_HINT_CONFIDENCE", "0.3"))
+PRIOR_SHORTLIST_CONFIDENCE = float(os.environ.get("TRIAGE_PRIOR_SHORTLIST_CONFIDENCE", "0.8"))
+PRIOR_SHORTLIST_MIN_PROBABILITY = 0.1  # alternatives at least this likely keep their doctors in the shortlist
+
+_prefetch_pool = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="triage-prefetch")
+
+_triage_seconds = metrics.histogram("triage_latency_seconds", "End-to-end analyze_patient latency by mode")
+_triage_tokens = metrics.counter("triage_tokens_total", "LLM tokens used by triage, by mode and direction")
+_triage_cycles = metrics.counter("triage_llm_cycles_total", "LLM round trips made by triage, by mode")
+_triage_runs = metrics.counter("triage_runs_total", "Triage runs by mode")
+_prior_uses = metrics.counter("triage_specialization_prior_total", "Triage runs by use of the specialization prior")
+_prior_agreement = metrics.counter(
+    "triage_specialization_prior_agreement_total",
+    "Triage decisions by use of the specialization prior and whether the LLM chose the same specialization",
+)
+
+
+class TriageDecision(BaseModel):
+    """Structured triage answer used when the context is prefetched."""
+
+    action: Literal["triage", "reject"] = Field(description="'reject' for gibberish, vague or non-medical complaints")
+    recommended_doctor_id: str | None = Field(description="Exact id from <available_doctors>; null when rejected")
+    recommended_doctor_name: str | None = Field(description="Exact name from <available_doctors>; null when rejected")
+    predicted_specialization: str | None = Field(description="Target specialization; null when rejected")
+    requires_inpatient: bool
+    severity_level: Literal["low", "medium", "high"]
+    reasoning: str = Field(description="Reasoning for the decision, or the rejection reason in Indonesian")
 
 
 def create_triage_agent():
-    """Creates an instance of the Strands Agent for medical triage."""
-    model = create_model()
-    agent = Agent(
-        model=model,
+    """Creates an instance of the Strands Agent for medical triage (tools mode),
+    which looks up doctors and patient history through tool calls.
+    """
+    return Agent(
+        model=create_model("triage"),
         system_prompt=SYSTEM_PROMPT,
         tools=[
             get_available_doctors,
@@ -23,17 +86,21 @@ def create_triage_agent():
             reject_complaint,
         ],
     )
-    return agent
 
 
-def analyze_patient(fo_note: str, patient_id: str = None) -> dict:
-    """
-    Main function called by the router.
-    Creates the agent, sends the prompt, and extracts the triage decision.
-    """
-    agent = create_triage_agent()
+def _prefetch_context(patient_id: str = None) -> tuple[list, list]:
+    """Run the doctor and patient-history lookups concurrently."""
+    # copy_context() keeps both lookups inside the current request trace
+    doctors_future = _prefetch_pool.submit(copy_context().run, fetch_available_doctors)
+    history_future = (
+        _prefetch_pool.submit(copy_context().run, fetch_patient_history, patient_id) if patient_id else None
+    )
+    doctors = doctors_future.result()
+    history = history_future.result() if history_future else []
+    return doctors, history
+
 
-    # Build prompt
+def _build_prompt(fo_note: str, patient_id: str = None) -> str:
     prompt = f"""Please analyze the following patient complaint and make a triage decision:
 
 **Patient Complaint:**
@@ -47,69 +114,200 @@ def analyze_patient(fo_note: str, patient_id: str = None) -> dict:
         prompt += "\n*New patient, no patient_id available to check history.*\n"
 
     prompt += "\nPerform the following steps: (1) check available doctors, (2) check patient history if available, (3) submit triage decision or reject complaint."
+    return prompt
 
+
+def _apply_prior(fo_note: str, doctors: list) -> tuple[dict | None, str, list]:
+    """
+    Predict the specialization from past tickets. Returns (prior, use, doctors):
+    `use` is "shortlist" (doctors narrowed to the likely specializations), "hint"
+    (prior goes into the prompt only) or "none" (prior omitted).
+    """
     try:
-        result = agent(prompt)
-
-        # Search for tool result from submit_triage_decision or reject_complaint in messages
-        messages = agent.messages
-        decision = None
-        rejection = None
-
-        for msg in reversed(messages):
-            if isinstance(msg, dict) and msg.get("role") == "assistant":
-                for block in msg.get("content", []):
-                    if isinstance(block, dict):
-                        if (
-                            block.get("toolUse", {}).get("name")
-                            == "submit_triage_decision"
-                        ):
-                            decision = block["toolUse"].get("input", {})
-                            break
-                        elif block.get("toolUse", {}).get("name") == "reject_complaint":
-                            rejection = block["toolUse"].get("input", {})
-                            break
-            if decision or rejection:
-                break
-
-        if rejection:
-            return {
-                "status": "error",
-                "message": rejection.get(
-                    "reasoning", "The AI rejected the invalid patient complaint."
-                ),
-            }
-
-        if decision:
-            return {
-                "status": "success",
-                "analysis": {
-                    "predicted_specialization": decision.get(
-                        "predicted_specialization", "Internal Medicine"
-                    ),
-                    "recommended_doctor_id": decision.get("recommended_doctor_id"),
-                    "recommended_doctor_name": decision.get(
-                        "recommended_doctor_name", "General Practitioner"
-                    ),
-                    "requires_inpatient": decision.get("requires_inpatient", False),
-                    "severity_level": decision.get("severity_level", "medium"),
-                    "reasoning": decision.get("reasoning", str(result)),
-                },
-            }
+        prior = specialization_model.predict(fo_note)
+    except Exception:
+        prior = None
+    if prior is None or prior["confidence"] < PRIOR_HINT_CONFIDENCE:
+        return None, "none", doctors
+
+    if prior["confidence"] >= PRIOR_SHORTLIST_CONFIDENCE:
+        likely = {
+            normalize_specialization(alt["specialization"])
+            for alt in prior["alternatives"]
+            if alt["probability"] >= PRIOR_SHORTLIST_MIN_PROBABILITY
+        }
+        shortlist = [d for d in doctors if normalize_specialization(d["specialization"]) in likely]
+        if shortlist:
+            return prior, "shortlist", shortlist
+    return prior, "hint", doctors
+
+
+def _build_prefetched_prompt(fo_note: str, patient_id: str, doctors: list, history: list, prior: dict = None) -> str:
+    prompt = f"""Please analyze the following patient complaint and make a triage decision:
+
+**Patient Complaint:**
+<complaint>
+{fo_note}
+</complaint>
+
+<available_doctors>
+{json.dumps(group_by_specialization(doctors), ensure_ascii=False)}
+</available_doctors>
+"""
+    if not patient_id:
+        prompt += "\n<patient_history>\nNew patient, no patient_id available to check history.\n</patient_history>\n"
+    elif not history:
+        prompt += "\n<patient_history>\nThis patient has no prior medical history (new patient).\n</patient_history>\n"
+    else:
+        prompt += f"\n<patient_history>\n{json.dumps(history, ensure_ascii=False)}\n</patient_history>\n"
+
+    if prior:
+        likely = ", ".join(f"{alt['specialization']} ({alt['probability']:.0%})" for alt in prior["alternatives"])
+        prompt += (
+            f"\n<specialization_prior>\nPast tickets with similar complaints were treated by: {likely}.\n"
+            "This is a statistical hint; your own assessment of the complaint takes precedence.\n"
+            "</specialization_prior>\n"
+        )
+
+    prompt += "\nSubmit the triage decision or reject the complaint now."
+    return prompt
+
+
+def _record_run(mode: str, started: float, input_tokens: int, output_tokens: int, cycles: int):
+    _triage_seconds.observe(time.perf_counter() - started, mode=mode)
+    _triage_runs.inc(mode=mode)
+    _triage_tokens.inc(input_tokens, mode=mode, direction="input")
+    _triage_tokens.inc(output_tokens, mode=mode, direction="output")
+    _triage_cycles.inc(cycles, mode=mode)
+
+
+def _result(decision: dict | None, rejection: dict | None, fallback_reasoning: str = "") -> dict:
+    if rejection is not None:
+        return {
+            "status": "error",
+            "message": rejection.get(
+                "reasoning", "The AI rejected the invalid patient complaint."
+            ),
+        }
+
+    if decision is not None:
+        return {
+            "status": "success",
+            "analysis": {
+                "predicted_specialization": decision.get("predicted_specialization") or "Internal Medicine",
+                "recommended_doctor_id": decision.get("recommended_doctor_id"),
+                "recommended_doctor_name": decision.get("recommended_doctor_name") or "General Practitioner",
+                "requires_inpatient": decision.get("requires_inpatient", False),
+                "severity_level": decision.get("severity_level", "medium"),
+                "reasoning": decision.get("reasoning") or fallback_reasoning,
+            },
+        }
+
+    # Fallback: no decision was made → default routing with the model's text as reasoning
+    return {
+        "status": "success",
+        "analysis": {
+            "predicted_specialization": "Internal Medicine",
+            "recommended_doctor_id": None,
+            "recommended_doctor_name": "General Practitioner",
+            "requires_inpatient": False,
+            "severity_level": "medium",
+            "reasoning": fallback_reasoning,
+        },
+    }
+
+
+@coalesce("triage", key=lambda fo_note, patient_id=None, mode=None: (normalize(fo_note), patient_id, mode))
+def analyze_patient(fo_note: str, patient_id: str = None, mode: str = None) -> dict:
+    """
+    Main function called by the router.
+    Rejects junk complaints locally (prefilter), loads the context, asks the LLM for a decision and returns the triage result.
+
+    mode overrides TRIAGE_MODE for this call ("prefetch" or "tools").
+    """
+    rejected = prefilter.screen(fo_note, "triage")
+    if rejected is not None:
+        return rejected
+
+    mode = mode or TRIAGE_MODE
+    started = time.perf_counter()
+
+    if mode == "prefetch":
+        try:
+            doctors, history = _prefetch_context(patient_id)
+        except Exception:
+            # Lookups failed: let the model fetch the context itself
+            mode = "tools"
         else:
-            # Fallback: agent did not call the submit tool → try to parse from text
-            return {
-                "status": "success",
-                "analysis": {
-                    "predicted_specialization": "Internal Medicine",
-                    "recommended_doctor_id": None,
-                    "recommended_doctor_name": "General Practitioner",
-                    "requires_inpatient": False,
-                    "severity_level": "medium",
-                    "reasoning": str(result),
-                },
-            }
+            return _structured_triage(fo_note, patient_id, doctors, history, mode, started)
+
+    return _agent_triage(fo_note, patient_id, mode, started)
+
+
+def analyze_prefetched(fo_note: str, patient_id: str, doctors: list, history: list) -> dict:
+    """
+    Triage with doctors and patient history the caller has already loaded
+    (batch triage loads them once for the whole batch). Same result as analyze_patient.
+    """
+    rejected = prefilter.screen(fo_note, "triage")
+    if rejected is not None:
+        return rejected
+    return _structured_triage(fo_note, patient_id, doctors, history, "batch", time.perf_counter())
+
+
+def _structured_triage(fo_note: str, patient_id: str, doctors: list, history: list, mode: str, started: float) -> dict:
+    """Single LLM call whose reply is validated against TriageDecision."""
+    prior, use, doctors = _apply_prior(fo_note, doctors)
+    _prior_uses.inc(use=use)
+    try:
+        reply = structured.generate(
+            "triage",
+            [
+                {"role": "system", "content": PREFETCHED_SYSTEM_PROMPT},
+                {"role": "user", "content": _build_prefetched_prompt(fo_note, patient_id, doctors, history, prior)},
+            ],
+            TriageDecision,
+        )
+        _record_run(mode, started, reply.input_tokens, reply.output_tokens, reply.calls)
+
+        decision = reply.value.model_dump()
+        if reply.value.action == "reject":
+            return _result(None, decision)
+        if prior is not None:
+            agreed = normalize_specialization(decision["predicted_specialization"]) == normalize_specialization(
+                prior["specialization"]
+            )
+            _prior_agreement.inc(use=use, agreed=str(agreed).lower())
+        return _result(decision, None)
+
+    except structured.StructuredOutputError as e:
+        return _result(None, None, e.raw)
+    except LLMOverloaded:
+        raise
+    except Exception as e:
+        return {
+            "status": "error",
+            "message": f"AI Agent error: {str(e)}. Please perform manual triage.",
+        }
+
+
+def _agent_triage(fo_note: str, patient_id: str, mode: str, started: float) -> dict:
+    """Run the tool-calling agent and take its decision (or rejection) from the tool calls."""
+    agent = create_triage_agent()
+    try:
+        result = invoke_agent(agent, _build_prompt(fo_note, patient_id))
+        usage = result.metrics.accumulated_usage
+        _record_run(
+            mode, started, usage.get("inputTokens", 0), usage.get("outputTokens", 0), result.metrics.cycle_count
+        )
+
+        name, tool_input = structured.tool_input(agent.messages, "submit_triage_decision", "reject_complaint")
+        if name == "reject_complaint":
+            return _result(None, tool_input)
+        return _result(tool_input, None, str(result))
 
+    except LLMOverloaded:
+        raise
     except Exception as e:
         return {
             "status": "error",
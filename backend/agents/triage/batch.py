@@ -0,0 +1,80 @@
+"""
+Batch triage for front-office intake queues.
+
+A batch of complaints is triaged with the context loaded once for all of
+them: the doctor list comes from the in-memory directory a single time and
+the patients' histories are read with one bulk query (only patients missing
+from the history cache are fetched). The triage decisions then run with
+bounded parallelism and each result is yielded as soon as it completes, so
+the caller can stream results instead of waiting for the slowest complaint.
+
+Configuration from .env:
+  - TRIAGE_BATCH_CONCURRENCY: Triage decisions running at once per batch (default: 4)
+  - TRIAGE_BATCH_MAX_ITEMS: Max complaints per batch (default: 50)
+"""
+
+import asyncio
+import os
+import time
+
+import metrics
+from agents.core.scheduler import LLMOverloaded
+from concurrency import run_blocking
+from .agent import analyze_patient, analyze_prefetched
+from .tools import fetch_available_doctors, fetch_patient_histories
+
+BATCH_CONCURRENCY = int(os.environ.get("TRIAGE_BATCH_CONCURRENCY", "4"))
+BATCH_MAX_ITEMS = int(os.environ.get("TRIAGE_BATCH_MAX_ITEMS", "50"))
+
+_batch_size = metrics.histogram(
+    "triage_batch_size", "Complaints per batch triage request", buckets=(1, 2, 5, 10, 20, 50, 100)
+)
+_batch_items = metrics.counter("triage_batch_items_total", "Batch triage items, by outcome")
+_batch_seconds = metrics.histogram("triage_batch_seconds", "Time to triage a whole batch")
+
+
+def load_context(patient_ids: list) -> tuple[list, dict]:
+    """The doctor list and the histories of all patients in the batch ({patient_id: history})."""
+    return fetch_available_doctors(), fetch_patient_histories(patient_ids)
+
+
+async def analyze_batch(items: list, concurrency: int = BATCH_CONCURRENCY):
+    """
+    Triage `items` ([{"fo_note", "patient_id"}]) and yield (index, result) pairs
+    in completion order. A result has the same shape as analyze_patient's; an item
+    that could not be scheduled on the LLM gets an error result with `retry_after`.
+    """
+    started = time.perf_counter()
+    _batch_size.observe(len(items))
+    try:
+        context = await run_blocking(load_context, [item.get("patient_id") for item in items])
+    except Exception:
+        # Bulk lookups failed: triage each item on its own, which loads (or tool-calls) its context
+        context = None
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+
+    async def triage(index: int, item: dict) -> tuple[int, dict]:
+        patient_id = item.get("patient_id")
+        async with semaphore:
+            try:
+                if context is None:
+                    result = await run_blocking(analyze_patient, item["fo_note"], patient_id)
+                else:
+                    doctors, histories = context
+                    result = await run_blocking(
+                        analyze_prefetched, item["fo_note"], patient_id, doctors, histories.get(patient_id, [])
+                    )
+            except LLMOverloaded as e:
+                result = {"status": "error", "message": str(e), "retry_after": e.retry_after}
+        _batch_items.inc(outcome=result["status"])
+        return index, result
+
+    tasks = [asyncio.create_task(triage(i, item)) for i, item in enumerate(items)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # The client went away (or the caller stopped iterating): don't triage the rest
+        for task in tasks:
+            task.cancel()
+        _batch_seconds.observe(time.perf_counter() - started)
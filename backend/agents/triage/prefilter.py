@@ -0,0 +1,203 @@
+"""
+Deterministic complaint pre-filter in front of the triage and question agents.
+
+Empty strings, input without letters and keyboard mashing are rejected
+locally in microseconds instead of after a full LLM run. The screen combines:
+  - text heuristics: letter share, repeated character patterns, character
+    entropy and, for words of 6+ letters, vowel share and consonant runs
+  - a small keyword model over English and Indonesian medical vocabulary
+    (symptoms, body parts, conditions, medicines) plus common function words,
+    with light suffix stripping ("headaches", "kepalanya")
+Complaints with any medical term always go to the LLM. Only input that is
+clearly junk is rejected; anything doubtful passes, including short complaints
+with words the vocabulary does not know, so the LLM stays the judge of
+vague-but-real complaints.
+
+Every verdict is counted (`complaint_prefilter_total`) together with the LLM
+calls it saved; `stats()` summarizes both for /api/metrics. In shadow mode the
+screen runs and counts what it would have rejected, but lets everything through.
+
+Configuration from .env:
+  - COMPLAINT_PREFILTER: "enforce", "shadow" or "off" (default: enforce)
+"""
+
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+
+import metrics
+from agents.core.text import tokenize
+
+MODE = os.environ.get("COMPLAINT_PREFILTER", "enforce")
+
+REJECTION_MESSAGE = (
+    "Keluhan terlalu singkat, tidak jelas, atau bukan merupakan keluhan medis. "
+    "Mohon perjelas gejala yang dialami pasien."
+)
+
+# LLM calls a rejected complaint would have cost, by stage
+LLM_CALLS_PER_REQUEST = {"triage": 1, "questions": 1}
+
+MEDICAL_TERMS = frozenset(
+    """
+    ache aches pain painful sore sick ill illness hurt hurts hurting injury injured wound bleeding blood bruise
+    fever feverish chills cough coughing sneeze sneezing flu cold runny nose congestion phlegm mucus sputum
+    headache migraine dizzy dizziness vertigo faint fainted fainting seizure seizures numb numbness tingling
+    nausea nauseous vomit vomiting diarrhea diarrhoea constipation cramp cramps bloating indigestion heartburn
+    rash itch itchy itching swelling swollen lump blister burn burns infection infected pus allergy allergic
+    breath breathing breathless wheeze wheezing asthma shortness palpitation palpitations chest heart
+    fatigue tired weakness weak insomnia sleepless anxiety depressed depression stress panic confusion
+    head eye eyes ear ears throat neck shoulder arm elbow wrist hand finger back spine hip leg knee ankle
+    foot feet toe stomach abdomen abdominal belly bowel kidney liver lung lungs bladder urine urinating
+    skin joint joints muscle muscles bone bones tooth teeth gum gums jaw tongue mouth lip vision blurry
+    pregnant pregnancy period menstrual menstruation discharge labor contraction miscarriage
+    diabetes diabetic hypertension pressure cholesterol stroke cancer tumor tumour fracture sprain
+    dengue typhoid malaria tuberculosis tb pneumonia bronchitis covid hepatitis anemia ulcer gastritis
+    appendicitis hernia virus viral bacterial toothache sinusitis gout acne hemorrhoids hiccups
+    medicine medication pill pills tablet tablets dose dosage antibiotic antibiotics paracetamol ibuprofen
+    symptom symptoms doctor hospital clinic checkup treatment surgery operation injection vaccine
+    sakit nyeri demam panas batuk pilek pusing mual muntah diare mencret sembelit kembung maag
+    sesak napas nafas dada jantung lemas lemah capek lelah pingsan kejang kesemutan kebas gatal ruam
+    bengkak benjolan luka berdarah darah memar lecet bisul nanah infeksi alergi
+    kepala mata telinga hidung tenggorokan leher bahu lengan siku tangan jari punggung pinggang pinggul
+    kaki lutut pergelangan perut ulu hati ginjal paru kandung kemih kulit sendi otot tulang gigi
+    gusi rahang lidah mulut bibir penglihatan kabur buram
+    hamil kehamilan haid menstruasi keputihan kontraksi keguguran
+    pendarahan mimisan sariawan wasir ambeien cacar campak biduran jerawat eksim kram anyang
+    manis tinggi hipertensi kolesterol kanker patah keseleo terkilir tifus tipes radang amandel asma tbc
+    obat kapsul dosis antibiotik suntik vaksin gejala dokter klinik operasi kontrol
+    """.split()
+)
+
+COMMON_WORDS = frozenset(
+    """
+    i me my mine you your he she it its we our they their this that these those a an the and or but if
+    is am are was were be been being have has had do does did not no yes very really so too also just
+    for from to of in on at by with about after before during when while because since ago
+    day days week weeks month months year years hour hours night morning evening today yesterday
+    last past now still again always sometimes often feel feels feeling felt get got getting
+    can cannot cant could would should will want need please help hello hi thanks thank good bad
+    what why how where who which much many more most some any all every each other lot little bit
+    left right side both lower upper severe mild strong constant sudden started start worse better
+    saya aku kamu dia kami kita mereka ini itu yang dan atau tapi tetapi jika kalau dengan untuk dari
+    ke di pada sejak sudah telah belum tidak tak bukan ya ada adalah juga hanya saja sangat sekali
+    terasa rasa merasa mengalami hari minggu bulan tahun jam malam pagi siang sore kemarin lalu sekarang
+    masih lagi selalu kadang sering bisa mau perlu tolong halo terima kasih baik buruk kurang
+    apa kenapa mengapa bagaimana dimana siapa banyak sedikit semua kiri kanan bawah atas berat ringan
+    terus mulai makin semakin parah
+    """.split()
+)
+
+_SUFFIXES = ("nya", "kan", "an", "ing", "es", "ed", "s")
+_VOWELS = set("aeiouy")
+_CONSONANT_RUN = re.compile(r"[bcdfghjklmnpqrstvwxz]{6,}")
+
+_screened = metrics.counter(
+    "complaint_prefilter_total",
+    "Complaints screened before an LLM agent, by stage, verdict (pass, reject, would_reject) and reason",
+)
+_saved_calls = metrics.counter(
+    "complaint_prefilter_llm_calls_saved_total", "LLM calls avoided by rejecting junk complaints, by stage"
+)
+_screen_seconds = metrics.histogram(
+    "complaint_prefilter_seconds",
+    "Time to screen one complaint",
+    buckets=(0.00001, 0.00002, 0.00005, 0.0001, 0.0002, 0.0005, 0.001, 0.005),
+)
+
+_totals = Counter()  # (stage, verdict) -> complaints, for stats()
+_totals_lock = threading.Lock()
+
+
+def _stem_match(token: str, vocabulary: frozenset) -> bool:
+    if token in vocabulary:
+        return True
+    return any(token.endswith(s) and token[: -len(s)] in vocabulary for s in _SUFFIXES if len(token) > len(s) + 2)
+
+
+def _looks_like_junk(token: str) -> bool:
+    """A word no language would produce: one repeated pattern, or (if longer) few vowels or long consonant runs."""
+    letters = [c for c in token if c.isalpha()]
+    if len(letters) < 4:
+        return False
+    if len(set(token)) <= len(token) // 3:
+        return True
+    if len(letters) < 6:
+        return False  # short vowel-less words are often acronyms ("ptsd", "bppv")
+    vowels = sum(c in _VOWELS for c in letters) / len(letters)
+    return vowels < 0.12 or vowels > 0.8 or bool(_CONSONANT_RUN.search(token))
+
+
+def _entropy(text: str) -> float:
+    """Shannon entropy (bits per character) of the letters in `text`."""
+    counts = Counter(c for c in text.lower() if c.isalpha())
+    total = sum(counts.values())
+    return -sum(n / total * math.log2(n / total) for n in counts.values()) if total else 0.0
+
+
+def classify(text: str) -> tuple[str, str]:
+    """Screen a complaint: ("pass" | "reject", reason)."""
+    text = (text or "").strip()
+    visible = [c for c in text if not c.isspace()]
+    if not visible:
+        return "reject", "empty"
+    letters = sum(c.isalpha() for c in visible)
+    if letters < 3 or letters / len(visible) < 0.5:
+        return "reject", "no_text"
+
+    words = [w for w in tokenize(text) if not w.isdigit()]
+    if not words:
+        return "pass", "other_script"  # the heuristics only know Latin-script languages
+    if any(_stem_match(w, MEDICAL_TERMS) for w in words):
+        return "pass", "medical"
+
+    known = sum(_stem_match(w, COMMON_WORDS) for w in words)
+    if not known:
+        junk = sum(_looks_like_junk(w) for w in words)
+        if junk * 2 >= len(words) or (letters >= 8 and _entropy(text) < 1.5):
+            return "reject", "gibberish"
+    # Unknown words may still be a real complaint (a condition the vocabulary lacks): the LLM decides
+    return "pass", "uncertain"
+
+
+def screen(text: str, stage: str) -> dict | None:
+    """
+    Run the pre-filter for an agent entry point (`stage`: "triage" or "questions").
+    Returns the error response to send instead of calling the LLM, or None to proceed.
+    """
+    if MODE == "off":
+        return None
+    started = time.perf_counter()
+    verdict, reason = classify(text)
+    _screen_seconds.observe(time.perf_counter() - started)
+
+    if verdict == "reject" and MODE == "shadow":
+        verdict = "would_reject"
+    _screened.inc(stage=stage, verdict=verdict, reason=reason)
+    with _totals_lock:
+        _totals[stage, verdict] += 1
+    if verdict != "reject":
+        return None
+    _saved_calls.inc(LLM_CALLS_PER_REQUEST.get(stage, 1), stage=stage)
+    return {"status": "error", "message": REJECTION_MESSAGE, "reason": reason}
+
+
+def stats() -> dict:
+    """Per stage: complaints screened, rejected (or would-be rejected in shadow mode) and LLM calls saved."""
+    with _totals_lock:
+        totals = dict(_totals)
+    result = {"mode": MODE}
+    for stage in sorted({stage for stage, _ in totals}):
+        screened = sum(n for (s, _), n in totals.items() if s == stage)
+        rejected = totals.get((stage, "reject"), 0)
+        result[stage] = {
+            "screened": screened,
+            "rejected": rejected,
+            "would_reject": totals.get((stage, "would_reject"), 0),
+            "llm_calls_saved": rejected * LLM_CALLS_PER_REQUEST.get(stage, 1),
+            "saved_ratio": round(rejected / screened, 3) if screened else 0.0,
+        }
+    return result
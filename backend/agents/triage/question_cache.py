@@ -0,0 +1,78 @@
+"""
+Response cache for pre-assessment question generation.
+Many complaints are near-identical ("headache for 3 days", "fever and cough"),
+so generated follow-up questions are reused instead of running the questions
+agent again. Lookups match on the normalized complaint text (case and
+whitespace insensitive) and, when enabled, fall back to a local MinHash
+similarity match against the cached complaints.
+
+Configuration from .env:
+  - QUESTIONS_CACHE_SIZE: Max complaints kept in memory, LRU-evicted (default: 1024)
+  - QUESTIONS_CACHE_TTL: Seconds cached questions are reused (default: 86400)
+  - QUESTIONS_CACHE_SIMILARITY: Min estimated Jaccard similarity (0-1) for a
+    near-duplicate complaint to reuse cached questions; 0 disables (default: 0)
+"""
+
+import os
+
+import metrics
+from agents.core.text import MinHashIndex, normalize
+from cache import TTLCache
+
+_lookups = metrics.counter(
+    "questions_cache_lookups_total", "Pre-assessment question cache lookups, by outcome (exact, similar, miss)"
+)
+
+
+class QuestionCache:
+    def __init__(self, maxsize: int, ttl: float, similarity: float):
+        self.similarity = similarity
+        self._entries = TTLCache("pre_assessment_questions", maxsize=maxsize, ttl=ttl)
+        self._similar = MinHashIndex() if similarity > 0 else None
+
+    def get(self, complaint: str) -> list | None:
+        key = normalize(complaint)
+        if not key:
+            return None
+        questions = self._entries.get(key)
+        if questions is not None:
+            _lookups.inc(outcome="exact")
+            return list(questions)
+
+        if self._similar is not None:
+            for match, _ in self._similar.query(key, self.similarity):
+                questions = self._entries.get(match)
+                if questions is not None:
+                    _lookups.inc(outcome="similar")
+                    return list(questions)
+                # Expired or evicted from the cache: drop it from the index too
+                self._similar.remove(match)
+
+        _lookups.inc(outcome="miss")
+        return None
+
+    def set(self, complaint: str, questions: list):
+        key = normalize(complaint)
+        if not key or not questions:
+            return
+        self._entries.set(key, list(questions))
+        if self._similar is not None:
+            self._similar.add(key, key)
+            # Keep the index bounded by dropping complaints the cache no longer holds
+            if len(self._similar) > 2 * self._entries.maxsize:
+                for stale in self._similar.keys():
+                    if stale not in self._entries:
+                        self._similar.remove(stale)
+
+    def clear(self):
+        self._entries.clear()
+        if self._similar is not None:
+            for key in self._similar.keys():
+                self._similar.remove(key)
+
+
+question_cache = QuestionCache(
+    maxsize=int(os.environ.get("QUESTIONS_CACHE_SIZE", "1024")),
+    ttl=float(os.environ.get("QUESTIONS_CACHE_TTL", "86400")),
+    similarity=float(os.environ.get("QUESTIONS_CACHE_SIMILARITY", "0")),
+)
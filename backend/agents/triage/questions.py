@@ -1,6 +1,11 @@
-import json
-from strands import Agent, tool
-from agents.core.llm import create_model
+from pydantic import BaseModel, Field, field_validator
+
+from agents.core import structured
+from agents.core.scheduler import LLMOverloaded
+from agents.core.text import normalize
+from agents.triage import prefilter
+from agents.triage.question_cache import question_cache
+from concurrency import coalesce
 
 SYSTEM_PROMPT = """You are an AI triage assistant for a hospital.
 Your goal is to ask 3-5 relevant follow-up questions based on the patient's initial complaint.
@@ -10,42 +15,39 @@ These questions will help the specialist doctor understand the patient's conditi
 1. Ask exactly 3 to 5 questions.
 2. Questions must be highly relevant to the initial complaint.
 3. Keep questions clear and easy to understand for a general patient.
-4. You MUST call the `submit_questions` tool to output your generated questions.
+4. Respond with a JSON object holding the questions, e.g. {"questions": ["How long have you had the headache?", "Is it severe?"]}
 </rules>
 """
 
-@tool
-def submit_questions(questions: list[str]) -> str:
-    """
-    Submit the generated follow-up questions.
-    MUST be called as the final step.
-
-    Args:
-        questions: A list of 3 to 5 strings, where each string is a follow-up question.
-                   Example: ["How long have you had the headache?", "Is it severe?"]
-    
-    Returns:
-        Confirmation that questions were captured.
-    """
-    return json.dumps({"status": "questions_captured", "questions": questions}, ensure_ascii=False)
 
+class Questions(BaseModel):
+    questions: list[str] = Field(min_length=3, description="3 to 5 follow-up questions for the patient")
 
-def create_questions_agent():
-    """Creates an instance of the Strands Agent for generating triage questions."""
-    model = create_model()
-    agent = Agent(
-        model=model,
-        system_prompt=SYSTEM_PROMPT,
-        tools=[submit_questions],
-    )
-    return agent
+    @field_validator("questions", mode="before")
+    @classmethod
+    def _at_most_five(cls, questions):
+        # Runs before min_length, so blank questions don't count towards the 3 (too few triggers
+        # a repair turn). Extra questions are dropped rather than sent back for another round trip.
+        if not isinstance(questions, list):
+            return questions
+        cleaned = [q.strip() if isinstance(q, str) else q for q in questions]
+        return [q for q in cleaned if q != ""][:5]
 
 
+@coalesce("pre_assessment_questions", key=lambda complaint: normalize(complaint))
 def generate_pre_assessment_questions(complaint: str) -> dict:
     """
     Generate a list of follow-up questions based on the patient's initial complaint.
+    Junk complaints are rejected by the prefilter and common ones are answered
+    from `question_cache`, both without calling the LLM.
     """
-    agent = create_questions_agent()
+    rejected = prefilter.screen(complaint, "questions")
+    if rejected is not None:
+        return rejected
+
+    cached = question_cache.get(complaint)
+    if cached is not None:
+        return {"status": "success", "questions": cached}
 
     # Build prompt
     prompt = f"""**Patient Initial Complaint:**
@@ -53,38 +55,25 @@ def generate_pre_assessment_questions(complaint: str) -> dict:
 {complaint}
 </complaint>
 
-Please generate 3-5 follow-up questions and submit them using the `submit_questions` tool."""
+Please generate 3-5 follow-up questions."""
 
     try:
-        result = agent(prompt)
-
-        # Search for tool result from submit_questions in messages
-        messages = agent.messages
-        questions_payload = None
-
-        for msg in reversed(messages):
-            if isinstance(msg, dict) and msg.get("role") == "assistant":
-                for block in msg.get("content", []):
-                    if isinstance(block, dict):
-                        if block.get("toolUse", {}).get("name") == "submit_questions":
-                            questions_payload = block["toolUse"].get("input", {})
-                            break
-            if questions_payload:
-                break
-
-        if questions_payload and "questions" in questions_payload:
-            return {
-                "status": "success",
-                "questions": questions_payload["questions"]
-            }
-        else:
-            # Fallback if the agent fails to call the tool correctly
-            return {
-                "status": "error",
-                "message": "AI failed to format questions properly. Please try again.",
-                "raw_response": str(result)
-            }
+        questions = structured.generate(
+            "questions",
+            [{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": prompt}],
+            Questions,
+        ).value.questions
+        question_cache.set(complaint, questions)
+        return {"status": "success", "questions": questions}
 
+    except structured.StructuredOutputError as e:
+        return {
+            "status": "error",
+            "message": "AI failed to format questions properly. Please try again.",
+            "raw_response": e.raw,
+        }
+    except LLMOverloaded:
+        raise
     except Exception as e:
         return {
             "status": "error",
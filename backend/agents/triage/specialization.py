@@ -0,0 +1,191 @@
+"""
+Complaint -> specialization prior learned from past tickets.
+
+Completed tickets already record what the front office wrote (`fo_note`) and
+which doctor treated the patient, and through the doctor the specialization.
+A multinomial naive Bayes model over the same word + character n-gram features
+as the local TF-IDF search (agents.core.text.features) is trained on them:
+  - training is incremental: the model keeps per-specialization feature counts
+    and a watermark on `tickets.updated_at`, and only tickets completed (or
+    re-assigned) since the last pass are read and folded in
+  - refreshes run on a background thread at most every
+    SPECIALIZATION_MODEL_CHECK_SECONDS, so triage never waits for training
+  - `predict(text)` returns the most likely specializations with probabilities.
+    Log-likelihoods are averaged per feature before the softmax, because the
+    overlapping n-gram features would otherwise make every prediction look
+    certain. The confidence is the top probability times the share of the
+    complaint's features the model has seen, so unfamiliar wording scores low
+
+Triage uses the prior as a hint in the prompt, and with high confidence only
+offers the doctors of the predicted specializations (a shorter prompt).
+
+Configuration from .env:
+  - SPECIALIZATION_MODEL_CHECK_SECONDS: Seconds between incremental training passes (default: 60)
+  - SPECIALIZATION_MODEL_MIN_TICKETS: Tickets needed before predictions are made (default: 50)
+"""
+
+import logging
+import math
+import os
+import threading
+import time
+from collections import Counter
+
+import metrics
+import tracing
+from agents.core.text import features
+from database import supabase
+from services.doctor_directory import directory
+
+logger = logging.getLogger(__name__)
+
+CHECK_SECONDS = float(os.environ.get("SPECIALIZATION_MODEL_CHECK_SECONDS", "60"))
+MIN_TICKETS = int(os.environ.get("SPECIALIZATION_MODEL_MIN_TICKETS", "50"))
+PAGE_SIZE = 1000
+SMOOTHING = 0.1  # additive smoothing of feature counts
+SHARPNESS = 1.5  # scale of the per-feature mean log-likelihood; higher = more confident predictions
+
+_trained = metrics.counter("specialization_model_tickets_total", "Tickets folded into the specialization model, by outcome")
+_model_size = metrics.gauge("specialization_model_tickets", "Tickets the specialization model is trained on")
+_train_seconds = metrics.histogram("specialization_model_train_seconds", "Time of one incremental training pass")
+
+
+class SpecializationModel:
+    def __init__(self, check_seconds: float = CHECK_SECONDS, min_tickets: int = MIN_TICKETS):
+        self.check_seconds = check_seconds
+        self.min_tickets = min_tickets
+        self._lock = threading.Lock()
+        self._class_docs: Counter = Counter()  # specialization -> tickets
+        self._class_features: dict = {}  # specialization -> Counter(feature -> count)
+        self._class_totals: Counter = Counter()  # specialization -> sum of feature counts
+        self._vocabulary: Counter = Counter()  # feature -> number of classes using it
+        self._labels: dict = {}  # ticket id -> (specialization, features) it was trained with
+        self._watermark: str | None = None
+        self._checked_at = 0.0
+        self._training = False
+
+    # --- training ---
+
+    def _add(self, label: str, feats: Counter, sign: int):
+        class_features = self._class_features.setdefault(label, Counter())
+        for f, n in feats.items():
+            before = class_features[f]
+            class_features[f] = before + sign * n
+            if before == 0 and sign > 0:
+                self._vocabulary[f] += 1
+            elif class_features[f] <= 0:
+                del class_features[f]
+                self._vocabulary[f] -= 1
+                if self._vocabulary[f] <= 0:
+                    del self._vocabulary[f]
+        self._class_totals[label] += sign * sum(feats.values())
+        self._class_docs[label] += sign
+        if self._class_docs[label] <= 0:
+            del self._class_docs[label], self._class_features[label], self._class_totals[label]
+
+    def observe(self, ticket_id: str, fo_note: str, specialization: str | None) -> str:
+        """Fold one ticket into the model (replacing what it was trained with before). Returns the outcome."""
+        feats = features(fo_note) if specialization else Counter()
+        with self._lock:
+            previous = self._labels.pop(ticket_id, None)
+            if previous is not None:
+                if previous[0] == specialization:
+                    self._labels[ticket_id] = previous
+                    return "unchanged"
+                self._add(previous[0], previous[1], -1)
+            if not feats:
+                return "skipped"
+            self._add(specialization, feats, +1)
+            self._labels[ticket_id] = (specialization, feats)
+            _model_size.set(len(self._labels))
+        return "relabeled" if previous is not None else "added"
+
+    def _train(self):
+        """Read the tickets completed since the watermark, page by page, and fold them in."""
+        started = time.perf_counter()
+        with tracing.background_trace("specialization model training"):
+            while True:
+                query = (
+                    supabase.table("tickets")
+                    .select("id, fo_note, doctor_id, updated_at")
+                    .eq("status", "completed")
+                    .not_.is_("doctor_id", "null")
+                )
+                if self._watermark:
+                    # gte, not gt: rows sharing the watermark's timestamp may not all have been read
+                    query = query.gte("updated_at", self._watermark)
+                rows = query.order("updated_at").order("id").limit(PAGE_SIZE).execute().data or []
+
+                for row in rows:
+                    doctor = directory.get(row["doctor_id"])
+                    outcome = self.observe(row["id"], row.get("fo_note") or "", doctor and doctor["specialization"])
+                    if outcome != "unchanged":
+                        _trained.inc(outcome=outcome)
+                if rows:
+                    self._watermark = rows[-1]["updated_at"]
+                if len(rows) < PAGE_SIZE or rows[0]["updated_at"] == rows[-1]["updated_at"]:
+                    break
+        _train_seconds.observe(time.perf_counter() - started)
+
+    def _train_in_background(self):
+        try:
+            self._train()
+        except Exception:
+            logger.exception("Specialization model training failed")
+        finally:
+            self._training = False
+
+    def ensure_fresh(self):
+        """Start an incremental training pass in the background when one is due."""
+        now = time.monotonic()
+        if self._training or now - self._checked_at < self.check_seconds:
+            return
+        with self._lock:
+            if self._training:
+                return
+            self._training = True
+            self._checked_at = now
+        threading.Thread(target=self._train_in_background, name="specialization-model", daemon=True).start()
+
+    # --- prediction ---
+
+    def predict(self, text: str, top_k: int = 3) -> dict | None:
+        """
+        The `top_k` most likely specializations for a complaint, as
+        {"specialization", "confidence", "alternatives": [{"specialization", "probability"}], "tickets"},
+        or None while the model knows too few tickets or none of the complaint's features.
+        """
+        self.ensure_fresh()
+        all_feats = features(text)
+        with self._lock:
+            size = len(self._labels)
+            if size < self.min_tickets:
+                return None
+            feats = {f: n for f, n in all_feats.items() if f in self._vocabulary}
+            if not feats:
+                return None
+            n_features = sum(feats.values())
+            coverage = n_features / sum(all_feats.values())
+            vocabulary = len(self._vocabulary)
+            scores = {}
+            for label, docs in self._class_docs.items():
+                class_features = self._class_features[label]
+                denominator = self._class_totals[label] + SMOOTHING * vocabulary
+                log_likelihood = sum(
+                    n * math.log((class_features.get(f, 0) + SMOOTHING) / denominator) for f, n in feats.items()
+                )
+                scores[label] = math.log(docs / size) + SHARPNESS * log_likelihood / n_features
+
+        best = max(scores.values())
+        weights = {label: math.exp(score - best) for label, score in scores.items()}
+        total = sum(weights.values())
+        ranked = sorted(((w / total, label) for label, w in weights.items()), reverse=True)[:top_k]
+        return {
+            "specialization": ranked[0][1],
+            "confidence": round(ranked[0][0] * coverage, 3),
+            "alternatives": [{"specialization": label, "probability": round(p, 3)} for p, label in ranked],
+            "tickets": size,
+        }
+
+
+specialization_model = SpecializationModel()
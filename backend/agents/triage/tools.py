@@ -1,35 +1,75 @@
 import json
 from typing import Literal
 from strands import tool
-from database import supabase
+from services import patient_history
+from services.doctor_directory import directory
+from services.doctor_workload import workload
+
+
+def fetch_available_doctors(specializations: list = None) -> list:
+    """
+    Available specialist doctors (id, name, specialization, open_tickets) from the
+    cached directory, least loaded first (live counts from services.doctor_workload).
+    With specializations, only doctors in those specializations are returned
+    (or everyone, if none of them match).
+    """
+    doctors = directory.by_specializations(specializations) if specializations else None
+    return workload.rank(doctors or directory.all())
+
+
+def group_by_specialization(doctors: list) -> dict:
+    """Compact prompt form: {specialization: [{id, name, open_tickets}, ...]}, keeping the doctors' order."""
+    grouped = {}
+    for doc in doctors:
+        entry = {"id": doc["id"], "name": doc["name"]}
+        if "open_tickets" in doc:
+            entry["open_tickets"] = doc["open_tickets"]
+        grouped.setdefault(doc["specialization"], []).append(entry)
+    return grouped
+
+
+def _history_entry(h: dict) -> dict:
+    return {
+        "ticket_id": h["ticket_id"],
+        "complaint": h["complaint"],
+        "doctor_diagnosis": h["doctor_diagnosis"],
+        "doctor_name": h["doctor_name"],
+        "specialization": h["specialization"],
+        "status": h["status"],
+        "was_inpatient": False,
+        "date": h["date"],
+    }
+
+
+def fetch_patient_history(patient_id: str) -> list:
+    """Load the patient's last 10 tickets with the treating doctor's name and specialization."""
+    return [_history_entry(h) for h in patient_history.get_patient_history(patient_id)]
+
+
+def fetch_patient_histories(patient_ids: list) -> dict:
+    """fetch_patient_history for several patients at once ({patient_id: history}), in one query."""
+    return {
+        patient_id: [_history_entry(h) for h in history]
+        for patient_id, history in patient_history.get_many(patient_ids).items()
+    }
 
 
 @tool
-def get_available_doctors() -> str:
-    """Retrieves the list of available specialist doctors in the hospital along with their specializations.
+def get_available_doctors(specializations: list[str] | None = None) -> str:
+    """Retrieves the available specialist doctors in the hospital, grouped by specialization.
     Use this tool to find out which doctors are currently available to accept patients.
+    Within each specialization doctors are listed least busy first, with their number of open tickets.
+    Pass the candidate specializations for the complaint to get only the relevant doctors;
+    if none of them match, all doctors are returned.
+
+    Args:
+        specializations: Optional list of candidate specializations (e.g., ["Neurology", "Internal Medicine"]).
 
     Returns:
-        JSON string containing a list of doctors with their id, name, and specialization.
+        JSON string mapping each specialization to its doctors (id, name and open_tickets).
     """
     try:
-        res = (
-            supabase.table("profiles")
-            .select("id, name, specialization")
-            .eq("role", "doctor_specialist")
-            .not_.is_("specialization", "null")
-            .execute()
-        )
-        doctors = []
-        for doc in res.data or []:
-            doctors.append(
-                {
-                    "id": doc["id"],
-                    "name": doc.get("name", "Unknown"),
-                    "specialization": doc.get("specialization", "General"),
-                }
-            )
-        return json.dumps(doctors, ensure_ascii=False)
+        return json.dumps(group_by_specialization(fetch_available_doctors(specializations)), ensure_ascii=False)
     except Exception as e:
         return json.dumps({"error": str(e)})
 
@@ -47,50 +87,7 @@ def get_patient_history(patient_id: str) -> str:
         JSON string containing the patient's previous visit/ticket history.
     """
     try:
-        res = (
-            supabase.table("tickets")
-            .select(
-                "id, fo_note, doctor_note, status, created_at, doctor_id"
-            )
-            .eq("patient_id", patient_id)
-            .order("created_at", desc=True)
-            .limit(10)
-            .execute()
-        )
-
-        # Collect doctor IDs to fetch names
-        doctor_ids = list(set(
-            t["doctor_id"] for t in (res.data or []) if t.get("doctor_id")
-        ))
-        doctor_map = {}
-        if doctor_ids:
-            doc_res = (
-                supabase.table("profiles")
-                .select("id, name, specialization")
-                .in_("id", doctor_ids)
-                .execute()
-            )
-            for doc in doc_res.data or []:
-                doctor_map[doc["id"]] = {
-                    "name": doc.get("name", "N/A"),
-                    "specialization": doc.get("specialization", "N/A"),
-                }
-
-        history = []
-        for ticket in res.data or []:
-            doc_info = doctor_map.get(ticket.get("doctor_id"), {})
-            history.append(
-                {
-                    "ticket_id": ticket["id"],
-                    "complaint": ticket.get("fo_note", ""),
-                    "doctor_diagnosis": ticket.get("doctor_note", ""),
-                    "doctor_name": doc_info.get("name", "N/A"),
-                    "specialization": doc_info.get("specialization", "N/A"),
-                    "status": ticket["status"],
-                    "was_inpatient": False,
-                    "date": ticket.get("created_at", ""),
-                }
-            )
+        history = fetch_patient_history(patient_id)
 
         if not history:
             return json.dumps(
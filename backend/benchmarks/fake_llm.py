@@ -0,0 +1,180 @@
+"""
+OpenAI-compatible chat-completions stub for benchmarks.
+
+Replies are shaped for the backend's agents so every code path completes:
+when tools are offered it calls `get_available_doctors` (if the doctors are
+not already in the prompt) and then the `submit_*` tool with arguments built
+from the tool's JSON schema; the doctor assistant gets a JSON suggestion that
+uses medicine ids from its prompt; other requests with a `json_schema`
+response_format get an object built from that schema; everything else gets
+plain text.
+Latency is simulated as `ttft_ms` before the first token plus `token_ms` per
+generated token, streamed or not. Call counts are served at GET /_bench/stats.
+"""
+
+import asyncio
+import json
+import re
+import time
+import uuid
+from collections import Counter
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+_UUID_ID = re.compile(r'"(?:id|doctor_id)":\s*"([0-9a-f-]{36})"')
+_MEDICINE_LINE = re.compile(r"^- \[(\d+)\] (.+?)(?: \(stock|$)", re.M)
+_WORDS = "the patient reports symptoms consistent with a mild infection and should rest drink fluids and return if worse".split()
+
+
+class LLMSettings:
+    def __init__(self, ttft_ms: float = 300.0, token_ms: float = 10.0, tokens: int = 60):
+        self.ttft = ttft_ms / 1000
+        self.token = token_ms / 1000
+        self.tokens = tokens
+        self.calls = Counter()
+
+
+def _text(n: int) -> str:
+    return " ".join(_WORDS[i % len(_WORDS)] for i in range(n))
+
+
+def _conversation_text(messages: list) -> str:
+    parts = []
+    for m in messages:
+        content = m.get("content")
+        if isinstance(content, list):
+            content = " ".join(c.get("text", "") for c in content if isinstance(c, dict))
+        parts.append(content or "")
+    return "\n".join(parts)
+
+
+def _arguments(schema: dict, conversation: str, n_tokens: int) -> dict:
+    doctor_ids = _UUID_ID.findall(conversation)
+    args = {}
+    for name, prop in (schema.get("properties") or {}).items():
+        kind = prop.get("type")
+        if "enum" in prop:
+            args[name] = prop["enum"][0]
+        elif kind == "boolean":
+            args[name] = False
+        elif kind == "array":
+            args[name] = [f"Question {i + 1}: {_text(8)}?" for i in range(3)]
+        elif name.endswith("_id"):
+            args[name] = doctor_ids[0] if doctor_ids else str(uuid.uuid4())
+        elif "specialization" in name:
+            args[name] = "Internal Medicine"
+        elif name.endswith("_name"):
+            args[name] = "Dr. Benchmark"
+        else:
+            args[name] = _text(n_tokens)
+    return args
+
+
+def _reply(body: dict, settings: LLMSettings) -> dict:
+    """Decide what the model 'says': {"content": str} or {"tool_call": (name, args)}."""
+    messages = body.get("messages", [])
+    conversation = _conversation_text(messages)
+    tools = {t["function"]["name"]: t["function"] for t in body.get("tools") or []}
+
+    if tools:
+        if messages and messages[-1].get("role") == "tool" and any(
+            m.get("role") == "assistant" and "submit_" in json.dumps(m.get("tool_calls") or "") for m in messages
+        ):
+            return {"content": "Done."}
+        if "get_available_doctors" in tools and "<available_doctors>" not in conversation and not any(
+            m.get("role") == "tool" for m in messages
+        ):
+            return {"tool_call": ("get_available_doctors", {})}
+        name = next((n for n in tools if n.startswith("submit_")), next(iter(tools)))
+        return {"tool_call": (name, _arguments(tools[name].get("parameters") or {}, conversation, settings.tokens))}
+
+    if "valid JSON object" in conversation:
+        medicines = _MEDICINE_LINE.findall(conversation)[:2]
+        return {
+            "content": json.dumps(
+                {
+                    "diagnosis": _text(12),
+                    "treatment_plan": _text(settings.tokens // 2),
+                    "medicines": [
+                        {"medicine_id": int(mid), "name": name, "quantity": 10, "notes": "3x daily"}
+                        for mid, name in medicines
+                    ],
+                    "reasoning": _text(settings.tokens // 2),
+                }
+            )
+        }
+    response_format = body.get("response_format") or {}
+    if response_format.get("type") == "json_schema":
+        schema = response_format["json_schema"]["schema"]
+        return {"content": json.dumps(_arguments(schema, conversation, settings.tokens))}
+    return {"content": _text(settings.tokens)}
+
+
+def create_app(settings: LLMSettings) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/_bench/stats")
+    async def stats():
+        return {"calls": sum(settings.calls.values()), "by_kind": dict(settings.calls)}
+
+    @app.post("/_bench/reset")
+    async def reset():
+        settings.calls.clear()
+        return {"status": "ok"}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        reply = _reply(body, settings)
+        settings.calls["tool_call" if "tool_call" in reply else "text"] += 1
+        completion_id, model = f"chatcmpl-{uuid.uuid4().hex[:12]}", body.get("model", "stub")
+        usage = {"prompt_tokens": len(_conversation_text(body.get("messages", []))) // 4}
+
+        if "tool_call" in reply:
+            name, args = reply["tool_call"]
+            arguments = json.dumps(args)
+            n_tokens = max(1, len(arguments) // 4)
+            message = {
+                "role": "assistant",
+                "content": None,
+                "tool_calls": [{"id": f"call_{uuid.uuid4().hex[:8]}", "type": "function",
+                                "function": {"name": name, "arguments": arguments}}],
+            }
+            finish_reason = "tool_calls"
+        else:
+            n_tokens = max(1, len(reply["content"]) // 4)
+            message = {"role": "assistant", "content": reply["content"]}
+            finish_reason = "stop"
+        usage.update(completion_tokens=n_tokens, total_tokens=usage["prompt_tokens"] + n_tokens)
+
+        def chunk(delta: dict, finish=None, **extra) -> str:
+            payload = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                       "model": model, "choices": [{"index": 0, "delta": delta, "finish_reason": finish}], **extra}
+            return f"data: {json.dumps(payload)}\n\n"
+
+        if not body.get("stream"):
+            await asyncio.sleep(settings.ttft + settings.token * n_tokens)
+            return {"id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+                    "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}], "usage": usage}
+
+        async def events():
+            await asyncio.sleep(settings.ttft)
+            if "tool_calls" in message:
+                call = dict(message["tool_calls"][0], index=0)
+                await asyncio.sleep(settings.token * n_tokens)
+                yield chunk({"role": "assistant", "tool_calls": [call]})
+            else:
+                words = message["content"].split(" ")
+                per_word = settings.token * n_tokens / len(words)
+                for i, word in enumerate(words):
+                    await asyncio.sleep(per_word)
+                    yield chunk({"role": "assistant", "content": word if i == 0 else " " + word})
+            yield chunk({}, finish_reason)
+            if (body.get("stream_options") or {}).get("include_usage"):
+                yield f"data: {json.dumps({'id': completion_id, 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': model, 'choices': [], 'usage': usage})}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
@@ -0,0 +1,274 @@
+"""
+In-memory PostgREST stand-in for benchmarks.
+
+Implements the subset of the PostgREST API the backend uses through
+supabase-py: select with column lists, many-to-one embeds
+(`doctor:profiles!doctor_id(name)`) and one-to-many embeds (`prescriptions(...)`), eq/neq/gt/in/is/not.is filters,
+order, limit, exact counts, single-object responses, insert, upsert
+(`on_conflict`, ignore-duplicates), update and the `claim_available_room` / `complete_checkup`
+RPCs. Updates bump `updated_at` like the migrations' triggers. Every request to
+/rest/v1 counts as one database round trip; counters are served at
+GET /_bench/stats and cleared with POST /_bench/reset.
+"""
+
+import asyncio
+import copy
+import json
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+# (table, embedded table) -> local foreign-key column, used when no !hint is given
+FOREIGN_KEYS = {
+    ("tickets", "profiles"): "doctor_id",
+    ("prescriptions", "catalog_medicines"): "medicine_id",
+    ("tickets", "rooms"): "room_id",
+    ("tickets", "nurse_teams"): "nurse_team_id",
+    ("profiles", "nurse_teams"): "team_id",
+}
+# (table, embedded table) -> foreign-key column on the embedded table, for one-to-many embeds
+REVERSE_FOREIGN_KEYS = {
+    ("tickets", "prescriptions"): "ticket_id",
+}
+SERIAL_TABLES = {"nurse_teams", "rooms", "catalog_medicines"}
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _split_top_level(text: str) -> list:
+    parts, depth, current = [], 0, ""
+    for ch in text:
+        if ch == "," and depth == 0:
+            parts.append(current.strip())
+            current = ""
+            continue
+        depth += ch == "("
+        depth -= ch == ")"
+        current += ch
+    if current.strip():
+        parts.append(current.strip())
+    return parts
+
+
+def _parse_select(select: str) -> list:
+    """[(output_name, column)] or [(output_name, (table, fk_hint, sub_select))]."""
+    fields = []
+    for item in _split_top_level(select or "*"):
+        alias = None
+        if ":" in item.split("(", 1)[0]:
+            alias, item = item.split(":", 1)
+        if "(" in item:
+            target, sub = item.split("(", 1)
+            table, _, hint = target.partition("!")
+            fields.append((alias or table, (table, hint or None, _parse_select(sub[:-1]))))
+        else:
+            fields.append((alias or item, item))
+    return fields
+
+
+def _coerce(raw: str, stored):
+    if isinstance(stored, bool):
+        return raw.lower() == "true"
+    if isinstance(stored, (int, float)):
+        try:
+            return type(stored)(float(raw))
+        except ValueError:
+            return raw
+    return raw
+
+
+def _matches(row: dict, column: str, expr: str) -> bool:
+    negate = expr.startswith("not.")
+    if negate:
+        expr = expr[4:]
+    op, _, raw = expr.partition(".")
+    value = row.get(column)
+    if op == "is":
+        result = value is None if raw == "null" else value == (raw == "true")
+    elif op == "in":
+        options = [o.strip().strip('"') for o in raw.strip("()").split(",")]
+        result = value is not None and str(value) in options
+    elif value is None:
+        result = False
+    elif op == "eq":
+        result = value == _coerce(raw, value)
+    elif op == "neq":
+        result = value != _coerce(raw, value)
+    elif op in ("gt", "gte", "lt", "lte"):
+        other = _coerce(raw, value)
+        result = {"gt": value > other, "gte": value >= other, "lt": value < other, "lte": value <= other}[op]
+    else:
+        raise ValueError(f"Unsupported filter operator: {op}")
+    return not result if negate else result
+
+
+class FakeDatabase:
+    def __init__(self, tables: dict, latency_ms: float = 0.0):
+        self.tables = tables
+        self.latency = latency_ms / 1000
+        self.round_trips = Counter()
+        self._next_serial = {t: max((r["id"] for r in tables.get(t, [])), default=0) + 1 for t in SERIAL_TABLES}
+        self._by_id = {t: {r["id"]: r for r in rows} for t, rows in tables.items()}
+
+    def _project(self, table: str, row: dict, fields: list) -> dict:
+        out = {}
+        for name, spec in fields:
+            if spec == "*":
+                out.update(row)
+            elif isinstance(spec, tuple) and (table, spec[0]) in REVERSE_FOREIGN_KEYS:
+                target, _, sub = spec
+                fk = REVERSE_FOREIGN_KEYS[(table, target)]
+                out[name] = [self._project(target, r, sub) for r in self.tables.get(target, []) if r.get(fk) == row["id"]]
+            elif isinstance(spec, tuple):
+                target, hint, sub = spec
+                fk = hint or FOREIGN_KEYS.get((table, target))
+                related = self._by_id.get(target, {}).get(row.get(fk))
+                out[name] = self._project(target, related, sub) if related else None
+            else:
+                out[name] = row.get(spec)
+        return out
+
+    def _filter(self, table: str, params) -> list:
+        rows = self.tables.setdefault(table, [])
+        for column, expr in params:
+            if column in ("select", "order", "limit", "offset", "columns", "on_conflict"):
+                continue
+            rows = [r for r in rows if _matches(r, column, expr)]
+        return rows
+
+    def insert(self, table: str, body, on_conflict: str = None, ignore_duplicates: bool = False) -> list:
+        rows = body if isinstance(body, list) else [body]
+        created = []
+        for values in rows:
+            if ignore_duplicates and values.get("id") in self._by_id.get(table, {}):
+                continue
+            if on_conflict:
+                existing = next(
+                    (r for r in self.tables.get(table, []) if r.get(on_conflict) == values.get(on_conflict)), None
+                )
+                if existing is not None:
+                    existing.update(values)
+                    created.append(existing)
+                    continue
+            row = dict(values)
+            if "id" not in row:
+                if table in SERIAL_TABLES:
+                    row["id"] = self._next_serial[table]
+                    self._next_serial[table] += 1
+                else:
+                    row["id"] = str(uuid.uuid4())
+            row.setdefault("created_at", _now())
+            row.setdefault("updated_at", row["created_at"])
+            self.tables.setdefault(table, []).append(row)
+            self._by_id.setdefault(table, {})[row["id"]] = row
+            created.append(row)
+        return created
+
+    # RPCs mirror supabase/migrations
+    def rpc_claim_available_room(self, _params: dict):
+        for room in self.tables["rooms"]:
+            if room["status"] == "available":
+                room["status"] = "occupied"
+                return room["id"]
+        return None
+
+    def rpc_complete_checkup(self, params: dict):
+        ticket = self._by_id["tickets"].get(params["p_ticket_id"])
+        if ticket is None:
+            raise ValueError("Ticket not found")
+        room_id, team_id = ticket.get("room_id"), ticket.get("nurse_team_id")
+        ticket.update(
+            doctor_note=params["p_doctor_note"], status="completed", room_id=None, nurse_team_id=None, updated_at=_now()
+        )
+        if room_id is not None:
+            self._by_id["rooms"][room_id]["status"] = "available"
+
+        medicine_fee = 0
+        items = params.get("p_prescriptions") or []
+        for item in items:
+            medicine = self._by_id["catalog_medicines"].get(item.get("medicine_id")) or {}
+            medicine_fee += (medicine.get("price") or 0) * (item.get("quantity") or 1)
+        self.insert("prescriptions", [{**item, "ticket_id": ticket["id"], "status": "pending"} for item in items])
+        invoice = self.insert(
+            "invoices",
+            {"ticket_id": ticket["id"], "doctor_fee": params.get("p_doctor_fee", 150000),
+             "medicine_fee": medicine_fee, "room_fee": 0, "status": "unpaid"},
+        )[0]
+        return {
+            "ticket": dict(ticket), "prescriptions_count": len(items), "invoice_id": invoice["id"],
+            "released_room_id": room_id, "released_nurse_team_id": team_id,
+        }
+
+
+def create_app(db: FakeDatabase) -> FastAPI:
+    app = FastAPI()
+
+    def _error(status: int, message: str, code: str = "PGRST000"):
+        return JSONResponse({"code": code, "message": message, "details": None, "hint": None}, status_code=status)
+
+    @app.get("/_bench/stats")
+    async def stats():
+        return {"round_trips": sum(db.round_trips.values()), "by_resource": dict(db.round_trips)}
+
+    @app.post("/_bench/reset")
+    async def reset():
+        db.round_trips.clear()
+        return {"status": "ok"}
+
+    @app.post("/rest/v1/rpc/{name}")
+    async def rpc(name: str, request: Request):
+        db.round_trips[f"rpc/{name}"] += 1
+        await asyncio.sleep(db.latency)
+        handler = getattr(db, f"rpc_{name}", None)
+        if handler is None:
+            return _error(404, f"Could not find the function public.{name}", "PGRST202")
+        try:
+            return JSONResponse(handler(await request.json()))
+        except ValueError as e:
+            return _error(400, str(e), "P0001")
+
+    @app.api_route("/rest/v1/{table}", methods=["GET", "POST", "PATCH"])
+    async def table(table: str, request: Request):
+        db.round_trips[table] += 1
+        await asyncio.sleep(db.latency)
+        params = list(request.query_params.multi_items())
+        query = dict(params)
+        fields = _parse_select(query.get("select", "*"))
+        prefer = request.headers.get("prefer", "")
+
+        if request.method == "POST":
+            on_conflict = query.get("on_conflict") if "merge-duplicates" in prefer else None
+            rows = db.insert(table, await request.json(), on_conflict, "ignore-duplicates" in prefer)
+        elif request.method == "PATCH":
+            values = await request.json()
+            rows = db._filter(table, params)
+            for row in rows:
+                row.update(values, updated_at=_now())
+        else:
+            rows = db._filter(table, params)
+            for order in reversed(query.get("order", "").split(",") if query.get("order") else []):
+                column, _, direction = order.partition(".")
+                present = [r for r in rows if r.get(column) is not None]
+                missing = [r for r in rows if r.get(column) is None]
+                rows = sorted(present, key=lambda r: r[column], reverse=direction.startswith("desc")) + missing
+
+        total = len(rows)
+        offset = int(query.get("offset", 0))
+        if "limit" in query:
+            rows = rows[offset : offset + int(query["limit"])]
+        body = [db._project(table, r, fields) for r in rows]
+
+        headers = {"Content-Range": f"{offset}-{offset + len(body) - 1}/{total if 'count=' in prefer else '*'}"}
+        if "vnd.pgrst.object" in request.headers.get("accept", ""):
+            if len(body) != 1:
+                return _error(406, "JSON object requested, multiple (or no) rows returned", "PGRST116")
+            return JSONResponse(copy.deepcopy(body[0]), headers=headers)
+        status = 201 if request.method == "POST" else 200
+        return JSONResponse(json.loads(json.dumps(body, default=str)), status_code=status, headers=headers)
+
+    return app
@@ -0,0 +1,288 @@
+"""
+Offline end-to-end benchmark for every endpoint in routers/ai.py and routers/tickets.py.
+
+The real FastAPI app is served by uvicorn and driven over HTTP, with its
+external dependencies replaced by local stand-ins:
+  - an OpenAI-compatible stub (benchmarks/fake_llm.py) with configurable
+    time-to-first-token and per-token latency
+  - an in-memory PostgREST stand-in (benchmarks/fake_postgrest.py) seeded
+    with faker data and a configurable per-query latency
+  - locally minted HS256 JWTs (AUTH_MODE=local)
+
+For each endpoint and concurrency level it reports p50/p95/p99 latency,
+time to first byte, throughput, and DB round trips and LLM calls per request.
+
+Usage (from backend/):
+    python -m benchmarks.run
+    python -m benchmarks.run --concurrency 1,16 --requests 100 --endpoints ai/analyze-ticket
+    python -m benchmarks.run --json before.json
+    python -m benchmarks.run --baseline before.json     # print deltas against a previous run
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+import httpx
+import jwt
+import uvicorn
+
+from benchmarks import fake_llm, fake_postgrest, seed
+
+JWT_SECRET = "benchmark-jwt-secret-with-enough-length-for-hs256"
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _serve(app) -> str:
+    """Run an ASGI app with uvicorn on a background thread; return its base URL."""
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return f"http://127.0.0.1:{port}"
+
+
+def _percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[rank]
+
+
+def _token(user_id: str) -> str:
+    claims = {"sub": user_id, "aud": "authenticated", "role": "authenticated", "exp": int(time.time()) + 3600}
+    return jwt.encode(claims, JWT_SECRET, algorithm="HS256")
+
+
+def build_scenarios(tables: dict) -> dict:
+    """
+    endpoint name -> function(i) returning (method, path, json_body, user_id).
+    Endpoints with a single Body() parameter take the bare value, not an object.
+    """
+    profiles = tables["profiles"]
+    patients = [p for p in profiles if p["role"] == "patient"]
+    doctors = [p for p in profiles if p["role"] == "doctor_specialist"]
+    tickets = tables["tickets"]
+    open_tickets = [t for t in tickets if t["status"] == "in_progress"]
+    noted_tickets = [t for t in tickets if t.get("doctor_note")]
+    by_patient_id = {p["id"]: p for p in patients}
+    active_patients = [by_patient_id[t["patient_id"]] for t in open_tickets]
+    complaints = [t["fo_note"] for t in tickets]
+
+    def qa(i: int) -> list:
+        return [
+            {"role": "user", "content": complaints[i % len(complaints)]},
+            {"role": "assistant", "content": "How long have you had these symptoms?"},
+            {"role": "user", "content": f"About {i % 9 + 1} days, and it is getting worse."},
+        ]
+
+    medicine_ids = [m["id"] for m in tables["catalog_medicines"] if m["stock"] > 0]
+    # Each checkup completes a different open ticket, so later runs still find open ones
+    checkups = itertools.cycle(open_tickets)
+
+    return {
+        "ai/generate-questions": lambda i: (
+            "POST", "/api/ai/generate-pre-assessment-questions", complaints[i % len(complaints)], patients[i % len(patients)]["id"]
+        ),
+        "ai/submit-pre-assessment": lambda i: (
+            "POST", "/api/ai/submit-pre-assessment", qa(i), patients[i % len(patients)]["id"]
+        ),
+        "ai/analyze-ticket": lambda i: (
+            "POST", "/api/ai/analyze-ticket",
+            {"fo_note": complaints[i % len(complaints)], "patient_id": patients[i % len(patients)]["id"]},
+            doctors[0]["id"],
+        ),
+        "ai/analyze-tickets/batch": lambda i: (
+            "POST", "/api/ai/analyze-tickets/batch",
+            [{"fo_note": complaints[(i * 10 + k) % len(complaints)], "patient_id": patients[(i * 10 + k) % len(patients)]["id"]}
+             for k in range(10)],
+            doctors[0]["id"],
+        ),
+        "ai/doctor-assist": lambda i: (
+            "POST", "/api/ai/doctor-assist",
+            {"nik": active_patients[i % len(active_patients)]["nik"], "doctor_draft": "Suspected viral infection"},
+            doctors[i % len(doctors)]["id"],
+        ),
+        "ai/patient-chat": lambda i: (
+            "POST", "/api/ai/patient-chat",
+            {"ticket_id": noted_tickets[i % len(noted_tickets)]["id"], "message": "Should I take the medicine after meals?"},
+            noted_tickets[i % len(noted_tickets)]["patient_id"],
+        ),
+        "ai/patient-chat/stream": lambda i: (
+            "POST", "/api/ai/patient-chat/stream",
+            {"ticket_id": noted_tickets[i % len(noted_tickets)]["id"], "message": "When should I come back for control?"},
+            noted_tickets[i % len(noted_tickets)]["patient_id"],
+        ),
+        "tickets/create": lambda i: (
+            "POST", "/api/tickets/create",
+            {"patient_id": patients[i % len(patients)]["id"], "fo_note": complaints[i % len(complaints)],
+             "doctor_id": doctors[i % len(doctors)]["id"], "requires_inpatient": i % 4 == 0, "severity_level": "medium"},
+            doctors[0]["id"],
+        ),
+        "tickets/assign-doctor": lambda i: (
+            "POST", f"/api/tickets/{open_tickets[i % len(open_tickets)]['id']}/assign-doctor",
+            doctors[i % len(doctors)]["id"], doctors[0]["id"],
+        ),
+        "tickets/complete-checkup": lambda i: (
+            "POST", f"/api/tickets/{next(checkups)['id']}/complete-checkup",
+            {"doctor_note": "Viral URTI, symptomatic treatment.",
+             "prescriptions": [{"medicine_id": medicine_ids[i % len(medicine_ids)], "quantity": 10, "notes": "3x daily"}]},
+            doctors[0]["id"],
+        ),
+    }
+
+
+async def _stats(client: httpx.AsyncClient, url: str) -> dict:
+    return (await client.get(f"{url}/_bench/stats")).json()
+
+
+async def run_scenario(client, app_url, db_url, llm_url, make_request, concurrency, n_requests, warmup) -> dict:
+    tokens = {}
+
+    async def one(i: int):
+        method, path, body, user_id = make_request(i)
+        token = tokens.get(user_id) or tokens.setdefault(user_id, _token(user_id))
+        started = time.perf_counter()
+        async with client.stream(method, app_url + path, json=body, headers={"Authorization": f"Bearer {token}"}) as res:
+            first_byte = None
+            async for _ in res.aiter_bytes():
+                if first_byte is None:
+                    first_byte = time.perf_counter() - started
+        return time.perf_counter() - started, first_byte or 0.0, res.status_code < 400
+
+    for i in range(warmup):
+        await one(i)
+    await asyncio.sleep(0.05)  # let fire-and-forget writes from the warmup settle
+    await client.post(f"{db_url}/_bench/reset")
+    await client.post(f"{llm_url}/_bench/reset")
+
+    counter = itertools.count(warmup)
+    results = []
+
+    async def worker():
+        while (i := next(counter)) < warmup + n_requests:
+            results.append(await one(i))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    await asyncio.sleep(0.05)
+
+    db, llm = await _stats(client, db_url), await _stats(client, llm_url)
+    latencies = sorted(r[0] * 1000 for r in results)
+    ttfb = sorted(r[1] * 1000 for r in results)
+    return {
+        "concurrency": concurrency,
+        "requests": n_requests,
+        "errors": sum(1 for r in results if not r[2]),
+        "p50_ms": round(_percentile(latencies, 50), 1),
+        "p95_ms": round(_percentile(latencies, 95), 1),
+        "p99_ms": round(_percentile(latencies, 99), 1),
+        "ttfb_p50_ms": round(_percentile(ttfb, 50), 1),
+        "throughput_rps": round(n_requests / elapsed, 2),
+        "db_round_trips_per_request": round(db["round_trips"] / n_requests, 2),
+        "llm_calls_per_request": round(llm["calls"] / n_requests, 2),
+    }
+
+
+COLUMNS = [
+    ("endpoint", 28), ("concurrency", 5), ("errors", 5), ("p50_ms", 9), ("p95_ms", 9), ("p99_ms", 9),
+    ("ttfb_p50_ms", 9), ("throughput_rps", 9), ("db_round_trips_per_request", 6), ("llm_calls_per_request", 6),
+]
+HEADERS = ["endpoint", "conc", "err", "p50 ms", "p95 ms", "p99 ms", "ttfb ms", "req/s", "db/req", "llm/req"]
+
+
+def print_table(rows: list, baseline: dict = None):
+    print(" ".join(h.rjust(w) if i else h.ljust(w) for i, (h, (_, w)) in enumerate(zip(HEADERS, COLUMNS))))
+    for row in rows:
+        cells = [str(row[key]).rjust(width) if i else str(row[key]).ljust(width) for i, (key, width) in enumerate(COLUMNS)]
+        print(" ".join(cells))
+        old = (baseline or {}).get((row["endpoint"], row["concurrency"]))
+        if old:
+            deltas = []
+            for key, width in COLUMNS[3:]:
+                before, after = old.get(key) or 0, row[key]
+                deltas.append((f"{(after - before) / before * 100:+.0f}%" if before else "n/a").rjust(width))
+            print(" ".join(["  vs baseline".ljust(COLUMNS[0][1]), " " * 5, " " * 5, *deltas]))
+
+
+async def main_async(args) -> list:
+    tables = seed.generate(patients=args.patients, doctors=args.doctors, seed=args.seed)
+    db = fake_postgrest.FakeDatabase(tables, latency_ms=args.db_latency_ms)
+    db_url = _serve(fake_postgrest.create_app(db))
+    llm_url = _serve(fake_llm.create_app(fake_llm.LLMSettings(args.ttft_ms, args.token_ms, args.tokens)))
+
+    # The backend reads its configuration at import time
+    os.environ.update(
+        SUPABASE_URL=db_url,
+        SUPABASE_KEY="benchmark-service-key",
+        SUPABASE_JWT_SECRET=JWT_SECRET,
+        AUTH_MODE="local",
+        AI_BASE_URL=f"{llm_url}/v1",
+        AI_API_KEY="benchmark",
+        AI_MODEL_ID="benchmark-model",
+    )
+    import main
+
+    app_url = _serve(main.app)
+    scenarios = build_scenarios(tables)
+    selected = args.endpoints.split(",") if args.endpoints else list(scenarios)
+    levels = [int(c) for c in args.concurrency.split(",")]
+
+    rows = []
+    limits = httpx.Limits(max_connections=max(levels) * 2, max_keepalive_connections=max(levels) * 2)
+    async with httpx.AsyncClient(timeout=300, limits=limits) as client:
+        for endpoint in selected:
+            for concurrency in levels:
+                row = await run_scenario(
+                    client, app_url, db_url, llm_url, scenarios[endpoint], concurrency, args.requests, args.warmup
+                )
+                rows.append({"endpoint": endpoint, **row})
+                print(f"  {endpoint} @ {concurrency}: p50 {row['p50_ms']} ms, {row['throughput_rps']} req/s", file=sys.stderr)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark of the MediSync API")
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=64, help="Measured requests per endpoint and level")
+    parser.add_argument("--warmup", type=int, default=3, help="Unmeasured requests before each run")
+    parser.add_argument("--endpoints", help="Comma-separated subset, e.g. ai/analyze-ticket,tickets/create")
+    parser.add_argument("--ttft-ms", type=float, default=300.0, help="Stub LLM time to first token")
+    parser.add_argument("--token-ms", type=float, default=10.0, help="Stub LLM latency per generated token")
+    parser.add_argument("--tokens", type=int, default=60, help="Stub LLM tokens per free-text reply")
+    parser.add_argument("--db-latency-ms", type=float, default=2.0, help="Latency added to every DB round trip")
+    parser.add_argument("--patients", type=int, default=500)
+    parser.add_argument("--doctors", type=int, default=36)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--baseline", help="Compare against a previous --json result")
+    args = parser.parse_args()
+
+    rows = asyncio.run(main_async(args))
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = {(r["endpoint"], r["concurrency"]): r for r in json.load(f)["results"]}
+    print_table(rows, baseline)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"settings": vars(args), "results": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Faker-generated hospital dataset for the benchmark PostgREST stand-in.
+Rows follow the schema in supabase/migrations so the backend's queries
+(including embeds and RPCs) behave as they do against Postgres.
+"""
+
+import random
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from faker import Faker
+
+SPECIALIZATIONS = [
+    "Internal Medicine",
+    "Cardiology",
+    "Pulmonology",
+    "Neurology",
+    "Pediatrics",
+    "Dermatology",
+    "Orthopedics",
+    "Gastroenterology",
+    "Ophthalmology",
+    "ENT",
+    "Obstetrics and Gynecology",
+    "Psychiatry",
+]
+
+MEDICINES = [
+    "Paracetamol", "Ibuprofen", "Amoxicillin", "Azithromycin", "Cefixime", "Ciprofloxacin",
+    "Metformin", "Amlodipine", "Captopril", "Bisoprolol", "Simvastatin", "Atorvastatin",
+    "Omeprazole", "Lansoprazole", "Ranitidine", "Domperidone", "Ondansetron", "Loperamide",
+    "Cetirizine", "Loratadine", "Salbutamol", "Ambroxol", "Dextromethorphan", "Prednisone",
+    "Dexamethasone", "Methylprednisolone", "Diclofenac", "Mefenamic Acid", "Tramadol",
+    "Clopidogrel", "Aspirin", "Furosemide", "Spironolactone", "Levothyroxine", "Insulin Glargine",
+    "Hydrocortisone Cream", "Ketoconazole Cream", "Acyclovir", "Fluconazole", "Metronidazole",
+]
+STRENGTHS = ["5mg", "10mg", "20mg", "40mg", "100mg", "250mg", "500mg", "syrup 60ml"]
+
+# Complaint template -> the specialization that usually treats it
+COMPLAINTS = [
+    ("High fever for {d} days with chills and body aches", "Internal Medicine"),
+    ("Persistent dry cough and shortness of breath for {d} days", "Pulmonology"),
+    ("Severe headache with nausea and sensitivity to light", "Neurology"),
+    ("Chest pain radiating to the left arm during exertion", "Cardiology"),
+    ("Itchy red rash on both arms after eating seafood", "Dermatology"),
+    ("Abdominal pain in the upper right area after meals for {d} days", "Gastroenterology"),
+    ("Lower back pain after lifting heavy objects", "Orthopedics"),
+    ("Blurred vision and eye redness since {d} days ago", "Ophthalmology"),
+    ("Child with diarrhea and vomiting for {d} days", "Pediatrics"),
+    ("Ear pain and reduced hearing on the right side", "ENT"),
+    ("Palpitations and dizziness when standing up", "Cardiology"),
+    ("Difficulty sleeping and persistent anxiety for weeks", "Psychiatry"),
+]
+
+
+def _now_minus(days: float) -> str:
+    return (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+
+
+def generate(patients: int = 500, doctors: int = 36, rooms: int = 1000, seed: int = 42) -> dict:
+    """Return {table_name: [row, ...]} for every table the backend touches."""
+    fake = Faker()
+    Faker.seed(seed)
+    rnd = random.Random(seed)
+
+    def uid() -> str:
+        return str(uuid.UUID(int=rnd.getrandbits(128), version=4))
+
+    tables = {name: [] for name in (
+        "profiles", "nurse_teams", "rooms", "catalog_medicines", "tickets",
+        "prescriptions", "invoices", "chat_messages", "ai_pre_assessments", "chat_summaries",
+    )}
+
+    # 1. Staff
+    for team_id in (1, 2, 3):
+        tables["nurse_teams"].append({"id": team_id, "name": f"Team {team_id}"})
+    for i in range(9):
+        tables["profiles"].append(
+            {"id": uid(), "name": fake.name(), "role": "nurse", "team_id": i % 3 + 1,
+             "specialization": None, "nik": None, "updated_at": _now_minus(30)}
+        )
+    for i in range(doctors):
+        tables["profiles"].append(
+            {"id": uid(), "name": f"Dr. {fake.name()}", "role": "doctor_specialist",
+             "specialization": SPECIALIZATIONS[i % len(SPECIALIZATIONS)], "team_id": None,
+             "nik": None, "updated_at": _now_minus(30)}
+        )
+    doctor_rows = [p for p in tables["profiles"] if p["role"] == "doctor_specialist"]
+
+    # 2. Rooms and medicine catalog
+    for room_id in range(1, rooms + 1):
+        tables["rooms"].append(
+            {"id": room_id, "name": f"Room {room_id}", "type": "inpatient", "status": "available", "daily_price": 500000}
+        )
+    med_id = 0
+    for name in MEDICINES:
+        for strength in rnd.sample(STRENGTHS, 3):
+            med_id += 1
+            tables["catalog_medicines"].append(
+                {"id": med_id, "name": f"{name} {strength}", "price": rnd.randrange(5000, 250000, 500),
+                 "stock": rnd.choice([0, 10, 50, 200, 1000]), "updated_at": _now_minus(10)}
+            )
+    medicine_ids = [m["id"] for m in tables["catalog_medicines"] if m["stock"] > 0]
+
+    # 3. Patients with their past visits
+    for _ in range(patients):
+        patient = {
+            "id": uid(), "name": fake.name(), "role": "patient", "age": rnd.randint(1, 90),
+            "nik": fake.unique.numerify("################"), "phone": fake.phone_number()[:20],
+            "email": fake.email(), "specialization": None, "team_id": None, "updated_at": _now_minus(60),
+        }
+        tables["profiles"].append(patient)
+
+        for visit in range(rnd.randint(1, 6)):
+            complaint, specialization = rnd.choice(COMPLAINTS)
+            # Most visits go to a matching specialist, the rest to anyone (referrals, availability)
+            matching = [d for d in doctor_rows if d["specialization"] == specialization]
+            doctor = rnd.choice(matching if matching and rnd.random() < 0.85 else doctor_rows)
+            completed = visit > 0 or rnd.random() < 0.3
+            ticket = {
+                "id": uid(), "patient_id": patient["id"], "doctor_id": doctor["id"],
+                "fo_note": complaint.format(d=rnd.randint(1, 10)),
+                "doctor_note": fake.sentence(nb_words=12) if completed else None,
+                "status": "completed" if completed else "in_progress",
+                "room_id": None, "nurse_team_id": None, "consultation_fee": 0,
+                "severity_level": rnd.choice(["low", "medium", "high"]),
+                "ai_reasoning": fake.sentence(nb_words=10), "created_at": _now_minus(visit * 45 + rnd.random()),
+                "updated_at": _now_minus(visit * 45),
+            }
+            tables["tickets"].append(ticket)
+            if completed:
+                for medicine_id in rnd.sample(medicine_ids, rnd.randint(0, 3)):
+                    tables["prescriptions"].append(
+                        {"id": uid(), "ticket_id": ticket["id"], "medicine_id": medicine_id,
+                         "quantity": rnd.randint(1, 30), "notes": "3x daily after meals",
+                         "status": "dispensed", "created_at": ticket["created_at"]}
+                    )
+            for turn in range(rnd.randint(0, 4)):
+                tables["chat_messages"].append(
+                    {"id": uid(), "ticket_id": ticket["id"], "patient_id": patient["id"],
+                     "sender": "patient" if turn % 2 == 0 else "ai", "message": fake.sentence(),
+                     "created_at": _now_minus(visit * 45 + (4 - turn) / 1000)}
+                )
+
+    return tables
@@ -0,0 +1,132 @@
+"""
+Bounded in-process TTL + LRU cache.
+Entries expire after `ttl` seconds; once `maxsize` is reached the least
+recently used entry is evicted. Hits, misses and evictions are published
+as metrics labelled with the cache name.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+
+_hits = metrics.counter("cache_hits_total", "Cache lookups served from memory")
+_misses = metrics.counter("cache_misses_total", "Cache lookups that missed or found an expired entry")
+_evictions = metrics.counter("cache_evictions_total", "Entries evicted because the cache was full")
+_size = metrics.gauge("cache_entries", "Number of entries currently held")
+
+
+class TTLCache:
+    def __init__(self, name: str, maxsize: int = 1024, ttl: float = 300.0):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._data.move_to_end(key)
+                    _hits.inc(cache=self.name)
+                    return value
+                del self._data[key]
+                _size.set(len(self._data), cache=self.name)
+        _misses.inc(cache=self.name)
+        return default
+
+    def set(self, key, value, ttl: float | None = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                _evictions.inc(cache=self.name)
+            _size.set(len(self._data), cache=self.name)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+            _size.set(len(self._data), cache=self.name)
+        return entry[0] if entry is not None else default
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            _size.set(0, cache=self.name)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": _hits.value(cache=self.name),
+            "misses": _misses.value(cache=self.name),
+            "evictions": _evictions.value(cache=self.name),
+        }
+
+    def __contains__(self, key) -> bool:
+        """Whether `key` holds an unexpired entry (no LRU or hit/miss side effects)."""
+        with self._lock:
+            entry = self._data.get(key)
+            return entry is not None and entry[1] > time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+_reloads = metrics.counter("snapshot_reloads_total", "In-memory table snapshot reloads, by snapshot and reason")
+
+
+class RefreshingSnapshot:
+    """
+    In-memory snapshot of a database table that reloads itself when stale.
+    Every `check_seconds` a cheap `_fingerprint()` query is compared with the one
+    taken at the last load and a change triggers a reload; a full reload also
+    happens at least every `refresh_seconds`. Subclasses implement `_load()`.
+    """
+
+    def __init__(self, name: str, refresh_seconds: float = 600.0, check_seconds: float = 30.0):
+        self.name = name
+        self.refresh_seconds = refresh_seconds
+        self.check_seconds = check_seconds
+        self._lock = threading.Lock()
+        self._fingerprint_value = None
+        self._loaded_at = 0.0
+        self._checked_at = 0.0
+
+    def _load(self):
+        raise NotImplementedError
+
+    def _fingerprint(self):
+        raise NotImplementedError
+
+    def _reload(self, reason: str):
+        self._load()
+        self._fingerprint_value = self._fingerprint()
+        self._loaded_at = self._checked_at = time.monotonic()
+        _reloads.inc(snapshot=self.name, reason=reason)
+
+    def ensure_fresh(self):
+        if self._loaded_at and time.monotonic() - self._checked_at < self.check_seconds:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if not self._loaded_at:
+                self._reload("initial")
+            elif now - self._loaded_at >= self.refresh_seconds:
+                self._reload("interval")
+            elif now - self._checked_at >= self.check_seconds:
+                self._checked_at = now
+                if self._fingerprint() != self._fingerprint_value:
+                    self._reload("changed")
+
+    def invalidate(self):
+        """Force a reload on the next access."""
+        with self._lock:
+            self._loaded_at = 0.0
@@ -0,0 +1,162 @@
+"""
+Worker-pool offload layer for blocking calls.
+The Supabase client, the OpenAI client and Strands agents are all synchronous,
+so route handlers must never call them directly on the event loop.
+`run_blocking` runs them on a bounded thread pool instead.
+
+`coalesce` collapses concurrent identical blocking calls (e.g. a double-clicked
+AI request) into one execution whose result every caller receives.
+
+Configuration from .env:
+  - WORKER_POOL_SIZE: Max number of blocking calls running at once (default: 64)
+"""
+
+import copy
+import functools
+import os
+import threading
+import time
+
+from anyio import CapacityLimiter, to_thread
+
+import metrics
+import tracing
+
+WORKER_POOL_SIZE = int(os.environ.get("WORKER_POOL_SIZE", "64"))
+
+_limiter: CapacityLimiter | None = None
+
+
+def _get_limiter() -> CapacityLimiter:
+    global _limiter
+    if _limiter is None:
+        _limiter = CapacityLimiter(WORKER_POOL_SIZE)
+    return _limiter
+
+
+def pool_stats() -> dict:
+    """Current saturation of the worker pool."""
+    if _limiter is None:
+        return {"capacity": WORKER_POOL_SIZE, "in_flight": 0, "waiting": 0}
+    return {
+        "capacity": int(_limiter.total_tokens),
+        "in_flight": int(_limiter.borrowed_tokens),
+        "waiting": _limiter.statistics().tasks_waiting,
+    }
+
+
+metrics.gauge("worker_pool_capacity", "Max concurrent blocking calls", fn=lambda: pool_stats()["capacity"])
+metrics.gauge("worker_pool_in_flight", "Blocking calls currently running", fn=lambda: pool_stats()["in_flight"])
+metrics.gauge("worker_pool_waiting", "Blocking calls waiting for a free worker", fn=lambda: pool_stats()["waiting"])
+_tasks_total = metrics.counter("worker_pool_tasks_total", "Blocking calls completed, by function and outcome")
+_wait_seconds = metrics.histogram("worker_pool_wait_seconds", "Time spent waiting for a free worker")
+_run_seconds = metrics.histogram("worker_pool_run_seconds", "Time spent running in the worker pool")
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking function on the worker pool and await its result."""
+    name = getattr(func, "__name__", "call")
+    submitted = time.perf_counter()
+
+    def _call():
+        started = time.perf_counter()
+        _wait_seconds.observe(started - submitted)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _run_seconds.observe(time.perf_counter() - started, function=name)
+
+    try:
+        result = await to_thread.run_sync(_call, limiter=_get_limiter())
+    except Exception:
+        _tasks_total.inc(function=name, outcome="error")
+        raise
+    _tasks_total.inc(function=name, outcome="ok")
+    return result
+
+
+_DONE = object()
+
+
+async def iterate_blocking(iterator):
+    """Consume a blocking iterator (e.g. an LLM token stream) from async code, one item per pool hop."""
+    iterator = iter(iterator)
+    try:
+        while True:
+            item = await run_blocking(next, iterator, _DONE)
+            if item is _DONE:
+                return
+            yield item
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            await run_blocking(close)
+
+
+_singleflight_calls = metrics.counter(
+    "singleflight_calls_total", "Coalesced entry point calls, by name and role (leader ran it, follower shared it)"
+)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time; concurrent callers with the same key share its outcome."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: dict = {}
+
+    def do(self, key, func, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            _singleflight_calls.inc(name=self.name, role="follower")
+            with tracing.span(f"coalesced {self.name}", kind="coalesced"):
+                call.done.wait()
+            if call.error is not None:
+                raise call.error
+            # Each follower gets its own copy, so one cannot mutate another's response
+            return copy.deepcopy(call.result)
+
+        _singleflight_calls.inc(name=self.name, role="leader")
+        try:
+            result = func(*args, **kwargs)
+            # Followers copy from a snapshot the leader's caller cannot mutate
+            call.result = copy.deepcopy(result)
+            return result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+def coalesce(name: str, key):
+    """
+    Decorator: concurrent calls whose `key(*args, **kwargs)` is equal share one execution.
+    Only in-flight calls are shared; a call made after the first has finished runs again.
+    """
+    group = SingleFlight(name)
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return group.do(key(*args, **kwargs), func, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
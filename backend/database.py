@@ -1,6 +1,7 @@
 import os
 from dotenv import load_dotenv
 from supabase import create_client, Client
+from tracing import instrument_postgrest
 
 load_dotenv()
 
@@ -11,3 +12,6 @@ if not url or not key:
     raise ValueError("Missing Supabase env vars in Backend")
 
 supabase: Client = create_client(url, key)
+
+# Time every query and count round trips per request
+instrument_postgrest()
@@ -1,31 +1,155 @@
+import hashlib
 import os
+import time
+
+import jwt
 from fastapi import Depends, HTTPException, Security
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from database import supabase
+from concurrency import run_blocking
+from cache import TTLCache
+import metrics
+import tracing
 
 security = HTTPBearer()
 
-def get_current_user(credentials: HTTPAuthorizationCredentials = Security(security)) -> dict:
+# Auth configuration from .env:
+#   - AUTH_MODE: "local" verifies the JWT signature/expiry in-process (default),
+#                "remote" validates every token with supabase.auth.get_user()
+#   - AUTH_REMOTE_FALLBACK: In local mode, fall back to get_user() when the token
+#                           cannot be verified locally (missing secret, unknown key)
+#   - SUPABASE_JWT_SECRET: Project JWT secret for HS256 tokens
+#   - AUTH_TOKEN_CACHE_SIZE / AUTH_TOKEN_CACHE_TTL: Validated-token cache bounds
+AUTH_MODE = os.environ.get("AUTH_MODE", "local")
+AUTH_REMOTE_FALLBACK = os.environ.get("AUTH_REMOTE_FALLBACK", "false").lower() in ("1", "true", "yes")
+JWT_SECRET = os.environ.get("SUPABASE_JWT_SECRET", "")
+JWT_AUDIENCE = os.environ.get("SUPABASE_JWT_AUDIENCE", "authenticated")
+# Asymmetric algorithms accepted for keys from the project's JWKS
+JWKS_ALGORITHMS = ("RS256", "ES256")
+JWKS_URL = f"{os.environ.get('SUPABASE_URL', '').rstrip('/')}/auth/v1/.well-known/jwks.json"
+
+_token_cache = TTLCache(
+    "auth_tokens",
+    maxsize=int(os.environ.get("AUTH_TOKEN_CACHE_SIZE", "10000")),
+    ttl=float(os.environ.get("AUTH_TOKEN_CACHE_TTL", "300")),
+)
+_jwks_client = jwt.PyJWKClient(JWKS_URL, cache_keys=True, lifespan=600)
+_verifications = metrics.counter("auth_verifications_total", "Token verifications by method and outcome")
+
+
+class LocalVerificationUnavailable(Exception):
+    """The token is well-formed but cannot be checked without the Auth server."""
+
+
+def _verify_local(token: str) -> dict:
+    """Check the Supabase JWT signature and expiry in-process. Returns the claims."""
+    # The header is unverified: only use it to pick a key, never to choose the algorithm freely
+    alg = jwt.get_unverified_header(token).get("alg")
+    if alg == "HS256":
+        if not JWT_SECRET:
+            raise LocalVerificationUnavailable("SUPABASE_JWT_SECRET is not set")
+        key, algorithms = JWT_SECRET, ["HS256"]
+    elif alg in JWKS_ALGORITHMS:
+        # Asymmetric signing keys are published in the project's JWKS (cached by PyJWKClient)
+        try:
+            signing_key = _jwks_client.get_signing_key_from_jwt(token)
+        except jwt.PyJWKClientError as e:
+            raise LocalVerificationUnavailable(str(e))
+        if signing_key.algorithm_name not in JWKS_ALGORITHMS:
+            raise jwt.InvalidAlgorithmError(f"Unsupported signing key algorithm: {signing_key.algorithm_name}")
+        key, algorithms = signing_key.key, [signing_key.algorithm_name]
+    else:
+        raise jwt.InvalidAlgorithmError(f"Unsupported token algorithm: {alg}")
+    return jwt.decode(
+        token,
+        key,
+        algorithms=algorithms,
+        audience=JWT_AUDIENCE,
+        options={"require": ["exp", "sub"]},
+    )
+
+
+def _verify_remote(token: str) -> dict:
+    """Validate the token against the Supabase Auth server."""
+    user_response = supabase.auth.get_user(token)
+    if not user_response.user:
+        raise HTTPException(status_code=401, detail="Invalid authentication token")
+    user = user_response.user
+    return {
+        "sub": user.id,
+        "email": user.email,
+        "role": user.role,
+        "user_metadata": user.user_metadata,
+    }
+
+
+def _verify(token: str) -> tuple[dict, float | None]:
+    """Verify a token using the configured mode. Returns (user payload, expiry timestamp)."""
+    if AUTH_MODE == "remote":
+        user = _verify_remote(token)
+        _verifications.inc(method="remote", outcome="ok")
+        return user, None
+
+    try:
+        claims = _verify_local(token)
+    except LocalVerificationUnavailable:
+        if not AUTH_REMOTE_FALLBACK:
+            raise
+        user = _verify_remote(token)
+        _verifications.inc(method="remote_fallback", outcome="ok")
+        return user, None
+
+    _verifications.inc(method="local", outcome="ok")
+    # We return a payload structure similar to the decoded JWT for compatibility
+    user = {
+        "sub": claims["sub"],
+        "email": claims.get("email"),
+        "role": claims.get("role"),
+        "user_metadata": claims.get("user_metadata", {}),
+    }
+    return user, claims["exp"]
+
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Security(security)) -> dict:
     """
     Dependency to validate the Supabase JWT token and extract user information.
-    Uses Supabase's auth.get_user() to securely validate the token against the Auth server.
+    Tokens are verified locally (signature + expiry) and kept in a bounded TTL cache,
+    so repeat requests with the same token skip verification entirely.
     """
     token = credentials.credentials
+    cache_key = hashlib.sha256(token.encode()).hexdigest()
+
+    user = _token_cache.get(cache_key)
+    if user is not None:
+        return user
+
     try:
-        # Validate the token by fetching the user from Supabase
-        user_response = supabase.auth.get_user(token)
-        
-        if not user_response.user:
-            raise HTTPException(status_code=401, detail="Invalid authentication token")
-            
-        user = user_response.user
-        
-        # We return a payload structure similar to the decoded JWT for compatibility
-        return {
-            "sub": user.id,
-            "email": user.email,
-            "role": user.role,
-            "user_metadata": user.user_metadata,
-        }
+        # Verification may fetch JWKS or call the Auth server, so run it on the worker pool
+        with tracing.span("verify_token", kind="auth", mode=AUTH_MODE):
+            user, expires_at = await run_blocking(_verify, token)
+    except HTTPException:
+        _verifications.inc(method=AUTH_MODE, outcome="rejected")
+        raise
     except Exception as e:
+        _verifications.inc(method=AUTH_MODE, outcome="rejected")
         raise HTTPException(status_code=401, detail=f"Could not validate credentials: {str(e)}")
+
+    # Never cache a token past its own expiry
+    ttl = None
+    if expires_at is not None:
+        ttl = min(_token_cache.ttl, expires_at - time.time())
+    if ttl is None or ttl > 0:
+        _token_cache.set(cache_key, user, ttl=ttl)
+    return user
+
+
+# Roles from the JWT's user_metadata that count as hospital staff (everyone but patients)
+STAFF_ROLES = frozenset({"admin", "fo", "doctor_specialist", "nurse", "pharmacist", "agent"})
+
+
+async def get_staff_user(user: dict = Depends(get_current_user)) -> dict:
+    """Dependency for staff-only endpoints: like get_current_user, but 403 for patients and unknown roles."""
+    role = (user.get("user_metadata") or {}).get("role")
+    if role not in STAFF_ROLES:
+        raise HTTPException(status_code=403, detail="Staff access required")
+    return user
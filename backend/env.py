@@ -0,0 +1,10 @@
+"""
+Loads .env into the process environment.
+
+main.py imports this module first: several modules read their configuration
+from the environment at import time.
+"""
+
+from dotenv import load_dotenv
+
+load_dotenv()
@@ -0,0 +1,104 @@
+"""
+Idempotency-Key support for expensive POST endpoints.
+
+A client that retries a request with the same `Idempotency-Key` header gets
+the original outcome instead of a second LLM run / second ticket:
+  - while the first request is still running, the retry waits for it and
+    receives the same response
+  - once it has finished, the stored response is replayed
+    (marked with an `Idempotent-Replayed: true` header)
+
+Keys are scoped to the authenticated user. Reusing a key with a different
+endpoint or request body is rejected with 422. Failed attempts (exceptions and
+`{"status": "error"}` results) are not stored, so a retry runs again.
+Entries live in this process only.
+
+Configuration from .env:
+  - IDEMPOTENCY_TTL: Seconds a completed response can be replayed (default: 86400)
+  - IDEMPOTENCY_CACHE_SIZE: Max keys kept in memory (default: 10000)
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+
+from fastapi import HTTPException, Response
+
+import metrics
+from cache import TTLCache
+
+MAX_KEY_LENGTH = 255
+
+_requests = metrics.counter(
+    "idempotency_requests_total", "Requests carrying an Idempotency-Key, by endpoint and outcome"
+)
+
+
+class _Entry:
+    def __init__(self, fingerprint: str, task: asyncio.Task):
+        self.fingerprint = fingerprint
+        self.task = task
+
+
+class IdempotencyStore:
+    def __init__(self, ttl: float, maxsize: int):
+        self._entries = TTLCache("idempotency", maxsize=maxsize, ttl=ttl)
+
+    async def run(self, user_id: str, key: str | None, endpoint: str, payload: dict, compute, response: Response):
+        """
+        Return `await compute()`, deduplicated by (user_id, key).
+        `compute` may set `response.status_code`; replays reuse that status.
+        """
+        if not key:
+            return await compute()
+        if len(key) > MAX_KEY_LENGTH:
+            raise HTTPException(status_code=400, detail=f"Idempotency-Key must be at most {MAX_KEY_LENGTH} characters")
+
+        cache_key = (user_id, key)
+        fingerprint = hashlib.sha256(
+            json.dumps([endpoint, payload], sort_keys=True, ensure_ascii=False, default=str).encode()
+        ).hexdigest()
+
+        entry = self._entries.get(cache_key)
+        if entry is not None:
+            if entry.fingerprint != fingerprint:
+                _requests.inc(endpoint=endpoint, outcome="mismatch")
+                raise HTTPException(
+                    status_code=422, detail="Idempotency-Key was already used for a different request"
+                )
+            _requests.inc(endpoint=endpoint, outcome="replayed" if entry.task.done() else "attached")
+            # shield: a retry that disconnects must not cancel the shared computation
+            status_code, body = await asyncio.shield(entry.task)
+            response.status_code = status_code
+            response.headers["Idempotent-Replayed"] = "true"
+            return body
+
+        _requests.inc(endpoint=endpoint, outcome="new")
+
+        async def _compute():
+            body = await compute()
+            return response.status_code or 200, body
+
+        task = asyncio.ensure_future(_compute())
+        entry = _Entry(fingerprint, task)
+        self._entries.set(cache_key, entry)
+        task.add_done_callback(lambda t: self._forget_failure(cache_key, entry))
+
+        _, body = await asyncio.shield(task)
+        return body
+
+    def _forget_failure(self, cache_key: tuple, entry: _Entry):
+        task = entry.task
+        failed = task.cancelled() or task.exception() is not None
+        if not failed:
+            body = task.result()[1]
+            failed = isinstance(body, dict) and body.get("status") == "error"
+        if failed and self._entries.get(cache_key) is entry:
+            self._entries.pop(cache_key)
+
+
+store = IdempotencyStore(
+    ttl=float(os.environ.get("IDEMPOTENCY_TTL", "86400")),
+    maxsize=int(os.environ.get("IDEMPOTENCY_CACHE_SIZE", "10000")),
+)
@@ -0,0 +1,161 @@
+"""
+In-process background job queue.
+
+Long-running work (LLM pipelines) is submitted as a job and executed on a
+bounded thread pool, so the HTTP request can return a job id immediately.
+Failed attempts are retried with exponential backoff. A job function receives
+a `progress` dict that survives retries: steps record their results there and
+a retry resumes after the last completed step instead of repeating it (e.g.
+never inserting the same ticket twice).
+
+Job state lives in this process only (jobs are kept for `result_ttl` seconds
+after submission). Clients can poll a job or `await job.wait_for_change()`
+to stream its status.
+"""
+
+import asyncio
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+import tracing
+from cache import TTLCache
+
+QUEUED, RUNNING, RETRYING, SUCCEEDED, FAILED = "queued", "running", "retrying", "succeeded", "failed"
+
+_submitted = metrics.counter("jobs_submitted_total", "Jobs accepted, by queue")
+_rejected = metrics.counter("jobs_rejected_total", "Jobs rejected because the queue was full, by queue")
+_finished = metrics.counter("jobs_finished_total", "Jobs finished, by queue and outcome")
+_attempts = metrics.counter("job_attempts_total", "Job attempts, by queue and outcome")
+_wait_seconds = metrics.histogram("job_wait_seconds", "Time a job spent queued before its first attempt")
+_run_seconds = metrics.histogram("job_run_seconds", "Time from a job's first attempt until it finished, retries included")
+_pending = metrics.gauge("jobs_pending", "Jobs queued or running, by queue")
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, queue: str, owner: str):
+        self.id = str(uuid.uuid4())
+        self.queue = queue
+        self.owner = owner
+        self.status = QUEUED
+        self.attempts = 0
+        self.progress: dict = {}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self._lock = threading.Lock()
+        self._waiters: list = []
+
+    @property
+    def done(self) -> bool:
+        return self.status in (SUCCEEDED, FAILED)
+
+    def _update(self, **fields):
+        with self._lock:
+            for name, value in fields.items():
+                setattr(self, name, value)
+            self.updated_at = time.time()
+            waiters, self._waiters = self._waiters, []
+        for loop, event in waiters:
+            loop.call_soon_threadsafe(event.set)
+
+    async def wait_for_change(self, timeout: float) -> bool:
+        """Wait until the job's status changes (or `timeout` passes). Returns False on timeout."""
+        event = asyncio.Event()
+        with self._lock:
+            if self.done:
+                return True
+            self._waiters.append((asyncio.get_running_loop(), event))
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "attempts": self.attempts,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+
+class JobQueue:
+    def __init__(
+        self,
+        name: str,
+        workers: int = 4,
+        max_attempts: int = 3,
+        retry_backoff: float = 2.0,
+        max_pending: int = 200,
+        result_ttl: float = 3600.0,
+    ):
+        self.name = name
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"job-{name}")
+        self._jobs = TTLCache(f"jobs_{name}", maxsize=100_000, ttl=result_ttl)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+
+    def submit(self, owner: str, fn, *args) -> Job:
+        """Queue `fn(*args, progress=job.progress)`. Raises QueueFull when too many jobs are pending."""
+        with self._lock:
+            if self._in_flight >= self.max_pending:
+                _rejected.inc(queue=self.name)
+                raise QueueFull(f"Too many pending {self.name} jobs, try again later")
+            self._in_flight += 1
+            _pending.set(self._in_flight, queue=self.name)
+
+        job = Job(self.name, owner)
+        self._jobs.set(job.id, job)
+        _submitted.inc(queue=self.name)
+        self._executor.submit(self._run, job, fn, args)
+        return job
+
+    def get(self, job_id: str, owner: str = None) -> Job | None:
+        """Look a job up; when `owner` is given, jobs of other owners are not returned."""
+        job = self._jobs.get(job_id)
+        if job is None or (owner is not None and job.owner != owner):
+            return None
+        return job
+
+    def _run(self, job: Job, fn, args: tuple):
+        started = time.perf_counter()
+        _wait_seconds.observe(time.time() - job.created_at, queue=self.name)
+        try:
+            with tracing.background_trace(f"job {self.name}", trace_id=job.id):
+                for attempt in range(1, self.max_attempts + 1):
+                    job._update(status=RUNNING, attempts=attempt)
+                    try:
+                        with tracing.span(f"attempt {attempt}", kind="job", queue=self.name):
+                            result = fn(*args, progress=job.progress)
+                    except Exception as e:
+                        _attempts.inc(queue=self.name, outcome="error")
+                        if attempt == self.max_attempts:
+                            job._update(status=FAILED, error=str(e))
+                            break
+                        job._update(status=RETRYING, error=str(e))
+                        time.sleep(self.retry_backoff * 2 ** (attempt - 1))
+                    else:
+                        _attempts.inc(queue=self.name, outcome="ok")
+                        job._update(status=SUCCEEDED, result=result, error=None)
+                        break
+        finally:
+            _finished.inc(queue=self.name, outcome=job.status)
+            _run_seconds.observe(time.perf_counter() - started, queue=self.name)
+            with self._lock:
+                self._in_flight -= 1
+                _pending.set(self._in_flight, queue=self.name)
@@ -1,8 +1,28 @@
-from fastapi import FastAPI
+import env  # noqa: F401  (must stay first: loads .env before the app modules read their configuration)
+from contextlib import asynccontextmanager
+
+from fastapi import Depends, FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
+from agents.core.scheduler import LLMOverloaded, scheduler
+from agents.triage import prefilter
 from routers import ai, tickets
+from concurrency import pool_stats, run_blocking
+from dependencies import get_staff_user
+from services import chat_messages
+from tracing import TracingMiddleware
+import metrics
+import tracing
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Write out chat messages still queued in memory before the process exits
+    await run_blocking(chat_messages.writer.close)
 
-app = FastAPI(title="MediSync API - AI Hospital Orchestration")
+
+app = FastAPI(title="MediSync API - AI Hospital Orchestration", lifespan=lifespan)
 
 # Setup CORS
 app.add_middleware(
@@ -11,7 +31,18 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID", "Idempotent-Replayed", "Retry-After"],
 )
+# Outermost, so the trace covers CORS handling and the full streamed response
+app.add_middleware(TracingMiddleware)
+
+
+@app.exception_handler(LLMOverloaded)
+async def llm_overloaded(request: Request, exc: LLMOverloaded):
+    """The LLM scheduler's queue is full: tell the client when to retry instead of timing out."""
+    return JSONResponse(
+        {"detail": str(exc)}, status_code=503, headers={"Retry-After": str(exc.retry_after)}
+    )
 
 
 @app.get("/")
@@ -24,5 +55,31 @@ async def health_check():
     return {"status": "ok", "message": "MediSync Backend is running"}
 
 
+@app.get("/api/metrics")
+async def get_metrics():
+    """In-process metrics snapshot (worker pool saturation, counters, latency histograms)."""
+    return {
+        "worker_pool": pool_stats(),
+        "llm_scheduler": scheduler.stats(),
+        "complaint_prefilter": prefilter.stats(),
+        "metrics": metrics.snapshot(),
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def prometheus_metrics():
+    """Same metrics in the Prometheus text exposition format, for scraping."""
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/api/traces")
+async def get_traces(limit: int = 20, user: dict = Depends(get_staff_user)):
+    """
+    Most recent request traces with per-span timings, DB call counts and token usage.
+    Staff only: unlike the aggregate metrics, traces carry per-request paths with ticket and patient ids.
+    """
+    return {"traces": tracing.recent(limit)}
+
+
 app.include_router(ai.router, prefix="/api/ai", tags=["AI"])
 app.include_router(tickets.router, prefix="/api/tickets", tags=["Tickets"])
\ No newline at end of file
@@ -0,0 +1,188 @@
+"""
+Lightweight in-process metrics registry.
+Counters, gauges and histograms live in memory and are exposed as a JSON
+snapshot by /api/metrics and in the Prometheus text format by /metrics.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+_lock = threading.Lock()
+_registry: dict = {}
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Counter:
+    """Monotonically increasing value, optionally split by labels."""
+
+    type = "counter"
+
+    def __init__(self, name: str, description: str = ""):
+        self.name = name
+        self.description = description
+        self._values: dict = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0)
+
+    def collect(self) -> list:
+        with self._lock:
+            return [{"labels": dict(k), "value": v} for k, v in self._values.items()]
+
+
+class Gauge:
+    """Point-in-time value. Either set explicitly or read from a callback at collect time."""
+
+    type = "gauge"
+
+    def __init__(self, name: str, description: str = "", fn=None):
+        self.name = name
+        self.description = description
+        self._fn = fn
+        self._values: dict = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        if self._fn is not None:
+            return self._fn()
+        return self._values.get(_label_key(labels), 0)
+
+    def collect(self) -> list:
+        if self._fn is not None:
+            return [{"labels": {}, "value": self._fn()}]
+        with self._lock:
+            return [{"labels": dict(k), "value": v} for k, v in self._values.items()]
+
+
+class Histogram:
+    """Distribution of observed values (usually durations in seconds)."""
+
+    type = "histogram"
+
+    def __init__(self, name: str, description: str = "", buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(sorted(buckets))
+        self._values: dict = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = {"count": 0, "sum": 0.0, "buckets": [0] * len(self.buckets)}
+                self._values[key] = series
+            series["count"] += 1
+            series["sum"] += value
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["buckets"][i] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def collect(self) -> list:
+        with self._lock:
+            return [
+                {
+                    "labels": dict(k),
+                    "count": s["count"],
+                    "sum": s["sum"],
+                    "buckets": dict(zip(self.buckets, s["buckets"])),
+                }
+                for k, s in self._values.items()
+            ]
+
+
+def _get_or_create(cls, name: str, description: str, **kwargs):
+    with _lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = cls(name, description, **kwargs)
+            _registry[name] = metric
+        return metric
+
+
+def counter(name: str, description: str = "") -> Counter:
+    return _get_or_create(Counter, name, description)
+
+
+def gauge(name: str, description: str = "", fn=None) -> Gauge:
+    return _get_or_create(Gauge, name, description, fn=fn)
+
+
+def histogram(name: str, description: str = "", buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+    return _get_or_create(Histogram, name, description, buckets=buckets)
+
+
+def snapshot() -> dict:
+    """Return every registered metric as a JSON-serializable dict."""
+    with _lock:
+        metrics = list(_registry.values())
+    return {
+        m.name: {"type": m.type, "description": m.description, "values": m.collect()}
+        for m in metrics
+    }
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: dict, **extra) -> str:
+    pairs = {**labels, **extra}
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs.items()) + "}"
+
+
+def render_prometheus() -> str:
+    """Render every registered metric in the Prometheus text exposition format."""
+    with _lock:
+        metrics = list(_registry.values())
+    lines = []
+    for m in metrics:
+        lines.append(f"# HELP {m.name} {_escape(m.description)}")
+        lines.append(f"# TYPE {m.name} {m.type}")
+        for series in m.collect():
+            labels = series["labels"]
+            if m.type != "histogram":
+                lines.append(f"{m.name}{_format_labels(labels)} {series['value']}")
+                continue
+            # Bucket counts are already cumulative (observe() increments every bucket >= value)
+            for bound, count in series["buckets"].items():
+                lines.append(f"{m.name}_bucket{_format_labels(labels, le=bound)} {count}")
+            lines.append(f'{m.name}_bucket{_format_labels(labels, le="+Inf")} {series["count"]}')
+            lines.append(f"{m.name}_sum{_format_labels(labels)} {series['sum']}")
+            lines.append(f"{m.name}_count{_format_labels(labels)} {series['count']}")
+    return "\n".join(lines) + "\n"
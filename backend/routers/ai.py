@@ -1,13 +1,39 @@
-from fastapi import APIRouter, Body, HTTPException, Depends
+import json
+import os
+from typing import Literal
+
+from fastapi import APIRouter, Body, HTTPException, Depends, Header, Query, Response
+from sse_starlette import EventSourceResponse
+import jobs
+from idempotency import store as idempotency
 from database import supabase
+from concurrency import iterate_blocking, run_blocking
+from services import patient_history
+from services.doctor_workload import workload
 from agents.triage import analyze_patient, summarize_qa_history
+from agents.triage.batch import BATCH_MAX_ITEMS, analyze_batch
 from agents.triage.questions import generate_pre_assessment_questions
 from agents.doctor_assistant import get_doctor_suggestion
-from agents.patient_chatbot import chat_with_patient
+from agents.patient_chatbot import chat_with_patient, stream_chat_with_patient
+from agents.core import llm
+from agents.core.scheduler import LLMOverloaded
 from dependencies import get_current_user
 
 router = APIRouter()
 
+# Pre-assessment job configuration from .env:
+#   - PRE_ASSESSMENT_MODE: Default when the request has no ?mode= ("sync" or "job", default: sync)
+#   - PRE_ASSESSMENT_JOB_WORKERS: Jobs running at once (default: 4)
+#   - PRE_ASSESSMENT_JOB_MAX_ATTEMPTS: Attempts per job before it fails (default: 3)
+#   - PRE_ASSESSMENT_JOB_MAX_PENDING: Queued + running jobs before new ones get 503 (default: 200)
+PRE_ASSESSMENT_MODE = os.environ.get("PRE_ASSESSMENT_MODE", "sync")
+pre_assessment_jobs = jobs.JobQueue(
+    "pre_assessment",
+    workers=int(os.environ.get("PRE_ASSESSMENT_JOB_WORKERS", "4")),
+    max_attempts=int(os.environ.get("PRE_ASSESSMENT_JOB_MAX_ATTEMPTS", "3")),
+    max_pending=int(os.environ.get("PRE_ASSESSMENT_JOB_MAX_PENDING", "200")),
+)
+
 
 @router.post(
     "/generate-pre-assessment-questions",
@@ -40,13 +66,27 @@ async def generate_questions(
     Generate follow-up questions for the pre-assessment chat based on the patient's initial complaint.
     Returns a JSON array of 3-5 strings representing the questions.
     """
-    result = generate_pre_assessment_questions(complaint)
+    result = await run_blocking(generate_pre_assessment_questions, complaint)
     return result
 
 
 @router.post(
     "/submit-pre-assessment",
     responses={
+        202: {
+            "description": "Pre-assessment accepted as a background job (mode=job)",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "status": "accepted",
+                        "job_id": "0f5b2c9e-3d4a-4b6c-8e7f-1a2b3c4d5e6f",
+                        "job_status": "queued",
+                        "status_url": "/api/ai/jobs/0f5b2c9e-3d4a-4b6c-8e7f-1a2b3c4d5e6f",
+                        "events_url": "/api/ai/jobs/0f5b2c9e-3d4a-4b6c-8e7f-1a2b3c4d5e6f/events",
+                    }
+                }
+            },
+        },
         200: {
             "description": "Pre-assessment submitted and ticket created",
             "content": {
@@ -70,31 +110,86 @@ async def generate_questions(
 )
 async def submit_pre_assessment(
     qa_history: list = Body(..., examples=[[{"role": "user", "content": "I have a headache"}, {"role": "assistant", "content": "How long?"}]]),
+    mode: Literal["sync", "job"] = Query(None, description="`job` returns 202 with a job id instead of waiting for the AI"),
+    idempotency_key: str = Header(None, description="Retries with the same key return the first response"),
+    response: Response = None,
     user: dict = Depends(get_current_user),
 ):
     """
     Submit a pre-consultation AI assessment.
     This creates a new ticket containing the AI's summary as the FO note,
     and saves the raw Q&A history to the ai_pre_assessments table for the doctor to review.
+
+    With `mode=job` the summary and triage run in the background: the response is
+    202 with a `job_id`; follow it via `/jobs/{job_id}` (polling) or `/jobs/{job_id}/events` (SSE).
+
+    Send an `Idempotency-Key` header to make retries safe: a retry with the same key
+    returns the first response (or job id) instead of creating another ticket.
     """
     patient_id = user.get("sub") # use the authenticated user ID
     
     if not patient_id:
         raise HTTPException(status_code=401, detail="Invalid token payload: missing subject")
+    mode = mode or PRE_ASSESSMENT_MODE
+
+    async def submit():
+        if mode == "job":
+            try:
+                job = pre_assessment_jobs.submit(patient_id, _run_pre_assessment, patient_id, qa_history)
+            except jobs.QueueFull as e:
+                raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+            response.status_code = 202
+            return {
+                "status": "accepted",
+                "job_id": job.id,
+                "job_status": job.status,
+                "status_url": f"/api/ai/jobs/{job.id}",
+                "events_url": f"/api/ai/jobs/{job.id}/events",
+            }
+        return await run_blocking(_submit_pre_assessment, patient_id, qa_history)
+
+    return await idempotency.run(
+        patient_id, idempotency_key, "submit-pre-assessment", {"qa_history": qa_history, "mode": mode}, submit, response
+    )
+
+
+def _submit_pre_assessment(patient_id: str, qa_history: list) -> dict:
+    """Blocking part of submit_pre_assessment, run on the worker pool."""
     try:
-        # 1. Generate AI Summary from QA History
+        return _run_pre_assessment(patient_id, qa_history)
+    except LLMOverloaded:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _run_pre_assessment(patient_id: str, qa_history: list, progress: dict = None) -> dict:
+    """
+    Summary -> triage -> ticket -> assessment.
+    Each finished step is recorded in `progress`, so a retried job resumes where
+    the previous attempt failed instead of creating a second ticket.
+    """
+    progress = {} if progress is None else progress
+
+    # 1. Generate AI Summary from QA History
+    if "ai_summary" not in progress:
         summary_res = summarize_qa_history(qa_history)
         if summary_res.get("status") == "error":
             raise Exception("Failed to generate AI summary: " + summary_res.get("message", "Unknown error"))
-        ai_summary = summary_res.get("summary", "Summary generation failed.")
+        progress["ai_summary"] = summary_res.get("summary", "Summary generation failed.")
+    ai_summary = progress["ai_summary"]
 
-        # 2. Analyze Patient to get doctor suggestion
+    # 2. Analyze Patient to get doctor suggestion
+    if "suggested_doctor_id" not in progress:
         triage_res = analyze_patient(fo_note=ai_summary, patient_id=patient_id)
         suggested_doctor_id = None
         if triage_res.get("status") == "success" and "analysis" in triage_res:
             suggested_doctor_id = triage_res["analysis"].get("recommended_doctor_id")
+        progress["suggested_doctor_id"] = suggested_doctor_id
+    suggested_doctor_id = progress["suggested_doctor_id"]
 
-        # 3. Create the Ticket
+    # 3. Create the Ticket
+    if "ticket_id" not in progress:
         status = "in_progress" if suggested_doctor_id else "pending"
         ticket_payload = {
             "patient_id": patient_id,
@@ -103,33 +198,108 @@ async def submit_pre_assessment(
             "doctor_id": suggested_doctor_id,
             "ai_reasoning": "Auto-generated from pre-consultation assessment",
         }
-        
+
         ticket_res, _ = supabase.table("tickets").insert(ticket_payload).execute()
         if not ticket_res[1]:
             raise Exception("Failed to create ticket")
-            
-        ticket_id = ticket_res[1][0]["id"]
 
-        # 4. Save the Assessment History
-        assessment_payload = {
-            "ticket_id": ticket_id,
-            "patient_id": patient_id,
-            "qa_history": qa_history,
-            "ai_summary": ai_summary,
-        }
-        
-        assessment_res, _ = supabase.table("ai_pre_assessments").insert(assessment_payload).execute()
-        
-        return {
-            "status": "success",
-            "ticket_id": ticket_id,
-            "assessment_id": assessment_res[1][0]["id"] if assessment_res[1] else None,
-            "ai_summary": ai_summary,
-            "suggested_doctor_id": suggested_doctor_id
-        }
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+        progress["ticket_id"] = ticket_res[1][0]["id"]
+        workload.open(progress["ticket_id"], suggested_doctor_id)
+        patient_history.invalidate(patient_id)
+    ticket_id = progress["ticket_id"]
+
+    # 4. Save the Assessment History
+    assessment_payload = {
+        "ticket_id": ticket_id,
+        "patient_id": patient_id,
+        "qa_history": qa_history,
+        "ai_summary": ai_summary,
+    }
+
+    assessment_res, _ = supabase.table("ai_pre_assessments").insert(assessment_payload).execute()
 
+    return {
+        "status": "success",
+        "ticket_id": ticket_id,
+        "assessment_id": assessment_res[1][0]["id"] if assessment_res[1] else None,
+        "ai_summary": ai_summary,
+        "suggested_doctor_id": suggested_doctor_id
+    }
+
+
+@router.get(
+    "/jobs/{job_id}",
+    responses={
+        200: {
+            "description": "Current state of a background job",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "job_id": "0f5b2c9e-3d4a-4b6c-8e7f-1a2b3c4d5e6f",
+                        "status": "succeeded",
+                        "attempts": 1,
+                        "result": {
+                            "status": "success",
+                            "ticket_id": "c3d4e5f6-a7b8-9012-cdef-123456789012",
+                            "assessment_id": "e5f6a7b8-9012-cdef-1234-567890123456",
+                        },
+                        "error": None,
+                        "created_at": 1772301600.0,
+                        "updated_at": 1772301608.5,
+                    }
+                }
+            },
+        },
+        404: {"description": "Job not found (or expired)"},
+    },
+)
+async def get_job(job_id: str, user: dict = Depends(get_current_user)):
+    """
+    Poll a background job started with `/submit-pre-assessment?mode=job`.
+    `status` is one of queued, running, retrying, succeeded, failed; `result` holds the
+    regular endpoint response once the job has succeeded.
+    """
+    job = pre_assessment_jobs.get(job_id, owner=user.get("sub"))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+
+@router.get(
+    "/jobs/{job_id}/events",
+    responses={
+        200: {
+            "description": "Job status changes streamed as Server-Sent Events",
+            "content": {
+                "text/event-stream": {
+                    "example": 'event: status\ndata: {"job_id": "0f5b2c9e-3d4a-4b6c-8e7f-1a2b3c4d5e6f", "status": "running", "attempts": 1}\n\n'
+                    'event: done\ndata: {"job_id": "0f5b2c9e-3d4a-4b6c-8e7f-1a2b3c4d5e6f", "status": "succeeded", "result": {"status": "success"}}\n\n'
+                }
+            },
+        },
+        404: {"description": "Job not found (or expired)"},
+    },
+)
+async def job_events(job_id: str, user: dict = Depends(get_current_user)):
+    """
+    Stream a background job's progress: a `status` event on every change,
+    then one `done` (succeeded) or `error` (failed) event with the final job state.
+    """
+    job = pre_assessment_jobs.get(job_id, owner=user.get("sub"))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events():
+        while True:
+            state = job.to_dict()
+            if job.done:
+                event = "done" if state["status"] == jobs.SUCCEEDED else "error"
+                yield {"event": event, "data": json.dumps(state, ensure_ascii=False, default=str)}
+                return
+            yield {"event": "status", "data": json.dumps(state, ensure_ascii=False, default=str)}
+            await job.wait_for_change(timeout=15)
+
+    return EventSourceResponse(events())
 
 
 @router.post(
@@ -173,6 +343,8 @@ async def submit_pre_assessment(
 async def analyze_ticket(
     fo_note: str = Body(..., examples=["Patient complains of severe headache for 3 days, accompanied by nausea and high fever"]),
     patient_id: str = Body(None, examples=["a1b2c3d4-e5f6-7890-abcd-ef1234567890"]),
+    idempotency_key: str = Header(None, description="Retries with the same key return the first response"),
+    response: Response = None,
     user: dict = Depends(get_current_user),
 ):
     """
@@ -180,8 +352,69 @@ async def analyze_ticket(
     Analyzes patient complaints, checks doctor availability, medical history,
     and provides doctor recommendations + inpatient care needs.
     """
-    result = analyze_patient(fo_note=fo_note, patient_id=patient_id)
-    return result
+    return await idempotency.run(
+        user.get("sub"),
+        idempotency_key,
+        "analyze-ticket",
+        {"fo_note": fo_note, "patient_id": patient_id},
+        lambda: run_blocking(analyze_patient, fo_note=fo_note, patient_id=patient_id),
+        response,
+    )
+
+
+@router.post(
+    "/analyze-tickets/batch",
+    responses={
+        200: {
+            "description": "Triage results streamed as Server-Sent Events, in completion order",
+            "content": {
+                "text/event-stream": {
+                    "example": 'event: result\ndata: {"index": 1, "status": "success", "analysis": {"predicted_specialization": "Neurology", '
+                    '"recommended_doctor_id": "d1e2f3a4-b5c6-7890-abcd-ef1234567890", "recommended_doctor_name": "Dr. Andi Wijaya, Sp.N", '
+                    '"requires_inpatient": false, "severity_level": "medium", "reasoning": "..."}}\n\n'
+                    'event: result\ndata: {"index": 0, "status": "error", "message": "The complaint is not a medical issue."}\n\n'
+                    'event: done\ndata: {"total": 2, "succeeded": 1, "failed": 1}\n\n'
+                }
+            },
+        },
+        400: {"description": "Empty batch, too many items, or an item without fo_note"},
+        401: {
+            "description": "Unauthorized - Missing or invalid token",
+        },
+    },
+)
+async def analyze_tickets_batch(
+    items: list[dict] = Body(..., examples=[[
+        {"fo_note": "Severe headache for 3 days with nausea", "patient_id": "a1b2c3d4-e5f6-7890-abcd-ef1234567890"},
+        {"fo_note": "Child with high fever since last night"},
+    ]]),
+    user: dict = Depends(get_current_user),
+):
+    """
+    Batch AI triage for front-office intake queues.
+    Takes a list of `{fo_note, patient_id?}` items; the doctor list and all patients'
+    histories are loaded once for the batch and the triage decisions run in parallel.
+    Each decision is sent as a `result` event (with the item's `index`) as soon as it
+    completes, followed by one `done` event with the totals.
+    """
+    if not items:
+        raise HTTPException(status_code=400, detail="The batch is empty")
+    if len(items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"A batch can hold at most {BATCH_MAX_ITEMS} items")
+    if any(not isinstance(item.get("fo_note"), str) or not item["fo_note"].strip() for item in items):
+        raise HTTPException(status_code=400, detail="Every item needs a non-empty fo_note")
+    # Reject before the stream starts: once it has, the status code can no longer be 503
+    llm.admit("triage")
+
+    async def events():
+        succeeded = 0
+        async for index, result in analyze_batch(items):
+            succeeded += result["status"] == "success"
+            yield {"event": "result", "data": json.dumps({"index": index, **result}, ensure_ascii=False)}
+        done = {"total": len(items), "succeeded": succeeded, "failed": len(items) - succeeded}
+        yield {"event": "done", "data": json.dumps(done)}
+
+    return EventSourceResponse(events())
 
 
 @router.post(
@@ -227,6 +460,8 @@ async def analyze_ticket(
 async def doctor_assist(
     nik: str = Body(..., examples=["3201012345678901"]),
     doctor_draft: str = Body(None, examples=["Suspected DHF, requires complete blood count and 24-hour observation"]),
+    idempotency_key: str = Header(None, description="Retries with the same key return the first response"),
+    response: Response = None,
     user: dict = Depends(get_current_user),
 ):
     """
@@ -237,8 +472,14 @@ async def doctor_assist(
     - If doctor_draft is provided: AI reviews, enhances, and corrects the draft.
     - If doctor_draft is empty: AI generates a full diagnostic suggestion.
     """
-    result = get_doctor_suggestion(nik=nik, doctor_draft=doctor_draft)
-    return result
+    return await idempotency.run(
+        user.get("sub"),
+        idempotency_key,
+        "doctor-assist",
+        {"nik": nik, "doctor_draft": doctor_draft},
+        lambda: run_blocking(get_doctor_suggestion, nik=nik, doctor_draft=doctor_draft),
+        response,
+    )
 
 
 @router.post(
@@ -293,5 +534,46 @@ async def patient_chat(
     The bot answers based on the doctor's notes and diagnosis.
     If no doctor notes exist, the bot will inform the patient to wait.
     """
-    result = chat_with_patient(ticket_id=ticket_id, message=message)
+    result = await run_blocking(chat_with_patient, ticket_id=ticket_id, message=message)
     return result
+
+
+@router.post(
+    "/patient-chat/stream",
+    responses={
+        200: {
+            "description": "Patient chatbot response streamed as Server-Sent Events",
+            "content": {
+                "text/event-stream": {
+                    "example": 'event: token\ndata: {"delta": "Amoxicillin "}\n\n'
+                    'event: token\ndata: {"delta": "should be taken after meals."}\n\n'
+                    'event: done\ndata: {"status": "success", "reply": "Amoxicillin should be taken after meals.", '
+                    '"has_context": true, "ticket_id": "b2c3d4e5-f6a7-8901-bcde-f12345678901"}\n\n'
+                }
+            },
+        },
+        401: {
+            "description": "Unauthorized - Missing or invalid token",
+        },
+    },
+)
+async def patient_chat_stream(
+    ticket_id: str = Body(..., examples=["b2c3d4e5-f6a7-8901-bcde-f12345678901"]),
+    message: str = Body(..., examples=["Doctor, should I take the medicine before or after meals?"]),
+    user: dict = Depends(get_current_user),
+):
+    """
+    Streaming Patient Chatbot.
+    Same as /patient-chat, but tokens are sent as `token` events while the reply is generated,
+    followed by one `done` event with the full response (or an `error` event).
+    The chat messages are saved once the stream finishes.
+    """
+    # Reject before the stream starts: once it has, the status code can no longer be 503
+    llm.admit("chat")
+
+    async def events():
+        async for event, payload in iterate_blocking(stream_chat_with_patient(ticket_id, message)):
+            data = {"delta": payload} if event == "token" else payload
+            yield {"event": event, "data": json.dumps(data, ensure_ascii=False)}
+
+    return EventSourceResponse(events())
@@ -1,5 +1,9 @@
 from fastapi import APIRouter, HTTPException, Body
 from database import supabase
+from concurrency import run_blocking
+from services.allocation import NoRoomAvailable, claim_room, nurse_teams, release_room
+from services import patient_history, ticket_context
+from services.doctor_workload import workload
 
 router = APIRouter()
 
@@ -53,43 +57,36 @@ async def create_ticket(
     """
     FO creates a new ticket for the patient with auto-assigned Doctor and Nurse (If Inpatient).
     """
+    return await run_blocking(
+        _create_ticket, patient_id, fo_note, doctor_id, requires_inpatient, severity_level, ai_reasoning
+    )
+
+
+def _create_ticket(
+    patient_id: str,
+    fo_note: str,
+    doctor_id: str,
+    requires_inpatient: bool,
+    severity_level: str,
+    ai_reasoning: str,
+) -> dict:
     try:
         nurse_team_id = None
         room_id = None
 
         if requires_inpatient:
-            # 1. Assign Room
-            rooms_res = supabase.table("rooms").select("id").eq("status", "available").limit(1).execute()
-            if not rooms_res.data:
-                raise HTTPException(status_code=400, detail="No available rooms for inpatient admission")
-            
-            room_id = rooms_res.data[0]["id"]
-            # Mark room as occupied
-            supabase.table("rooms").update({"status": "occupied"}).eq("id", room_id).execute()
-
-            # 2. round-robin nurse team
-            nurses_res = supabase.table("profiles").select("team_id").eq("role", "nurse").not_.is_("team_id", "null").execute()
-            active_teams = (
-                set([n["team_id"] for n in nurses_res.data])
-                if nurses_res.data
-                else {1, 2, 3}
-            )
-
-            tickets_res = (
-                supabase.table("tickets")
-                .select("nurse_team_id")
-                .in_("status", ["in_progress"])
-                .execute()
-            )
+            # 1. Claim a room (atomic, safe under concurrent admissions)
+            try:
+                room_id = claim_room()
+            except NoRoomAvailable as e:
+                raise HTTPException(status_code=400, detail=str(e))
 
-            team_loads = {t: 0 for t in active_teams}
-            if tickets_res.data:
-                for tkt in tickets_res.data:
-                    tid = tkt.get("nurse_team_id")
-                    if tid in team_loads:
-                        team_loads[tid] += 1
-
-            nurse_team_id = min(team_loads, key=team_loads.get)
+            # 2. Least-loaded nurse team (incremental in-memory counters)
+            try:
+                nurse_team_id = nurse_teams.admit()
+            except Exception:
+                release_room(room_id)
+                raise
 
         # Create Ticket
         status = "in_progress" if doctor_id else "pending"
@@ -107,10 +104,22 @@ async def create_ticket(
         if room_id:
             payload["room_id"] = room_id
 
-        data, count = supabase.table("tickets").insert(payload).execute()
+        try:
+            data, count = supabase.table("tickets").insert(payload).execute()
+        except Exception:
+            # Give the room and team slot back if the admission could not be recorded
+            if room_id:
+                release_room(room_id)
+            nurse_teams.discharge(nurse_team_id)
+            raise
+
+        ticket = data[1][0] if data[1] else None
+        if ticket:
+            workload.open(ticket["id"], ticket.get("doctor_id"))
+        patient_history.invalidate(patient_id)
         return {
             "status": "success",
-            "ticket": data[1][0] if data[1] else None,
+            "ticket": ticket,
             "assigned_nurse_team": nurse_team_id,
         }
     except Exception as e:
@@ -146,13 +155,17 @@ async def create_ticket(
     },
 )
 async def assign_doctor(
-    ticket_id: int, 
+    ticket_id: str,
     doctor_id: str = Body(..., examples=["d1e2f3a4-b5c6-7890-abcd-ef1234567890"]),
     user: dict = Depends(get_current_user),
 ):
     """
     Place the patient in the doctor's queue (changes ticket status to in_progress)
     """
+    return await run_blocking(_assign_doctor, ticket_id, doctor_id)
+
+
+def _assign_doctor(ticket_id: str, doctor_id: str) -> dict:
     try:
         data, count = (
             supabase.table("tickets")
@@ -160,7 +173,12 @@ async def assign_doctor(
             .eq("id", ticket_id)
             .execute()
         )
-        return {"status": "success", "ticket": data[1][0] if data[1] else None}
+        ticket = data[1][0] if data[1] else None
+        if ticket:
+            workload.open(ticket_id, doctor_id)
+            patient_history.invalidate(ticket.get("patient_id"))
+        ticket_context.invalidate(ticket_id)
+        return {"status": "success", "ticket": ticket}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -210,74 +228,41 @@ async def complete_checkup(
     - Auto-generates an invoice
     - Status is always set to completed
     """
-    new_status = "completed"
+    return await run_blocking(_complete_checkup, ticket_id, doctor_note, prescriptions, doctor_fee)
 
-    try:
-        # 0. Check if there was a room assigned, to release it
-        ticket_res = supabase.table("tickets").select("room_id").eq("id", ticket_id).execute()
-        room_id_to_release = None
-        if ticket_res.data and ticket_res.data[0].get("room_id"):
-            room_id_to_release = ticket_res.data[0]["room_id"]
 
-        # 1. Update ticket & release associations
-        data, count = (
-            supabase.table("tickets")
-            .update({
-                "doctor_note": doctor_note, 
-                "status": new_status,
-                "room_id": None,
-                "nurse_team_id": None
-            })
-            .eq("id", ticket_id)
-            .execute()
-        )
-        ticket = data[1][0] if data[1] else None
-
-        # Release the room itself
-        if room_id_to_release:
-            supabase.table("rooms").update({"status": "available"}).eq("id", room_id_to_release).execute()
-
-
-        # 2. Create prescriptions if any
-        medicine_fee = 0.0
-        prescriptions_created = 0
-
-        if prescriptions:
-            for rx in prescriptions:
-                med_id = rx.get("medicine_id")
-                qty = rx.get("quantity", 1)
-                notes = rx.get("notes", "")
-
-                # Get medicine price from catalog
-                med_res = supabase.table("catalog_medicines").select("price").eq("id", med_id).execute()
-                price = float(med_res.data[0]["price"]) if med_res.data else 0
-                medicine_fee += price * qty
-
-                supabase.table("prescriptions").insert({
-                    "ticket_id": ticket_id,
-                    "medicine_id": med_id,
-                    "quantity": qty,
-                    "notes": notes,
-                    "status": "pending",
-                }).execute()
-                prescriptions_created += 1
-
-        # 3. Auto-generate invoice
-        invoice_payload = {
-            "ticket_id": ticket_id,
-            "doctor_fee": doctor_fee,
-            "medicine_fee": medicine_fee,
-            "room_fee": 0,  # room fee set separately if inpatient
-            "status": "unpaid",
-        }
-        inv_res, _ = supabase.table("invoices").insert(invoice_payload).execute()
-        invoice_id = inv_res[1][0]["id"] if inv_res[1] else None
+def _complete_checkup(ticket_id: str, doctor_note: str, prescriptions: list, doctor_fee: float) -> dict:
+    try:
+        # Ticket update, room release, prescriptions, pricing and invoice run in one
+        # transaction inside Postgres (see the complete_checkup migration): one round trip
+        # regardless of how many medicines are prescribed.
+        res = supabase.rpc(
+            "complete_checkup",
+            {
+                "p_ticket_id": ticket_id,
+                "p_doctor_note": doctor_note,
+                "p_prescriptions": [
+                    {
+                        "medicine_id": rx.get("medicine_id"),
+                        "quantity": rx.get("quantity", 1),
+                        "notes": rx.get("notes", ""),
+                    }
+                    for rx in prescriptions or []
+                ],
+                "p_doctor_fee": doctor_fee,
+            },
+        ).execute()
+        result = res.data or {}
+        nurse_teams.discharge(result.get("released_nurse_team_id"))
+        workload.close(ticket_id)
+        patient_history.invalidate((result.get("ticket") or {}).get("patient_id"))
+        ticket_context.invalidate(ticket_id)
 
         return {
             "status": "success",
-            "ticket": ticket,
-            "prescriptions_count": prescriptions_created,
-            "invoice_id": invoice_id,
+            "ticket": result.get("ticket"),
+            "prescriptions_count": result.get("prescriptions_count", 0),
+            "invoice_id": result.get("invoice_id"),
         }
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -0,0 +1,135 @@
+"""
+Room and nurse-team allocation for inpatient admissions.
+
+- Rooms are claimed atomically in Postgres (`claim_available_room`, which uses
+  FOR UPDATE SKIP LOCKED), so two concurrent admissions never get the same room.
+- Nurse-team load is kept as in-memory counters, seeded once from the database
+  and then updated incrementally on admit and discharge instead of rescanning
+  tickets. Counters are re-seeded every ALLOCATOR_RESYNC_SECONDS (default: 300)
+  to pick up changes made by other workers.
+"""
+
+import os
+import threading
+import time
+
+import metrics
+from database import supabase
+
+RESYNC_SECONDS = float(os.environ.get("ALLOCATOR_RESYNC_SECONDS", "300"))
+DEFAULT_TEAMS = {1, 2, 3}
+PAGE_SIZE = 1000  # PostgREST's default max-rows
+
+_allocation_seconds = metrics.histogram("allocation_latency_seconds", "Time to allocate a resource, by resource")
+_room_claims = metrics.counter("room_claims_total", "Room claim attempts by outcome")
+_lock_wait_seconds = metrics.histogram(
+    "allocation_lock_wait_seconds", "Time spent waiting for the nurse-team allocator lock"
+)
+_lock_contended = metrics.counter("allocation_lock_contended_total", "Allocator lock acquisitions that had to wait")
+_team_load = metrics.gauge("nurse_team_load", "Open inpatient tickets per nurse team")
+
+
+class NoRoomAvailable(Exception):
+    pass
+
+
+def claim_room() -> int:
+    """Atomically mark one available room as occupied and return its id."""
+    with _allocation_seconds.time(resource="room"):
+        res = supabase.rpc("claim_available_room", {}).execute()
+    room_id = res.data
+    if not room_id:
+        _room_claims.inc(outcome="none_available")
+        raise NoRoomAvailable("No available rooms for inpatient admission")
+    _room_claims.inc(outcome="claimed")
+    return room_id
+
+
+def release_room(room_id: int):
+    """Give a claimed room back (e.g. when the admission could not be completed)."""
+    supabase.table("rooms").update({"status": "available"}).eq("id", room_id).execute()
+    _room_claims.inc(outcome="released")
+
+
+class NurseTeamAllocator:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loads: dict = {}
+        self._synced_at = 0.0
+
+    def _acquire(self):
+        if self._lock.acquire(blocking=False):
+            return
+        _lock_contended.inc()
+        started = time.perf_counter()
+        self._lock.acquire()
+        _lock_wait_seconds.observe(time.perf_counter() - started)
+
+    def _sync(self):
+        """Seed the counters from the database (caller holds the lock)."""
+        nurses_res = (
+            supabase.table("profiles")
+            .select("team_id")
+            .eq("role", "nurse")
+            .not_.is_("team_id", "null")
+            .execute()
+        )
+        teams = {n["team_id"] for n in nurses_res.data} if nurses_res.data else set(DEFAULT_TEAMS)
+
+        loads = {t: 0 for t in teams}
+        offset = 0
+        while True:
+            # Paged: PostgREST silently caps a response at its max-rows setting
+            rows = (
+                supabase.table("tickets")
+                .select("id, nurse_team_id")
+                .not_.is_("nurse_team_id", "null")
+                .neq("status", "completed")
+                .order("id")
+                .range(offset, offset + PAGE_SIZE - 1)
+                .execute()
+            ).data or []
+            for tkt in rows:
+                if tkt["nurse_team_id"] in loads:
+                    loads[tkt["nurse_team_id"]] += 1
+            if len(rows) < PAGE_SIZE:
+                break
+            offset += PAGE_SIZE
+
+        self._loads = loads
+        self._synced_at = time.monotonic()
+        for team_id, load in loads.items():
+            _team_load.set(load, team=team_id)
+
+    def admit(self) -> int:
+        """Pick the least-loaded nurse team and count the new admission against it."""
+        started = time.perf_counter()
+        self._acquire()
+        try:
+            if not self._loads or time.monotonic() - self._synced_at > RESYNC_SECONDS:
+                self._sync()
+            team_id = min(self._loads, key=self._loads.get)
+            self._loads[team_id] += 1
+            _team_load.set(self._loads[team_id], team=team_id)
+        finally:
+            self._lock.release()
+        _allocation_seconds.observe(time.perf_counter() - started, resource="nurse_team")
+        return team_id
+
+    def discharge(self, team_id: int):
+        """Release one admission from a nurse team."""
+        if team_id is None:
+            return
+        self._acquire()
+        try:
+            if team_id in self._loads and self._loads[team_id] > 0:
+                self._loads[team_id] -= 1
+                _team_load.set(self._loads[team_id], team=team_id)
+        finally:
+            self._lock.release()
+
+    def loads(self) -> dict:
+        return dict(self._loads)
+
+
+nurse_teams = NurseTeamAllocator()
@@ -0,0 +1,66 @@
+"""
+Chat message persistence for the patient chatbot.
+Messages are written through a write-behind queue, so replies do not wait
+for the insert: rows get their id and created_at when they are produced and
+are flushed to `chat_messages` in batches. Reads merge in messages that are
+still queued, so the next turn always sees the previous one.
+
+Configuration from .env:
+  - CHAT_WRITE_BATCH_SIZE: Max messages per insert (default: 100)
+  - CHAT_WRITE_FLUSH_INTERVAL: Max seconds a message waits before it is written (default: 0.5)
+  - CHAT_WRITE_MAX_PENDING: Queued messages before new ones are dropped (default: 10000)
+"""
+
+import os
+import uuid
+from datetime import datetime, timezone
+
+from database import supabase
+from write_behind import WriteBehindQueue
+
+writer = WriteBehindQueue(
+    "chat_messages",
+    table="chat_messages",
+    batch_size=int(os.environ.get("CHAT_WRITE_BATCH_SIZE", "100")),
+    flush_interval=float(os.environ.get("CHAT_WRITE_FLUSH_INTERVAL", "0.5")),
+    max_pending=int(os.environ.get("CHAT_WRITE_MAX_PENDING", "10000")),
+)
+
+
+def message(ticket_id: str, patient_id: str, sender: str, text: str) -> dict:
+    """A chat_messages row stamped with its own id and creation time."""
+    return {
+        "id": str(uuid.uuid4()),
+        "ticket_id": ticket_id,
+        "patient_id": patient_id,
+        "sender": sender,
+        "message": text,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def save(rows: list) -> bool:
+    """Queue rows for writing; False when they had to be dropped (see write_behind metrics)."""
+    return writer.put(rows)
+
+
+def recent(ticket_id: str, limit: int) -> list:
+    """The ticket's most recent `limit` messages, oldest first, including ones not yet written."""
+    res = (
+        supabase.table("chat_messages")
+        .select("id, sender, message, created_at")
+        .eq("ticket_id", ticket_id)
+        .order("created_at", desc=True)
+        # Turns saved before write-behind inserted both messages with the same created_at
+        .order("sender")
+        .limit(limit)
+        .execute()
+    )
+    messages = {m["id"]: m for m in reversed(res.data or [])}
+    for row in writer.pending(ticket_id=ticket_id):
+        messages.setdefault(row["id"], row)
+    return sorted(messages.values(), key=lambda m: _timestamp(m["created_at"]))[-limit:]
+
+
+def _timestamp(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
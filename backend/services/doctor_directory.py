@@ -0,0 +1,95 @@
+"""
+In-process directory of specialist doctors, indexed by specialization.
+
+The full doctor list is loaded once and kept in memory. Every
+DOCTOR_DIRECTORY_CHECK_SECONDS (default: 30) a tiny fingerprint query
+(doctor count + latest profiles.updated_at) detects profile changes and
+triggers a reload; a full reload also happens at least every
+DOCTOR_DIRECTORY_REFRESH_SECONDS (default: 600).
+"""
+
+import os
+
+from cache import RefreshingSnapshot
+from database import supabase
+
+
+def normalize_specialization(name: str) -> str:
+    return " ".join((name or "").lower().split())
+
+
+class DoctorDirectory(RefreshingSnapshot):
+    def __init__(self):
+        super().__init__(
+            "doctor_directory",
+            refresh_seconds=float(os.environ.get("DOCTOR_DIRECTORY_REFRESH_SECONDS", "600")),
+            check_seconds=float(os.environ.get("DOCTOR_DIRECTORY_CHECK_SECONDS", "30")),
+        )
+        self._doctors: list = []
+        self._by_id: dict = {}
+        self._by_specialization: dict = {}
+
+    def _fingerprint(self) -> tuple:
+        res = (
+            supabase.table("profiles")
+            .select("updated_at", count="exact")
+            .eq("role", "doctor_specialist")
+            .not_.is_("specialization", "null")
+            .order("updated_at", desc=True)
+            .limit(1)
+            .execute()
+        )
+        latest = res.data[0]["updated_at"] if res.data else None
+        return res.count, latest
+
+    def _load(self):
+        res = (
+            supabase.table("profiles")
+            .select("id, name, specialization")
+            .eq("role", "doctor_specialist")
+            .not_.is_("specialization", "null")
+            .execute()
+        )
+        doctors = []
+        by_specialization = {}
+        for doc in res.data or []:
+            doctor = {
+                "id": doc["id"],
+                "name": doc.get("name", "Unknown"),
+                "specialization": doc.get("specialization", "General"),
+            }
+            doctors.append(doctor)
+            by_specialization.setdefault(normalize_specialization(doctor["specialization"]), []).append(doctor)
+
+        self._doctors = doctors
+        self._by_id = {d["id"]: d for d in doctors}
+        self._by_specialization = by_specialization
+
+    def all(self) -> list:
+        self.ensure_fresh()
+        return list(self._doctors)
+
+    def get(self, doctor_id: str) -> dict | None:
+        self.ensure_fresh()
+        return self._by_id.get(doctor_id)
+
+    def specializations(self) -> list:
+        self.ensure_fresh()
+        return sorted({d["specialization"] for d in self._doctors})
+
+    def by_specializations(self, specializations: list) -> list:
+        """
+        Doctors whose specialization matches any of the given names.
+        Matching is case-insensitive and also accepts partial names
+        (e.g. "cardio" matches "Cardiology").
+        """
+        self.ensure_fresh()
+        wanted = [normalize_specialization(s) for s in specializations if s and s.strip()]
+        doctors = []
+        for key, group in self._by_specialization.items():
+            if any(w == key or w in key or key in w for w in wanted):
+                doctors.extend(group)
+        return doctors
+
+
+directory = DoctorDirectory()
@@ -0,0 +1,161 @@
+"""
+Live doctor workload: open (not completed) tickets per doctor.
+
+Like the nurse-team allocator, the counts are seeded once from the database
+and then maintained incrementally by the ticket writers instead of scanning
+`tickets` per request:
+  - `open(ticket_id, doctor_id)` on ticket creation and doctor (re)assignment;
+    a ticket moved to another doctor is taken off the previous doctor's count
+  - `close(ticket_id)` when the checkup is completed
+Counts are re-seeded every DOCTOR_WORKLOAD_RESYNC_SECONDS (default: 300) to
+pick up changes made by other workers. The resync reads the database outside
+the counts lock, so ticket writers never wait for it. `rank(doctors)` orders candidates by
+their current load, so triage can spread patients across equally suitable
+doctors.
+"""
+
+import os
+import threading
+import time
+
+import metrics
+from database import supabase
+
+RESYNC_SECONDS = float(os.environ.get("DOCTOR_WORKLOAD_RESYNC_SECONDS", "300"))
+PAGE_SIZE = 1000  # PostgREST's default max-rows
+
+_changes = metrics.counter("doctor_workload_changes_total", "Doctor workload updates, by operation")
+
+
+class DoctorWorkload:
+    def __init__(self, resync_seconds: float = RESYNC_SECONDS):
+        self.resync_seconds = resync_seconds
+        self._lock = threading.Lock()  # guards the counts; never held across a DB call
+        self._sync_lock = threading.Lock()  # one resync at a time
+        self._loads: dict = {}  # doctor id -> open tickets
+        self._tickets: dict = {}  # open ticket id -> doctor id
+        self._journal: list | None = None  # (ticket id, doctor id or None) changes made during a resync
+        self._synced_at = 0.0
+
+    def _fetch(self) -> dict:
+        """Open tickets with a doctor, {ticket id: doctor id}, read page by page."""
+        tickets = {}
+        offset = 0
+        while True:
+            # Paged: PostgREST silently caps a response at its max-rows setting
+            rows = (
+                supabase.table("tickets")
+                .select("id, doctor_id")
+                .not_.is_("doctor_id", "null")
+                .neq("status", "completed")
+                .order("id")
+                .range(offset, offset + PAGE_SIZE - 1)
+                .execute()
+            ).data or []
+            tickets.update((t["id"], t["doctor_id"]) for t in rows)
+            if len(rows) < PAGE_SIZE:
+                return tickets
+            offset += PAGE_SIZE
+
+    def _sync(self):
+        """
+        Re-seed the counts from the database (caller holds the sync lock). The pages are read
+        without holding the counts lock, so open/close never wait on the database; changes made
+        meanwhile are journaled and replayed onto the fresh counts, so none are lost.
+        """
+        with self._lock:
+            self._journal = []
+        try:
+            tickets = self._fetch()
+        except Exception:
+            with self._lock:
+                self._journal = None
+            raise
+        loads = {}
+        for doctor_id in tickets.values():
+            loads[doctor_id] = loads.get(doctor_id, 0) + 1
+        with self._lock:
+            journal, self._journal = self._journal, None
+            self._tickets, self._loads = tickets, loads
+            # Replaying is idempotent, so changes the snapshot already includes are harmless
+            for ticket_id, doctor_id in journal:
+                self._apply(ticket_id, doctor_id)
+            self._synced_at = time.monotonic()
+        _changes.inc(operation="sync")
+
+    def _ensure_synced(self):
+        if self._synced_at and time.monotonic() - self._synced_at <= self.resync_seconds:
+            return
+        # The first sync is waited for; a later resync is run by one caller while the others
+        # keep using the current counts
+        if not self._sync_lock.acquire(blocking=not self._synced_at):
+            return
+        try:
+            if not self._synced_at or time.monotonic() - self._synced_at > self.resync_seconds:
+                self._sync()
+        finally:
+            self._sync_lock.release()
+
+    def _apply(self, ticket_id: str, doctor_id: str | None):
+        """Move a ticket to `doctor_id`, or take it off the counts with None (caller holds the lock)."""
+        previous = self._tickets.pop(ticket_id, None)
+        if previous is not None and self._loads.get(previous, 0) > 0:
+            self._loads[previous] -= 1
+        if doctor_id is not None:
+            self._tickets[ticket_id] = doctor_id
+            self._loads[doctor_id] = self._loads.get(doctor_id, 0) + 1
+
+    def _change(self, ticket_id: str, doctor_id: str | None):
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append((ticket_id, doctor_id))
+            # Before the first sync there is nothing to update: the sync reads the ticket itself
+            if self._synced_at:
+                self._apply(ticket_id, doctor_id)
+
+    def open(self, ticket_id: str, doctor_id: str):
+        """Count an open ticket against `doctor_id` (moving it off its previous doctor, if any)."""
+        if not ticket_id or not doctor_id:
+            return
+        self._change(ticket_id, doctor_id)
+        _changes.inc(operation="open")
+
+    def close(self, ticket_id: str):
+        """Take a completed ticket off its doctor's count."""
+        if not ticket_id:
+            return
+        self._change(ticket_id, None)
+        _changes.inc(operation="close")
+
+    def counts(self) -> list:
+        """Current per-doctor counts, without triggering a sync (for metrics)."""
+        with self._lock:
+            return list(self._loads.values())
+
+    def loads(self) -> dict:
+        """Open tickets per doctor id (doctors without open tickets are omitted)."""
+        self._ensure_synced()
+        with self._lock:
+            return {doctor_id: load for doctor_id, load in self._loads.items() if load}
+
+    def rank(self, doctors: list) -> list:
+        """
+        Copies of `doctors` with their `open_tickets`, least loaded first
+        (ties keep their original order).
+        """
+        loads = self.loads()
+        ranked = [{**doc, "open_tickets": loads.get(doc["id"], 0)} for doc in doctors]
+        ranked.sort(key=lambda doc: doc["open_tickets"])
+        return ranked
+
+
+workload = DoctorWorkload()
+
+metrics.gauge(
+    "doctor_workload_open_tickets", "Open tickets assigned to doctors", fn=lambda: sum(workload.counts())
+)
+metrics.gauge(
+    "doctor_workload_max_open_tickets",
+    "Open tickets of the busiest doctor",
+    fn=lambda: max(workload.counts(), default=0),
+)
@@ -0,0 +1,136 @@
+"""
+Shared patient-history service.
+Fetches a patient's most recent tickets together with the treating doctor's
+profile in a single joined query, and keeps the result in a per-patient
+TTL/LRU cache. Writers (ticket creation, doctor assignment, checkup
+completion) call `invalidate(patient_id)` so the cache never serves stale
+history after a change made through this backend.
+
+Configuration from .env:
+  - PATIENT_HISTORY_CACHE_SIZE: Max patients kept in memory (default: 2048)
+  - PATIENT_HISTORY_CACHE_TTL: Seconds before an entry is re-fetched (default: 300)
+"""
+
+import os
+
+from cache import TTLCache
+from database import supabase
+
+HISTORY_LIMIT = 10
+PAGE_SIZE = 1000  # PostgREST's default max-rows
+
+_cache = TTLCache(
+    "patient_history",
+    maxsize=int(os.environ.get("PATIENT_HISTORY_CACHE_SIZE", "2048")),
+    ttl=float(os.environ.get("PATIENT_HISTORY_CACHE_TTL", "300")),
+)
+
+
+_COLUMNS = (
+    "id, patient_id, fo_note, doctor_note, status, severity_level, ai_reasoning, created_at, doctor_id, "
+    "doctor:profiles!doctor_id(name, specialization)"
+)
+
+
+def _record(ticket: dict) -> dict:
+    doctor = ticket.get("doctor") or {}
+    return {
+        "ticket_id": ticket["id"],
+        "complaint": ticket.get("fo_note", ""),
+        "doctor_diagnosis": ticket.get("doctor_note", ""),
+        "doctor_id": ticket.get("doctor_id"),
+        "doctor_name": doctor.get("name") or "N/A",
+        "specialization": doctor.get("specialization") or "N/A",
+        "status": ticket["status"],
+        "severity": ticket.get("severity_level", ""),
+        "ai_reasoning": ticket.get("ai_reasoning", ""),
+        "date": ticket.get("created_at", ""),
+    }
+
+
+def _fetch(patient_id: str) -> list:
+    res = (
+        supabase.table("tickets")
+        .select(_COLUMNS)
+        .eq("patient_id", patient_id)
+        .order("created_at", desc=True)
+        .limit(HISTORY_LIMIT)
+        .execute()
+    )
+    return [_record(ticket) for ticket in res.data or []]
+
+
+def _fetch_many(patient_ids: list) -> dict:
+    """
+    One paged query for several patients; each keeps its HISTORY_LIMIT most recent tickets.
+    Paging stops as soon as every patient's history is full.
+    """
+    histories = {patient_id: [] for patient_id in patient_ids}
+    offset = 0
+    while True:
+        # Paged: PostgREST silently caps a response at its max-rows setting
+        rows = (
+            supabase.table("tickets")
+            .select(_COLUMNS)
+            .in_("patient_id", patient_ids)
+            .order("created_at", desc=True)
+            .order("id")
+            .range(offset, offset + PAGE_SIZE - 1)
+            .execute()
+        ).data or []
+        for ticket in rows:
+            history = histories[ticket["patient_id"]]
+            if len(history) < HISTORY_LIMIT:
+                history.append(_record(ticket))
+        full = all(len(history) >= HISTORY_LIMIT for history in histories.values())
+        if full or len(rows) < PAGE_SIZE:
+            return histories
+        offset += PAGE_SIZE
+
+
+def get_patient_history(patient_id: str, limit: int = HISTORY_LIMIT, exclude_ticket_id: str = None) -> list:
+    """
+    Return the patient's most recent tickets (newest first), read through the cache.
+    The returned records are shared with the cache and must not be modified.
+
+    Args:
+        patient_id: UUID of the patient.
+        limit: Max number of tickets to return (at most HISTORY_LIMIT).
+        exclude_ticket_id: Leave this ticket out (e.g. the visit currently being discussed).
+    """
+    history = _cache.get(patient_id)
+    if history is None:
+        history = _fetch(patient_id)
+        _cache.set(patient_id, history)
+
+    if exclude_ticket_id:
+        history = [h for h in history if h["ticket_id"] != exclude_ticket_id]
+    return history[:limit]
+
+
+def get_many(patient_ids: list, limit: int = HISTORY_LIMIT) -> dict:
+    """
+    Histories of several patients ({patient_id: history}, newest first), read through
+    the cache. Patients missing from the cache are loaded together in one query.
+    """
+    histories = {}
+    missing = []
+    for patient_id in dict.fromkeys(filter(None, patient_ids)):
+        history = _cache.get(patient_id)
+        if history is None:
+            missing.append(patient_id)
+        else:
+            histories[patient_id] = history
+
+    if missing:
+        for patient_id, history in _fetch_many(missing).items():
+            _cache.set(patient_id, history)
+            histories[patient_id] = history
+
+    return {patient_id: history[:limit] for patient_id, history in histories.items()}
+
+
+def invalidate(patient_id: str):
+    """Drop the cached history of a patient after one of their tickets changed."""
+    if patient_id:
+        _cache.pop(patient_id)
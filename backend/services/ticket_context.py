@@ -0,0 +1,80 @@
+"""
+Shared ticket-context service for the patient chatbot.
+Fetches a ticket together with its prescriptions (and each prescription's
+medicine name) in a single joined query and keeps the result in a per-ticket
+TTL/LRU cache, so follow-up chat turns make no context queries. Writers of a
+ticket or its prescriptions (doctor assignment, checkup completion) call
+`invalidate(ticket_id)`. The doctor's name and specialization are not cached
+here: they are resolved from the in-memory doctor directory on every read, so
+profile changes show up as soon as the directory refreshes.
+
+Configuration from .env:
+  - TICKET_CONTEXT_CACHE_SIZE: Max tickets kept in memory (default: 2048)
+  - TICKET_CONTEXT_CACHE_TTL: Seconds before an entry is re-fetched, a safety net
+    for writes made outside this backend (default: 600)
+"""
+
+import os
+
+from cache import TTLCache
+from database import supabase
+from services.doctor_directory import directory
+
+_cache = TTLCache(
+    "ticket_context",
+    maxsize=int(os.environ.get("TICKET_CONTEXT_CACHE_SIZE", "2048")),
+    ttl=float(os.environ.get("TICKET_CONTEXT_CACHE_TTL", "600")),
+)
+
+
+def _fetch(ticket_id: str) -> dict | None:
+    res = (
+        supabase.table("tickets")
+        .select(
+            "id, patient_id, fo_note, doctor_note, status, severity_level, created_at, doctor_id, "
+            "prescriptions(quantity, notes, medicine:catalog_medicines(name))"
+        )
+        .eq("id", ticket_id)
+        .limit(1)
+        .execute()
+    )
+    if not res.data:
+        return None
+    ticket = res.data[0]
+    return {
+        "ticket_id": ticket["id"],
+        "patient_id": ticket["patient_id"],
+        "complaint": ticket.get("fo_note", ""),
+        "doctor_diagnosis": ticket.get("doctor_note", ""),
+        "doctor_id": ticket.get("doctor_id"),
+        "status": ticket["status"],
+        "severity": ticket.get("severity_level", ""),
+        "date": ticket.get("created_at", ""),
+        "prescriptions": ticket.get("prescriptions") or [],
+    }
+
+
+def get_ticket_context(ticket_id: str) -> dict | None:
+    """
+    Return the ticket with its prescriptions and doctor, read through the cache,
+    or None when the ticket does not exist.
+    """
+    context = _cache.get(ticket_id)
+    if context is None:
+        context = _fetch(ticket_id)
+        if context is None:
+            return None
+        _cache.set(ticket_id, context)
+
+    doctor = directory.get(context["doctor_id"]) if context["doctor_id"] else None
+    return {
+        **context,
+        "doctor_name": doctor["name"] if doctor else "N/A",
+        "specialization": doctor["specialization"] if doctor else "N/A",
+    }
+
+
+def invalidate(ticket_id: str):
+    """Drop the cached context of a ticket after it or its prescriptions changed."""
+    if ticket_id:
+        _cache.pop(ticket_id)
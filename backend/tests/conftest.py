@@ -0,0 +1,5 @@
+import os
+
+# Importing the app modules creates the Supabase client, which needs these to be set (no request is made)
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "test-key")
@@ -0,0 +1,49 @@
+import threading
+
+from services.doctor_workload import DoctorWorkload
+
+
+def _workload(snapshots: list) -> DoctorWorkload:
+    """A workload whose database reads return `snapshots` in turn."""
+    workload = DoctorWorkload(resync_seconds=0)
+    workload._fetch = lambda: dict(snapshots.pop(0))
+    return workload
+
+
+def test_open_moves_tickets_between_doctors_and_close_releases_them():
+    workload = _workload([{"t1": "a", "t2": "a"}])
+    assert workload.loads() == {"a": 2}
+    workload.open("t1", "b")
+    workload.open("t3", "b")
+    workload.close("t2")
+    assert workload._loads == {"a": 0, "b": 2}
+
+
+def test_changes_during_a_resync_do_not_wait_for_it_and_are_not_lost():
+    fetching, release = threading.Event(), threading.Event()
+    workload = DoctorWorkload(resync_seconds=0)
+    snapshots = [{"t1": "a"}, {"t1": "a", "t2": "a"}]  # the resync's read predates t3 and t1's checkout
+
+    def slow_fetch():
+        snapshot = snapshots.pop(0)
+        if not snapshots:
+            fetching.set()
+            release.wait(5)
+        return dict(snapshot)
+
+    workload._fetch = slow_fetch
+    workload.loads()
+    resync = threading.Thread(target=workload.loads)
+    resync.start()
+    assert fetching.wait(5)
+
+    # The resync is blocked inside the database read: writers must not wait for it
+    writer = threading.Thread(target=lambda: (workload.open("t3", "b"), workload.close("t1")))
+    writer.start()
+    writer.join(1)
+    assert not writer.is_alive()
+
+    release.set()
+    resync.join(5)
+    assert workload._tickets == {"t2": "a", "t3": "b"}
+    assert {doctor: n for doctor, n in workload._loads.items() if n} == {"a": 1, "b": 1}
@@ -0,0 +1,73 @@
+import pytest
+
+from agents.triage import prefilter
+
+# Real complaints, some of them single words the vocabulary may not know: the LLM must see them
+REAL_COMPLAINTS = [
+    "toothache",
+    "sinusitis",
+    "gout",
+    "acne",
+    "hemorrhoids",
+    "hiccups",
+    "pendarahan",
+    "mimisan",
+    "sariawan",
+    "wasir",
+    "cacar",
+    "campak",
+    "biduran",
+    "jerawat",
+    "eksim",
+    "kram",
+    "anyang-anyangan",
+    "ptsd",
+    "bppv",
+    "rhythm",
+    "irregular heart rhythm",
+    "rhythms",
+    "vertigo",
+    "sakit kepala sejak kemarin",
+    "Chest pain radiating to the left arm",
+    "kesemutan",
+    "insomnia",
+    "xerostomia",
+    "鼻血が出る",
+]
+
+JUNK = [
+    ("", "empty"),
+    ("   ", "empty"),
+    ("!!!", "no_text"),
+    ("12345 ??", "no_text"),
+    ("asdkjfhaskjdfh", "gibberish"),
+    ("qwrtypsdfg", "gibberish"),
+    ("aaaaaaa", "gibberish"),
+    ("hahahahaha", "gibberish"),
+    ("jjjj kkkk", "gibberish"),
+    ("xkcdqwrtz", "gibberish"),
+    ("eeuaoiea", "gibberish"),
+]
+
+
+@pytest.mark.parametrize("text", REAL_COMPLAINTS)
+def test_real_complaints_pass(text):
+    verdict, reason = prefilter.classify(text)
+    assert verdict == "pass", reason
+
+
+@pytest.mark.parametrize("text, reason", JUNK)
+def test_junk_is_rejected(text, reason):
+    assert prefilter.classify(text) == ("reject", reason)
+
+
+def test_screen_returns_rejection_only_for_junk(monkeypatch):
+    monkeypatch.setattr(prefilter, "MODE", "enforce")
+    assert prefilter.screen("gout", "triage") is None
+    rejection = prefilter.screen("asdkjfhaskjdfh", "triage")
+    assert rejection == {"status": "error", "message": prefilter.REJECTION_MESSAGE, "reason": "gibberish"}
+
+
+def test_shadow_mode_lets_junk_through(monkeypatch):
+    monkeypatch.setattr(prefilter, "MODE", "shadow")
+    assert prefilter.screen("asdkjfhaskjdfh", "questions") is None
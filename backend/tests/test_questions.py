@@ -0,0 +1,19 @@
+import pytest
+from pydantic import ValidationError
+
+from agents.triage.questions import Questions
+
+
+def test_questions_are_stripped_and_capped_at_five():
+    questions = Questions.model_validate({"questions": [" A? ", "B?", "C?", "D?", "E?", "F?"]}).questions
+    assert questions == ["A?", "B?", "C?", "D?", "E?"]
+
+
+def test_blank_questions_do_not_count_towards_the_minimum():
+    with pytest.raises(ValidationError):
+        Questions.model_validate({"questions": ["A?", "  ", "", "B?"]})
+
+
+def test_non_string_questions_are_still_rejected():
+    with pytest.raises(ValidationError):
+        Questions.model_validate({"questions": ["A?", "B?", 3]})
@@ -0,0 +1,63 @@
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+from pydantic import BaseModel
+
+from agents.core import structured
+
+
+class Answer(BaseModel):
+    value: int
+
+
+def _bad_request(message: str, param: str | None = None) -> openai.BadRequestError:
+    request = httpx.Request("POST", "http://llm.test/v1/chat/completions")
+    response = httpx.Response(400, request=request)
+    body = {"message": message, "type": "invalid_request_error", "param": param, "code": None}
+    return openai.BadRequestError(message, response=response, body=body)
+
+
+def _reply(content: str):
+    message = SimpleNamespace(content=content)
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """Records the response_format of every request; `errors` are raised by the first calls in turn."""
+    recorded = SimpleNamespace(formats=[], errors=[])
+
+    def fake_completion(profile, messages, **kwargs):
+        recorded.formats.append((kwargs.get("response_format") or {}).get("type"))
+        if recorded.errors:
+            raise recorded.errors.pop(0)
+        return _reply('{"value": 1}')
+
+    monkeypatch.setenv("AI_MODEL_ID", "test-model")
+    monkeypatch.setattr(structured, "chat_completion", fake_completion)
+    monkeypatch.setattr(structured, "_modes", {})
+    monkeypatch.setattr(structured, "DEFAULT_MODE", "json_schema")
+    return recorded
+
+
+def test_unsupported_response_format_falls_back_and_is_remembered(calls):
+    calls.errors = [_bad_request("Invalid parameter", param="response_format")]
+    assert structured.generate("triage", [], Answer).value.value == 1
+    assert calls.formats == ["json_schema", "json_object"]
+    assert structured._modes == {"test-model": "json_object"}
+
+
+def test_unsupported_format_message_without_param_falls_back(calls):
+    calls.errors = [_bad_request("json_schema response format is not supported by this model")]
+    assert structured.generate("triage", [], Answer).value.value == 1
+    assert structured._modes == {"test-model": "json_object"}
+
+
+def test_other_bad_requests_mentioning_json_do_not_downgrade(calls):
+    calls.errors = [_bad_request("This model's maximum context length is 8192 tokens (JSON payload too long)")]
+    with pytest.raises(openai.BadRequestError):
+        structured.generate("triage", [], Answer)
+    assert calls.formats == ["json_schema"]
+    assert structured._modes == {}
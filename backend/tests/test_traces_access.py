@@ -0,0 +1,40 @@
+import time
+
+import jwt
+import pytest
+from fastapi.testclient import TestClient
+
+import dependencies
+import main
+
+SECRET = "test-secret-with-at-least-32-bytes!"
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(dependencies, "AUTH_MODE", "local")
+    monkeypatch.setattr(dependencies, "JWT_SECRET", SECRET)
+    return TestClient(main.app)
+
+
+def _headers(role: str | None) -> dict:
+    claims = {"sub": f"user-{role}", "aud": "authenticated", "exp": int(time.time()) + 60}
+    if role:
+        claims["user_metadata"] = {"role": role}
+    return {"Authorization": f"Bearer {jwt.encode(claims, SECRET, algorithm='HS256')}"}
+
+
+def test_traces_require_authentication(client):
+    assert client.get("/api/traces").status_code in (401, 403)
+
+
+@pytest.mark.parametrize("role", ["patient", None])
+def test_traces_are_hidden_from_non_staff(client, role):
+    assert client.get("/api/traces", headers=_headers(role)).status_code == 403
+
+
+@pytest.mark.parametrize("role", ["admin", "nurse"])
+def test_traces_are_served_to_staff(client, role):
+    res = client.get("/api/traces", headers=_headers(role))
+    assert res.status_code == 200
+    assert "traces" in res.json()
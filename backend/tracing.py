@@ -0,0 +1,350 @@
+"""
+Request-level tracing.
+
+Every HTTP request gets a Trace that collects timed spans for the work done
+on its behalf: Supabase queries, LLM completions, Strands agent runs and
+token verification. The trace follows the request into the worker pool and
+the LLM event loop through context variables, so a slow request can be broken
+down into "auth / agent / db / llm" time.
+
+Completed traces are:
+  - aggregated into metrics (per-route latency, DB calls and tokens per
+    request, per-span latency) served by /metrics and /api/metrics
+  - kept in a small in-memory buffer served by /api/traces
+  - exported via OpenTelemetry when configured (optional dependency)
+
+Configuration from .env:
+  - TRACE_BUFFER_SIZE: Completed traces kept in memory for /api/traces (default: 200)
+  - OTEL_EXPORTER_OTLP_ENDPOINT: Export spans over OTLP/HTTP to this collector.
+    Requires the optional `otel` dependencies (opentelemetry-sdk and
+    opentelemetry-exporter-otlp-proto-http); ignored when unset.
+  - OTEL_SERVICE_NAME: Service name reported to OpenTelemetry (default: medisync-backend)
+"""
+
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import metrics
+
+TRACE_BUFFER_SIZE = int(os.environ.get("TRACE_BUFFER_SIZE", "200"))
+
+logger = logging.getLogger(__name__)
+
+_current_trace: ContextVar = ContextVar("trace", default=None)
+_current_span: ContextVar = ContextVar("span", default=None)
+_recent: deque = deque(maxlen=TRACE_BUFFER_SIZE)
+
+# Monitoring endpoints are not traced, so scraping does not crowd out real requests
+UNTRACED_PATHS = {"/metrics", "/api/metrics", "/api/traces", "/api/health"}
+
+_span_seconds = metrics.histogram("span_duration_seconds", "Duration of traced operations, by kind and name")
+_span_errors = metrics.counter("span_errors_total", "Traced operations that raised, by kind and name")
+_request_seconds = metrics.histogram("http_request_duration_seconds", "HTTP request latency, by method and route")
+_requests = metrics.counter("http_requests_total", "HTTP requests, by method, route and status")
+_request_db_calls = metrics.histogram(
+    "http_request_db_calls", "Database round trips per HTTP request, by route", buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34)
+)
+_request_tokens = metrics.counter("http_request_llm_tokens_total", "LLM tokens used by HTTP requests, by route and direction")
+
+
+class Span:
+    """One timed operation. Use `span()` for a block, or `start_span()` + `finish()` across calls."""
+
+    def __init__(self, name: str, kind: str, attributes: dict, trace, parent_id: str | None):
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+        self.trace = trace
+        self.error = None
+        self.start_ns = time.time_ns()
+        self._started = time.perf_counter()
+        self.duration = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def add_usage(self, input_tokens: int = 0, output_tokens: int = 0):
+        self.attributes["input_tokens"] = self.attributes.get("input_tokens", 0) + (input_tokens or 0)
+        self.attributes["output_tokens"] = self.attributes.get("output_tokens", 0) + (output_tokens or 0)
+
+    def finish(self, error: BaseException | None = None):
+        if self.duration is not None:
+            return
+        self.duration = time.perf_counter() - self._started
+        if error is not None:
+            self.error = type(error).__name__
+            _span_errors.inc(kind=self.kind, name=self.name)
+        _span_seconds.observe(self.duration, kind=self.kind, name=self.name)
+        if self.trace is not None:
+            self.trace.add(self)
+
+    def to_dict(self) -> dict:
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "offset_ms": round((self.start_ns - self.trace.start_ns) / 1e6, 2) if self.trace else 0.0,
+            "duration_ms": round((self.duration or 0) * 1000, 2),
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class Trace:
+    """All spans recorded while serving one request. Spans may finish on any thread."""
+
+    def __init__(self, method: str, path: str, trace_id: str = None):
+        self.trace_id = trace_id or uuid.uuid4().hex
+        self.method = method
+        self.path = path
+        self.route = path
+        self.status = None
+        self.start_ns = time.time_ns()
+        self._started = time.perf_counter()
+        self.duration = None
+        self.spans: list = []
+        self.totals: dict = {"input_tokens": 0, "output_tokens": 0}
+        self._lock = threading.Lock()
+
+    def add(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+            calls = f"{span.kind}_calls"
+            seconds = f"{span.kind}_seconds"
+            self.totals[calls] = self.totals.get(calls, 0) + 1
+            self.totals[seconds] = self.totals.get(seconds, 0.0) + span.duration
+            self.totals["input_tokens"] += span.attributes.get("input_tokens", 0)
+            self.totals["output_tokens"] += span.attributes.get("output_tokens", 0)
+
+    def finish(self, route: str, status: int):
+        self.duration = time.perf_counter() - self._started
+        self.route = route
+        self.status = status
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s.start_ns)
+            totals = {
+                k.replace("_seconds", "_ms"): round(v * 1000, 2) if k.endswith("_seconds") else v
+                for k, v in self.totals.items()
+            }
+        return {
+            "trace_id": self.trace_id,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status": self.status,
+            "duration_ms": round((self.duration or 0) * 1000, 2),
+            "totals": totals,
+            "spans": [s.to_dict() for s in spans],
+        }
+
+
+def current() -> Trace | None:
+    return _current_trace.get()
+
+
+def start_span(name: str, kind: str = "internal", **attributes) -> Span:
+    """Start a span under the current one without making it current. Call `finish()` when done."""
+    parent = _current_span.get()
+    return Span(name, kind, attributes, _current_trace.get(), parent.span_id if parent else None)
+
+
+@contextmanager
+def span(name: str, kind: str = "internal", **attributes):
+    """Time a block as a child of the current span. Yields the Span to attach attributes and token usage."""
+    s = start_span(name, kind, **attributes)
+    token = _current_span.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        _current_span.reset(token)
+        s.finish(error=e)
+        raise
+    _current_span.reset(token)
+    s.finish()
+
+
+def capture() -> tuple:
+    """Snapshot of the current trace and span, to be re-attached on another event loop or thread."""
+    return _current_trace.get(), _current_span.get()
+
+
+@contextmanager
+def attach(state: tuple):
+    """Make a `capture()`d trace and span current for this block."""
+    trace_token = _current_trace.set(state[0])
+    span_token = _current_span.set(state[1])
+    try:
+        yield
+    finally:
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+
+
+@contextmanager
+def background_trace(name: str, trace_id: str = None):
+    """Trace work that runs outside an HTTP request, such as a background job."""
+    trace = Trace("JOB", name, trace_id)
+    token = _current_trace.set(trace)
+    status = 200
+    try:
+        yield trace
+    except BaseException:
+        status = 500
+        raise
+    finally:
+        _current_trace.reset(token)
+        trace.finish(name, status)
+        _recent.append(trace)
+        exporter = _get_otel_exporter()
+        if exporter.enabled:
+            exporter.export(trace)
+
+
+def recent(limit: int = 50) -> list:
+    """Most recent completed traces, newest first."""
+    return [t.to_dict() for t in list(_recent)[::-1][:limit]]
+
+
+def _record(trace: Trace):
+    _requests.inc(method=trace.method, route=trace.route, status=trace.status)
+    _request_seconds.observe(trace.duration, method=trace.method, route=trace.route)
+    _request_db_calls.observe(trace.totals.get("db_calls", 0), route=trace.route)
+    _request_tokens.inc(trace.totals["input_tokens"], route=trace.route, direction="input")
+    _request_tokens.inc(trace.totals["output_tokens"], route=trace.route, direction="output")
+    _recent.append(trace)
+    exporter = _get_otel_exporter()
+    if exporter.enabled:
+        exporter.export(trace)
+
+
+class TracingMiddleware:
+    """ASGI middleware that opens a Trace per HTTP request and records it when the response has been sent."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in UNTRACED_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        incoming = dict(scope.get("headers") or []).get(b"x-request-id")
+        trace = Trace(scope["method"], scope["path"], incoming.decode("latin-1") if incoming else None)
+        status = 500
+
+        async def send_with_trace_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = [*message.get("headers", []), (b"x-request-id", trace.trace_id.encode())]
+            await send(message)
+
+        token = _current_trace.set(trace)
+        try:
+            await self.app(scope, receive, send_with_trace_id)
+        finally:
+            _current_trace.reset(token)
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            trace.finish(route, status)
+            _record(trace)
+
+
+def instrument_postgrest():
+    """Wrap every synchronous PostgREST `.execute()` (tables and RPCs) in a "db" span."""
+    from postgrest._sync import request_builder
+
+    def traced(execute):
+        def execute_with_span(self):
+            request = self.request
+            resource = request.path.path.rsplit("/rest/v1/", 1)[-1]
+            with span(f"{request.http_method} {resource}", kind="db", resource=resource):
+                return execute(self)
+
+        execute_with_span._traced = True
+        return execute_with_span
+
+    for cls in (
+        request_builder.SyncQueryRequestBuilder,
+        request_builder.SyncSingleRequestBuilder,
+        request_builder.SyncMaybeSingleRequestBuilder,
+        request_builder.SyncExplainRequestBuilder,
+    ):
+        if not getattr(cls.execute, "_traced", False):
+            cls.execute = traced(cls.execute)
+
+
+class _OpenTelemetryExporter:
+    """Replays completed traces as OpenTelemetry spans. Enabled only when configured and installed."""
+
+    def __init__(self):
+        self.enabled = False
+        self._tracer = None
+        endpoint = os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT")
+        if not endpoint:
+            return
+        try:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+            from opentelemetry.sdk.resources import Resource
+            from opentelemetry.sdk.trace import TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        except ImportError:
+            logger.warning("OTEL_EXPORTER_OTLP_ENDPOINT is set but OpenTelemetry is not installed; export disabled")
+            return
+
+        provider = TracerProvider(
+            resource=Resource.create({"service.name": os.environ.get("OTEL_SERVICE_NAME", "medisync-backend")})
+        )
+        provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+        self._tracer = provider.get_tracer(__name__)
+        self.enabled = True
+
+    def export(self, trace: Trace):
+        from opentelemetry import trace as otel
+        from opentelemetry.trace import SpanKind, Status, StatusCode
+
+        root = self._tracer.start_span(
+            f"{trace.method} {trace.route}",
+            kind=SpanKind.SERVER,
+            start_time=trace.start_ns,
+            attributes={"http.request.method": trace.method, "http.route": trace.route,
+                        "http.response.status_code": trace.status or 0, "medisync.trace_id": trace.trace_id},
+        )
+        exported = {None: root}
+        with trace._lock:
+            spans = sorted(trace.spans, key=lambda s: s.start_ns)
+        for s in spans:
+            parent = exported.get(s.parent_id, root)
+            child = self._tracer.start_span(
+                s.name,
+                context=otel.set_span_in_context(parent),
+                kind=SpanKind.CLIENT if s.kind in ("db", "llm") else SpanKind.INTERNAL,
+                start_time=s.start_ns,
+                attributes={"medisync.kind": s.kind, **{k: v for k, v in s.attributes.items() if v is not None}},
+            )
+            if s.error:
+                child.set_status(Status(StatusCode.ERROR, s.error))
+            child.end(end_time=s.start_ns + int(s.duration * 1e9))
+            exported[s.span_id] = child
+        root.end(end_time=trace.start_ns + int(trace.duration * 1e9))
+
+
+_otel: _OpenTelemetryExporter | None = None
+
+
+def _get_otel_exporter() -> _OpenTelemetryExporter:
+    # Created on first use so that settings loaded from .env after import are honoured
+    global _otel
+    if _otel is None:
+        _otel = _OpenTelemetryExporter()
+    return _otel
@@ -0,0 +1,148 @@
+"""
+Write-behind batching for append-only inserts.
+
+Rows are queued in memory and written by a background thread in batches,
+so request latency no longer includes the database write:
+  - a batch is flushed once `batch_size` rows are queued or `flush_interval`
+    seconds after the oldest queued row, whichever comes first
+  - a failed batch is retried with exponential backoff; after `max_attempts`
+    its rows are dropped, counted and logged
+  - when more than `max_pending` rows are queued, new rows are dropped
+    (counted and logged) instead of growing memory without bound
+  - `close()` flushes everything still queued, and runs on application shutdown
+
+Rows should carry their own `id` and `created_at`, so retries are safe to
+de-duplicate and ordering reflects when a row was produced, not when it was
+flushed. `pending()` exposes rows not yet written, for read-your-writes.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+
+import metrics
+import tracing
+from database import supabase
+
+logger = logging.getLogger(__name__)
+
+_depth = metrics.gauge("write_behind_queue_depth", "Rows queued and not yet written, by queue")
+_written = metrics.counter("write_behind_rows_written_total", "Rows written, by queue")
+_dropped = metrics.counter("write_behind_rows_dropped_total", "Rows dropped, by queue and reason (full, closed, failed)")
+_batch_failures = metrics.counter("write_behind_batch_failures_total", "Failed batch write attempts, by queue")
+_flush_seconds = metrics.histogram("write_behind_flush_seconds", "Time to write one batch, by queue")
+_lag_seconds = metrics.histogram("write_behind_lag_seconds", "Time from enqueue until a row was written, by queue")
+
+
+class WriteBehindQueue:
+    def __init__(
+        self,
+        name: str,
+        table: str,
+        batch_size: int = 100,
+        flush_interval: float = 0.5,
+        max_pending: int = 10_000,
+        max_attempts: int = 5,
+        retry_backoff: float = 0.5,
+    ):
+        self.name = name
+        self.table = table
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self._queue: deque = deque()  # (enqueued_at, row)
+        self._in_flight: list = []
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread: threading.Thread | None = None
+
+    def put(self, rows: list) -> bool:
+        """Queue rows for writing. Returns False (and drops them) when the queue is full or closed."""
+        with self._cond:
+            if self._closed or len(self._queue) + len(rows) > self.max_pending:
+                reason = "closed" if self._closed else "full"
+                _dropped.inc(len(rows), queue=self.name, reason=reason)
+                logger.error("Dropped %d %s rows: write-behind queue %s", len(rows), self.table, reason)
+                return False
+            now = time.monotonic()
+            self._queue.extend((now, row) for row in rows)
+            _depth.set(len(self._queue) + len(self._in_flight), queue=self.name)
+            self._ensure_started()
+            self._cond.notify()
+        return True
+
+    def pending(self, **match) -> list:
+        """Queued or in-flight rows whose columns equal `match`, oldest first."""
+        with self._cond:
+            rows = [row for _, row in self._in_flight] + [row for _, row in self._queue]
+        return [row for row in rows if all(row.get(k) == v for k, v in match.items())]
+
+    def depth(self) -> int:
+        with self._cond:
+            return len(self._queue) + len(self._in_flight)
+
+    def close(self, timeout: float = 10.0):
+        """Stop accepting rows and wait (up to `timeout` seconds) for queued rows to be written."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        remaining = self.depth()
+        if remaining:
+            logger.error("Write-behind queue %s closed with %d unwritten %s rows", self.name, remaining, self.table)
+
+    def _ensure_started(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name=f"write-behind-{self.name}", daemon=True)
+            self._thread.start()
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                # Wait for a full batch, the oldest row's deadline, or close()
+                while not self._closed and len(self._queue) < self.batch_size:
+                    if self._queue:
+                        remaining = self._queue[0][0] + self.flush_interval - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                    else:
+                        self._cond.wait()
+                if not self._queue:
+                    return  # closed and drained
+                n = min(self.batch_size, len(self._queue))
+                self._in_flight = [self._queue.popleft() for _ in range(n)]
+            self._flush(self._in_flight)
+            with self._cond:
+                self._in_flight = []
+                _depth.set(len(self._queue), queue=self.name)
+
+    def _flush(self, batch: list):
+        rows = [row for _, row in batch]
+        with tracing.background_trace(f"write-behind {self.name}"):
+            for attempt in range(1, self.max_attempts + 1):
+                started = time.perf_counter()
+                try:
+                    supabase.table(self.table).upsert(rows, ignore_duplicates=True).execute()
+                except Exception as e:
+                    _batch_failures.inc(queue=self.name)
+                    # While shutting down, give up early rather than block the drain
+                    if attempt == self.max_attempts or (self._closed and attempt >= 2):
+                        _dropped.inc(len(rows), queue=self.name, reason="failed")
+                        logger.error(
+                            "Dropped %d %s rows after %d attempts: %s", len(rows), self.table, attempt, e
+                        )
+                        return
+                    time.sleep(self.retry_backoff * 2 ** (attempt - 1))
+                else:
+                    _flush_seconds.observe(time.perf_counter() - started, queue=self.name)
+                    _written.inc(len(rows), queue=self.name)
+                    now = time.monotonic()
+                    for enqueued_at, _ in batch:
+                        _lag_seconds.observe(now - enqueued_at, queue=self.name)
+                    return
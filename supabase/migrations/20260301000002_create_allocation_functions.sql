@@ -0,0 +1,88 @@
+-- FUNCTION: claim_available_room
+-- Atomically claims one available room. Concurrent callers skip rows locked by each
+-- other (SKIP LOCKED), so two admissions can never be given the same room.
+-- Returns NULL when no room is available.
+CREATE OR REPLACE FUNCTION public.claim_available_room()
+RETURNS INT AS $$
+    UPDATE rooms
+    SET status = 'occupied'
+    WHERE id = (
+        SELECT id FROM rooms
+        WHERE status = 'available'
+        ORDER BY id
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id;
+$$ LANGUAGE sql;
+
+-- FUNCTION: complete_checkup
+-- Also report which room and nurse team were released, so the backend can update
+-- its in-memory allocation counters without another round trip.
+CREATE OR REPLACE FUNCTION public.complete_checkup(
+    p_ticket_id UUID,
+    p_doctor_note TEXT,
+    p_prescriptions JSONB DEFAULT '[]',
+    p_doctor_fee DECIMAL(10,2) DEFAULT 150000
+)
+RETURNS JSONB AS $$
+DECLARE
+    v_room_id INT;
+    v_nurse_team_id INT;
+    v_ticket tickets%ROWTYPE;
+    v_prescriptions_count INT := 0;
+    v_medicine_fee DECIMAL(10,2) := 0;
+    v_invoice_id UUID;
+BEGIN
+    -- 0. Lock the ticket and remember the room and nurse team to release
+    SELECT room_id, nurse_team_id INTO v_room_id, v_nurse_team_id FROM tickets WHERE id = p_ticket_id FOR UPDATE;
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Ticket not found';
+    END IF;
+
+    -- 1. Update ticket & release associations
+    UPDATE tickets
+    SET doctor_note = p_doctor_note,
+        status = 'completed',
+        room_id = NULL,
+        nurse_team_id = NULL,
+        updated_at = NOW()
+    WHERE id = p_ticket_id
+    RETURNING * INTO v_ticket;
+
+    IF v_room_id IS NOT NULL THEN
+        UPDATE rooms SET status = 'available' WHERE id = v_room_id;
+    END IF;
+
+    -- 2. Bulk insert prescriptions and price them against the catalog
+    WITH rx AS (
+        SELECT
+            (item->>'medicine_id')::INT AS medicine_id,
+            COALESCE((item->>'quantity')::INT, 1) AS quantity,
+            COALESCE(item->>'notes', '') AS notes
+        FROM jsonb_array_elements(COALESCE(p_prescriptions, '[]'::JSONB)) AS item
+    ),
+    inserted AS (
+        INSERT INTO prescriptions (ticket_id, medicine_id, quantity, notes, status)
+        SELECT p_ticket_id, medicine_id, quantity, notes, 'pending' FROM rx
+        RETURNING medicine_id, quantity
+    )
+    SELECT COUNT(*), COALESCE(SUM(COALESCE(m.price, 0) * i.quantity), 0)
+    INTO v_prescriptions_count, v_medicine_fee
+    FROM inserted i
+    LEFT JOIN catalog_medicines m ON m.id = i.medicine_id;
+
+    -- 3. Auto-generate invoice (room fee is set separately if inpatient)
+    INSERT INTO invoices (ticket_id, doctor_fee, medicine_fee, room_fee, status)
+    VALUES (p_ticket_id, p_doctor_fee, v_medicine_fee, 0, 'unpaid')
+    RETURNING id INTO v_invoice_id;
+
+    RETURN jsonb_build_object(
+        'ticket', to_jsonb(v_ticket),
+        'prescriptions_count', v_prescriptions_count,
+        'invoice_id', v_invoice_id,
+        'released_room_id', v_room_id,
+        'released_nurse_team_id', v_nurse_team_id
+    );
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,15 @@
+-- TRIGGER: keep profiles.updated_at current on every update
+-- The backend's in-memory doctor directory uses it to detect profile changes.
+CREATE OR REPLACE FUNCTION public.set_updated_at()
+RETURNS TRIGGER AS $$
+BEGIN
+  NEW.updated_at = NOW();
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER set_profiles_updated_at
+  BEFORE UPDATE ON profiles
+  FOR EACH ROW EXECUTE PROCEDURE public.set_updated_at();
+
+CREATE INDEX idx_profiles_updated_at ON profiles(updated_at);
@@ -0,0 +1,9 @@
+-- COLUMN + TRIGGER: track catalog_medicines changes
+-- The backend's in-memory medicine catalog index uses it to detect catalog changes.
+ALTER TABLE catalog_medicines ADD COLUMN updated_at TIMESTAMPTZ DEFAULT NOW();
+
+CREATE TRIGGER set_catalog_medicines_updated_at
+  BEFORE UPDATE ON catalog_medicines
+  FOR EACH ROW EXECUTE PROCEDURE public.set_updated_at();
+
+CREATE INDEX idx_catalog_medicines_updated_at ON catalog_medicines(updated_at);
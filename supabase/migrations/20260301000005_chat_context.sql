@@ -0,0 +1,47 @@
+-- TRIGGERS: keep tickets.updated_at current when the ticket or its prescriptions change
+-- The patient chatbot caches each ticket's context block per updated_at value.
+CREATE TRIGGER set_tickets_updated_at
+  BEFORE UPDATE ON tickets
+  FOR EACH ROW EXECUTE PROCEDURE public.set_updated_at();
+
+CREATE OR REPLACE FUNCTION public.touch_prescription_ticket()
+RETURNS TRIGGER AS $$
+BEGIN
+  UPDATE tickets SET updated_at = NOW()
+  WHERE id = COALESCE(NEW.ticket_id, OLD.ticket_id);
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER touch_ticket_on_prescription_change
+  AFTER INSERT OR UPDATE OR DELETE ON prescriptions
+  FOR EACH ROW EXECUTE PROCEDURE public.touch_prescription_ticket();
+
+-- INDEX: the chatbot reads the most recent messages of a ticket
+CREATE INDEX idx_chat_messages_ticket_created_at ON chat_messages(ticket_id, created_at DESC);
+
+-- TABLE: chat_summaries
+-- Rolling summary of the chat turns that no longer fit the chatbot's context window.
+CREATE TABLE chat_summaries (
+    ticket_id UUID PRIMARY KEY REFERENCES tickets(id) ON DELETE CASCADE,
+    summary TEXT NOT NULL,
+    summarized_until TIMESTAMPTZ NOT NULL,
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- RLS: chat_summaries
+ALTER TABLE chat_summaries ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Staff can view chat summaries"
+ON chat_summaries FOR SELECT
+TO authenticated
+USING (
+    (auth.jwt() -> 'user_metadata' ->> 'role') IN ('admin', 'fo', 'doctor_specialist', 'nurse', 'agent')
+);
+
+CREATE POLICY "Agents can write chat summaries"
+ON chat_summaries FOR ALL
+TO authenticated
+USING (
+    (auth.jwt() -> 'user_metadata' ->> 'role') IN ('admin', 'agent')
+);
@@ -0,0 +1,39 @@
+-- TRIGGERS: touch each affected ticket once per prescriptions statement
+-- complete_checkup inserts all of a checkup's prescriptions in one statement; a row-level
+-- trigger updated the same ticket once per prescription. The statement-level triggers read
+-- the changed rows from transition tables and update every distinct ticket a single time.
+DROP TRIGGER IF EXISTS touch_ticket_on_prescription_change ON prescriptions;
+DROP FUNCTION IF EXISTS public.touch_prescription_ticket();
+
+CREATE OR REPLACE FUNCTION public.touch_prescription_tickets()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    UPDATE tickets SET updated_at = NOW()
+    WHERE id IN (SELECT ticket_id FROM new_prescriptions);
+  ELSIF TG_OP = 'UPDATE' THEN
+    UPDATE tickets SET updated_at = NOW()
+    WHERE id IN (SELECT ticket_id FROM new_prescriptions UNION SELECT ticket_id FROM old_prescriptions);
+  ELSE
+    UPDATE tickets SET updated_at = NOW()
+    WHERE id IN (SELECT ticket_id FROM old_prescriptions);
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Transition tables are declared per event, so each event gets its own trigger
+CREATE TRIGGER touch_tickets_on_prescription_insert
+  AFTER INSERT ON prescriptions
+  REFERENCING NEW TABLE AS new_prescriptions
+  FOR EACH STATEMENT EXECUTE PROCEDURE public.touch_prescription_tickets();
+
+CREATE TRIGGER touch_tickets_on_prescription_update
+  AFTER UPDATE ON prescriptions
+  REFERENCING OLD TABLE AS old_prescriptions NEW TABLE AS new_prescriptions
+  FOR EACH STATEMENT EXECUTE PROCEDURE public.touch_prescription_tickets();
+
+CREATE TRIGGER touch_tickets_on_prescription_delete
+  AFTER DELETE ON prescriptions
+  REFERENCING OLD TABLE AS old_prescriptions
+  FOR EACH STATEMENT EXECUTE PROCEDURE public.touch_prescription_tickets();